@@ -22,6 +22,12 @@ class Agent:
         self.model = config["model"]
         self.temperature = config["temperature"]
         self.max_tokens = config.get("max_tokens", 1000)
+        self.max_context = config.get("max_context")
+
+        # Opt-in response caching: {"ttl": seconds, "similarity": cosine threshold}
+        cache_config = config.get("response_cache") or {}
+        self.cache_ttl = cache_config.get("ttl")
+        self.cache_similarity = cache_config.get("similarity")
 
         # Load system prompt
         prompt_path = Path(__file__).parent / "prompt.txt"
@@ -54,7 +60,9 @@ class Agent:
             context=messages,
             model=self.model,
             temperature=self.temperature,
-            stream=stream
+            stream=stream,
+            cache_ttl=self.cache_ttl,
+            cache_similarity=self.cache_similarity
         )
 
         return response
@@ -5,6 +5,7 @@ from pathlib import Path
 from typing import AsyncGenerator
 import sys
 sys.path.append(str(Path(__file__).parent.parent.parent))
+from utils.logger import logger
 from utils.openai_client import llm_call_with_context
 from .tools import search_amazon
 
@@ -23,6 +24,12 @@ class Agent:
         self.model = config["model"]
         self.temperature = config["temperature"]
         self.max_tokens = config.get("max_tokens", 800)
+        self.max_context = config.get("max_context")
+
+        # Opt-in response caching: {"ttl": seconds, "similarity": cosine threshold}
+        cache_config = config.get("response_cache") or {}
+        self.cache_ttl = cache_config.get("ttl")
+        self.cache_similarity = cache_config.get("similarity")
 
     async def run(
         self,
@@ -41,8 +48,12 @@ class Agent:
         Returns:
             Product recommendations as string or async generator
         """
-        # Use tool to get product data
-        product_data = search_amazon(query)
+        # Use tool to get product data, answering without it if the search fails
+        try:
+            product_data = await search_amazon(query)
+        except Exception as e:
+            logger.warning(f"Product search failed: {e}")
+            product_data = "No product results are available right now."
 
         # Create enhanced prompt with product data
         system_prompt = f"""You are a helpful shopping assistant.
@@ -62,7 +73,9 @@ compare options, and make recommendations. Be friendly and concise."""
             context=messages,
             model=self.model,
             temperature=self.temperature,
-            stream=stream
+            stream=stream,
+            cache_ttl=self.cache_ttl,
+            cache_similarity=self.cache_similarity
         )
 
         return response
@@ -1,11 +1,15 @@
 """Shopping tools for product search (mock implementation for MVP)."""
 
+from utils.tools import tool
+
+@tool(timeout=5, cache_ttl=300, max_concurrency=8)
 def search_amazon(query: str) -> str:
     """
     Mock Amazon product search.
 
     In production, this would integrate with actual shopping APIs.
-    For MVP, returns placeholder data.
+    For MVP, returns placeholder data. Runs in the tool thread pool, so a
+    blocking HTTP client can be used here without stalling other requests.
     """
     mock_products = [
         {
@@ -0,0 +1,64 @@
+"""
+Run a JSONL file of chat queries through the agents, without the HTTP server.
+
+Each input line is {"query": "...", "session_id": "...", "agent_name": "...", "id": "..."}
+(all but query optional). Results are appended to the output file as they
+finish; re-running the same command after an interruption skips the items
+already answered there. A throughput report is printed at the end.
+
+Usage (from backend/):
+    python batch.py prompts.jsonl --output results.jsonl [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from core.batch import BATCH_CONCURRENCY, BatchCheckpoint, BatchRunner, parse_items
+from core.resources import AppResources
+
+async def run(input_path: Path, output_path: Path, concurrency: int) -> dict:
+    with open(input_path) as f:
+        items, invalid = parse_items(f)
+
+    # Invalid lines are reported once, on the first run
+    first_run = not output_path.exists()
+    checkpoint = BatchCheckpoint(output_path)
+    if first_run:
+        for result in invalid:
+            checkpoint.record(result)
+
+    resources = AppResources()
+    await resources.startup()
+    runner = BatchRunner(resources.orchestrator, concurrency)
+    try:
+        async for result in runner.run(items, checkpoint):
+            done = runner.completed + runner.failed
+            print(f"[{done}/{len(items) - runner.skipped}] {result['id']}: {result['status']}", file=sys.stderr)
+    finally:
+        checkpoint.close()
+        await resources.shutdown()
+
+    report = runner.report()
+    report["invalid"] = len(invalid)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", type=Path, help="JSONL file of queries")
+    parser.add_argument("--output", "-o", type=Path, required=True, help="JSONL results, also the checkpoint")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    args = parser.parse_args()
+
+    try:
+        report = asyncio.run(run(args.input, args.output, args.concurrency))
+    except KeyboardInterrupt:
+        print(f"Interrupted; run the same command again to resume from {args.output}", file=sys.stderr)
+        sys.exit(130)
+    print(json.dumps(report, indent=2))
+    if report["failed"] or report["invalid"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Micro-benchmarks and load tools for the Agora backend."""
@@ -0,0 +1,74 @@
+"""
+Compare per-query agent loading against the shared agent registry.
+
+Usage (from backend/):
+    python benchmarks/bench_agent_registry.py [--requests 2000]
+"""
+
+import argparse
+import importlib
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from core.discovery import AgentManifest
+from core.registry import AgentRegistry
+
+def load_per_query(agent_name: str):
+    """The previous loading path: import, instantiate and read config every time."""
+    module = importlib.import_module(f"agents.{agent_name}.agent")
+    return getattr(module, "Agent")()
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Return the pct-th percentile of samples."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+    return ordered[index]
+
+def time_calls(fn, agent_names: list[str], requests: int) -> list[float]:
+    """Time `requests` calls of fn, cycling through agent names (microseconds)."""
+    samples = []
+    for i in range(requests):
+        agent_name = agent_names[i % len(agent_names)]
+        start = time.perf_counter()
+        fn(agent_name)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+def report(label: str, samples: list[float]):
+    """Print a one-line latency summary."""
+    print(
+        f"{label:<22} mean={statistics.mean(samples):9.1f}us "
+        f"p50={percentile(samples, 50):9.1f}us p99={percentile(samples, 99):9.1f}us"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Startup: discovery reads config files only
+    start = time.perf_counter()
+    manifest = AgentManifest()
+    discovery_ms = (time.perf_counter() - start) * 1000
+    agent_names = manifest.names()
+
+    # Eager alternative: first import of every agent module plus instantiation
+    registry = AgentRegistry(manifest)
+    start = time.perf_counter()
+    registry.preload(agent_names)
+    preload_ms = (time.perf_counter() - start) * 1000
+    print(f"Agents: {agent_names}")
+    print(f"Manifest discovery (startup): {discovery_ms:.2f}ms")
+    print(f"Registry preload (eager imports): {preload_ms:.2f}ms")
+
+    report("per-query _load_agent", time_calls(load_per_query, agent_names, args.requests))
+    report("registry.get", time_calls(registry.get, agent_names, args.requests))
+
+if __name__ == "__main__":
+    main()
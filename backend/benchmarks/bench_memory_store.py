@@ -0,0 +1,101 @@
+"""
+Compare per-turn read and write latency of the conversation memory backends.
+
+Each turn saves a user message and an assistant reply, then loads the
+context for the next turn, through MemoryManager with the context cache
+off so every read reaches the store. Sessions are visited round-robin, so
+reads see histories of growing length. Redis runs only if a server answers
+at --redis-url.
+
+Usage (from backend/):
+    python benchmarks/bench_memory_store.py [--sessions 50] [--turns 20] [--backends sqlite,memory,redis]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ["CONTEXT_CACHE_SESSIONS"] = "0"
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="agora-bench-"))
+
+from core.memory import MemoryManager
+from core.memory_store import BACKENDS, create_memory_store
+
+USER_TEXT = "Can you compare the battery life of these two laptops for travel use? " * 3
+REPLY_TEXT = "The first laptop lasts about ten hours under light use, the second closer to eight. " * 6
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Return the pct-th percentile of samples."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+    return ordered[index]
+
+def report(label: str, samples: list[float]):
+    """Print a one-line latency summary."""
+    print(
+        f"{label:<16} mean={statistics.mean(samples):9.1f}us "
+        f"p50={percentile(samples, 50):9.1f}us p95={percentile(samples, 95):9.1f}us "
+        f"p99={percentile(samples, 99):9.1f}us"
+    )
+
+async def run_backend(backend: str, sessions: int, turns: int, limit: int, redis_url: str):
+    agent_name = f"bench_{uuid.uuid4().hex[:8]}"
+    options = {"url": redis_url, "prefix": "agora-bench:"} if backend == "redis" else {}
+    try:
+        store = create_memory_store(agent_name, backend, **options)
+    except RuntimeError as e:
+        print(f"{backend}: skipped ({e})")
+        return
+    session_ids = [str(uuid.uuid4()) for _ in range(sessions)]
+    try:
+        await store.latest_reply(session_ids[0])
+    except Exception as e:
+        print(f"{backend}: skipped ({e})")
+        await store.close()
+        return
+
+    memory = MemoryManager(agent_name, write_behind=False, store=store)
+    writes, reads = [], []
+    try:
+        start = time.perf_counter()
+        for _ in range(turns):
+            for session_id in session_ids:
+                for role, text in (("user", USER_TEXT), ("assistant", REPLY_TEXT)):
+                    t = time.perf_counter()
+                    await memory.save_message(session_id, role, text)
+                    writes.append((time.perf_counter() - t) * 1e6)
+                t = time.perf_counter()
+                await memory.load_context(session_id, limit=limit)
+                reads.append((time.perf_counter() - t) * 1e6)
+        elapsed = time.perf_counter() - start
+
+        print(f"{backend}: {sessions * turns} turns in {elapsed:.2f}s ({sessions * turns / elapsed:.0f} turns/s)")
+        report("  save_message", writes)
+        report("  load_context", reads)
+    finally:
+        for session_id in session_ids:
+            await memory.clear_session(session_id)
+        await memory.close()
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=10, help="Messages loaded per context read")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--redis-url", default=os.getenv("MEMORY_REDIS_URL", "redis://localhost:6379/15"))
+    args = parser.parse_args()
+
+    for backend in args.backends.split(","):
+        await run_backend(backend.strip(), args.sessions, args.turns, args.limit, args.redis_url)
+
+if __name__ == "__main__":
+    asyncio.run(main())
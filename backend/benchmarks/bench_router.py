@@ -0,0 +1,139 @@
+"""
+Compare substring keyword routing against the compiled word matcher.
+
+Generates agents with synthetic keywords in a temporary directory and routes
+the same queries through both implementations, then times semantic routing
+(embedding similarity to agent centroids) with cold and warm query caches.
+Semantic timings depend on the embedder: the built-in hashing embedder is
+lexical and fast, a model set with EMBEDDING_MODEL is far slower per query.
+
+Usage (from backend/):
+    python benchmarks/bench_router.py [--agents 100] [--keywords 10] [--queries 100000]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import yaml
+from core.discovery import AgentManifest
+from core.router import AgentRouter, ROUTER_QUERY_CACHE_SIZE
+from utils.logger import logger
+
+FILLER = "please can you help me with the a an for my about some good best new under this that".split()
+
+def legacy_route(agent_keywords: dict[str, list[str]], query: str) -> str | None:
+    """The previous matching: substring checks of every keyword of every agent."""
+    query_lower = query.lower()
+    agent_scores = {}
+    for agent, keywords in agent_keywords.items():
+        score = sum(1 for keyword in keywords if keyword in query_lower)
+        if score > 0:
+            agent_scores[agent] = score
+    return max(agent_scores, key=agent_scores.get) if agent_scores else None
+
+def make_agents(directory: Path, agents: int, keywords: int, rng: random.Random) -> dict[str, list[str]]:
+    """Write a config.yaml with weighted routing keywords for each synthetic agent."""
+    agent_keywords = {}
+    for i in range(agents):
+        words = [f"topic{i}x{k}" for k in range(keywords)]
+        agent_keywords[f"agent_{i:03d}"] = words
+        agent_dir = directory / f"agent_{i:03d}"
+        agent_dir.mkdir()
+        config = {
+            "name": f"Agent {i}",
+            "description": f"Handles questions about {' '.join(words[:3])}",
+            "routing": {
+                "keywords": {word: rng.choice([1, 2]) for word in words},
+                "examples": [f"please help me with {word} and {rng.choice(words)}" for word in words[:5]]
+            }
+        }
+        (agent_dir / "config.yaml").write_text(yaml.safe_dump(config))
+        (agent_dir / "agent.py").touch()
+    return agent_keywords
+
+def make_queries(agent_keywords: dict[str, list[str]], count: int, rng: random.Random) -> list[str]:
+    """Queries of filler words with zero to three keywords mixed in."""
+    all_keywords = [keyword for keywords in agent_keywords.values() for keyword in keywords]
+    queries = []
+    for _ in range(count):
+        words = rng.choices(FILLER, k=rng.randint(6, 16))
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(all_keywords))
+        queries.append(" ".join(words))
+    return queries
+
+async def time_routes(route, queries: list[str]) -> float:
+    """Return mean microseconds per query of an async route function."""
+    start = time.perf_counter()
+    for query in queries:
+        await route(query)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+async def run(router: AgentRouter, semantic_router: AgentRouter, agent_keywords: dict, queries: list[str]):
+    async def legacy(query: str):
+        return legacy_route(agent_keywords, query)
+
+    legacy_us = await time_routes(legacy, queries)
+    router_us = await time_routes(router.route, queries)
+    print(f"substring loop   {legacy_us:8.2f}us/query  total {legacy_us * len(queries) / 1e6:6.2f}s")
+    print(f"compiled matcher {router_us:8.2f}us/query  total {router_us * len(queries) / 1e6:6.2f}s")
+    print(f"speedup          {legacy_us / router_us:8.1f}x")
+
+    start = time.perf_counter()
+    await semantic_router.load_semantic()
+    semantic_build_ms = (time.perf_counter() - start) * 1000
+    embedder = semantic_router.semantic.embedder
+    kind = "a model, encoding in a worker thread" if embedder.semantic else "lexical only; set EMBEDDING_MODEL to time a model"
+    print(f"Semantic index build (embeds descriptions and examples): {semantic_build_ms:.1f}ms")
+    print(f"Embedder: {type(embedder).__name__} ({kind})")
+
+    # Unique queries miss the embedding cache; repeating them (within its size) hits it
+    semantic_queries = queries[:min(len(queries), ROUTER_QUERY_CACHE_SIZE)]
+    cold_us = await time_routes(semantic_router.route, semantic_queries)
+    warm_us = await time_routes(semantic_router.route, semantic_queries)
+    print(f"semantic (cold)  {cold_us:8.2f}us/query")
+    print(f"semantic (warm)  {warm_us:8.2f}us/query")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--agents", type=int, default=100)
+    parser.add_argument("--keywords", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Routing logs every decision; keep the benchmark about matching
+    logger.setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        agent_keywords = make_agents(Path(tmp), args.agents, args.keywords, rng)
+        start = time.perf_counter()
+        manifest = AgentManifest(Path(tmp))
+        discovery_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        manifest.scan()
+        rescan_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        router = AgentRouter(manifest, mode="keyword")
+        build_ms = (time.perf_counter() - start) * 1000
+        semantic_router = AgentRouter(manifest, mode="semantic")
+
+    queries = make_queries(agent_keywords, args.queries, rng)
+    print(f"{args.agents} agents x {args.keywords} keywords, {args.queries} queries")
+    print(f"Agent discovery (reads {args.agents} config files): {discovery_ms:.1f}ms, unchanged rescan: {rescan_ms:.1f}ms")
+    print(f"Keyword router build: {build_ms:.1f}ms")
+    asyncio.run(run(router, semantic_router, agent_keywords, queries))
+
+if __name__ == "__main__":
+    main()
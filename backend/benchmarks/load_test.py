@@ -0,0 +1,401 @@
+"""
+Offline load test of the chat endpoints against a mock OpenAI server.
+
+Starts benchmarks/mock_openai.py and the backend (in a temporary working
+directory, so memory databases stay out of the tree), drives POST /chat/ and
+the /chat/ws WebSocket with concurrent sessions, and reports p50/p95/p99
+time to first token, end-to-end latency, throughput and event loop lag.
+
+Usage (from backend/):
+    python benchmarks/load_test.py [--sessions 50] [--turns 3] [--transport both] [--output run.json]
+    python benchmarks/load_test.py --target http://127.0.0.1:8000   # an already running backend
+    python benchmarks/load_test.py --compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+import httpx
+import websockets
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+MOCK_SERVER = Path(__file__).resolve().parent / "mock_openai.py"
+
+def percentile(samples: list[float], pct: float) -> Optional[float]:
+    """Return the pct-th percentile of samples, or None if there are none."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+    return ordered[index]
+
+def summarize(samples: list[float]) -> dict:
+    """p50/p95/p99/max of latencies in seconds, reported in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2)
+    }
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        )
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def wait_until_up(url: str, timeout: float = 30):
+    """Poll a URL until it answers, or raise."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url, timeout=1)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+class LoopLagProbe:
+    """Measures event loop lag of this (client) process while the test runs."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+class Results:
+    """Samples collected for one transport."""
+
+    def __init__(self):
+        self.ttft: list[float] = []
+        self.latency: list[float] = []
+        self.tokens = 0
+        self.errors = 0
+        self.error_messages: dict[str, int] = {}
+
+    def error(self, message: str):
+        self.errors += 1
+        key = message[:80]
+        self.error_messages[key] = self.error_messages.get(key, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        turns = len(self.latency)
+        return {
+            "turns": turns,
+            "errors": self.errors,
+            "error_messages": self.error_messages,
+            "elapsed_s": round(elapsed, 3),
+            "turns_per_s": round(turns / elapsed, 2) if elapsed else None,
+            "tokens_per_s": round(self.tokens / elapsed, 1) if elapsed else None,
+            "ttft": summarize(self.ttft),
+            "latency": summarize(self.latency)
+        }
+
+def query_text(session: int, turn: int) -> str:
+    # Unique per turn, so response caching and request sharing do not skew results
+    return f"Session {session} turn {turn} ({uuid.uuid4().hex[:8]}): outline a short paper on topic {turn}"
+
+async def rest_session(client: httpx.AsyncClient, base_url: str, session: int, args, results: Results):
+    session_id = f"load-rest-{session}-{uuid.uuid4().hex[:6]}"
+    for turn in range(args.turns):
+        start = time.perf_counter()
+        try:
+            response = await client.post(
+                f"{base_url}/chat/",
+                json={"query": query_text(session, turn), "session_id": session_id, "agent_name": args.agent},
+                timeout=args.request_timeout
+            )
+            response.raise_for_status()
+            text = response.json()["response"]
+        except Exception as e:
+            results.error(f"{type(e).__name__}: {e}")
+            continue
+        if text.startswith("I encountered an error"):
+            results.error(text)
+            continue
+        elapsed = time.perf_counter() - start
+        # REST answers arrive whole, so the first token is the last
+        results.ttft.append(elapsed)
+        results.latency.append(elapsed)
+        results.tokens += len(text.split())
+
+async def ws_session(ws_url: str, session: int, args, results: Results):
+    session_id = f"load-ws-{session}-{uuid.uuid4().hex[:6]}"
+    try:
+        async with websockets.connect(f"{ws_url}/chat/ws", max_size=None) as websocket:
+            for turn in range(args.turns):
+                request_id = f"{session}-{turn}"
+                start = time.perf_counter()
+                first = None
+                tokens = 0
+                await websocket.send(json.dumps({
+                    "query": query_text(session, turn),
+                    "session_id": session_id,
+                    "agent_name": args.agent,
+                    "request_id": request_id
+                }))
+                while True:
+                    frame = json.loads(await asyncio.wait_for(websocket.recv(), args.request_timeout))
+                    if frame.get("request_id") != request_id:
+                        continue
+                    if frame["type"] == "token":
+                        if first is None:
+                            first = time.perf_counter()
+                        tokens += len(frame["content"].split())
+                    elif frame["type"] == "end":
+                        results.latency.append(time.perf_counter() - start)
+                        if first is not None:
+                            results.ttft.append(first - start)
+                        results.tokens += tokens
+                        break
+                    elif frame["type"] in ("error", "cancelled"):
+                        results.error(frame.get("content", frame["type"]))
+                        break
+    except Exception as e:
+        results.error(f"{type(e).__name__}: {e}")
+
+async def run_transport(transport: str, base_url: str, args) -> dict:
+    """Run every session over one transport concurrently and summarize."""
+    results = Results()
+    start = time.perf_counter()
+    if transport == "rest":
+        limits = httpx.Limits(max_connections=args.sessions, max_keepalive_connections=args.sessions)
+        async with httpx.AsyncClient(limits=limits) as client:
+            await asyncio.gather(*[
+                rest_session(client, base_url, session, args, results) for session in range(args.sessions)
+            ])
+    else:
+        ws_url = "ws" + base_url.removeprefix("http")
+        await asyncio.gather(*[ws_session(ws_url, session, args, results) for session in range(args.sessions)])
+    return results.report(time.perf_counter() - start)
+
+def parse_histogram(text: str, name: str) -> tuple[list[tuple[float, float]], float]:
+    """Read cumulative (le, count) buckets and the total count of an unlabelled histogram."""
+    buckets, count = [], 0.0
+    for line in text.splitlines():
+        if line.startswith(f"{name}_bucket"):
+            bound = line.split('le="', 1)[1].split('"', 1)[0]
+            buckets.append((float("inf") if bound == "+Inf" else float(bound), float(line.rsplit(" ", 1)[1])))
+        elif line.startswith(f"{name}_count"):
+            count = float(line.rsplit(" ", 1)[1])
+    return buckets, count
+
+def server_loop_lag(before: str, after: str) -> dict:
+    """Bucketed server event loop lag percentiles over the test, from /metrics."""
+    name = "agora_event_loop_lag_seconds"
+    old_buckets, old_count = parse_histogram(before, name)
+    new_buckets, new_count = parse_histogram(after, name)
+    samples = new_count - old_count
+    if samples <= 0:
+        return {"count": 0}
+    old = dict(old_buckets)
+    deltas = [(bound, cumulative - old.get(bound, 0.0)) for bound, cumulative in new_buckets]
+
+    def upper_bound(pct: float) -> Optional[float]:
+        for bound, cumulative in deltas:
+            if cumulative >= samples * pct / 100:
+                return None if bound == float("inf") else bound * 1000
+        return None
+
+    return {
+        "count": int(samples),
+        "p50_ms_at_most": upper_bound(50),
+        "p95_ms_at_most": upper_bound(95),
+        "p99_ms_at_most": upper_bound(99)
+    }
+
+def start_servers(args, workdir: Path) -> tuple[list[subprocess.Popen], str, str]:
+    """Start the mock API and the backend; return the processes, backend URL and mock URL."""
+    mock_port, backend_port = free_port(), free_port()
+    log = open(workdir / "servers.log", "w")
+    mock = subprocess.Popen(
+        [
+            sys.executable, str(MOCK_SERVER), "--port", str(mock_port),
+            "--ttft-ms", str(args.ttft_ms), "--jitter-ms", str(args.jitter_ms),
+            "--token-jitter", str(args.token_jitter),
+            "--tokens-per-second", str(args.tokens_per_second),
+            "--response-tokens", str(args.response_tokens),
+            "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate)
+        ],
+        stdout=log, stderr=subprocess.STDOUT
+    )
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="sk-load-test",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+        RESPONSE_CACHE_PATH="",
+        MEMORY_DIR=str(workdir / "memory")  # Keeps test conversations out of the real databases
+    )
+    backend = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(BACKEND_DIR),
+            "--port", str(backend_port), "--log-level", "warning"
+        ],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    return [mock, backend], f"http://127.0.0.1:{backend_port}", f"http://127.0.0.1:{mock_port}"
+
+def stop_servers(processes: list[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+async def run(args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="agora-load-"))
+    processes = []
+    base_url = args.target
+    try:
+        if not base_url:
+            processes, base_url, mock_url = start_servers(args, workdir)
+            await wait_until_up(f"{mock_url}/docs")
+        await wait_until_up(f"{base_url}/")
+
+        async with httpx.AsyncClient() as client:
+            metrics_before = (await client.get(f"{base_url}/metrics")).text
+
+        probe = LoopLagProbe()
+        probe.start()
+        transports = ["rest", "ws"] if args.transport == "both" else [args.transport]
+        results = {transport: await run_transport(transport, base_url, args) for transport in transports}
+        await probe.stop()
+
+        async with httpx.AsyncClient() as client:
+            metrics_after = (await client.get(f"{base_url}/metrics")).text
+    except Exception:
+        if processes:
+            print(f"Server logs: {workdir / 'servers.log'}", file=sys.stderr)
+        raise
+    finally:
+        stop_servers(processes)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {
+            key: getattr(args, key) for key in (
+                "sessions", "turns", "transport", "agent", "ttft_ms", "jitter_ms", "token_jitter",
+                "tokens_per_second", "response_tokens", "error_rate", "rate_limit_rate"
+            )
+        },
+        "target": args.target or "local",
+        "results": results,
+        "event_loop_lag": {
+            "server": server_loop_lag(metrics_before, metrics_after),
+            "client": summarize(probe.samples)
+        }
+    }
+
+def print_report(report: dict):
+    print(f"Commit {report['commit']}  {report['config']}")
+    for transport, result in report["results"].items():
+        ttft, latency = result["ttft"], result["latency"]
+        print(
+            f"{transport:<5} turns={result['turns']:<5} errors={result['errors']:<4} "
+            f"{result['turns_per_s']} turns/s {result['tokens_per_s']} tokens/s"
+        )
+        if ttft.get("count"):
+            print(f"      ttft    p50={ttft['p50_ms']}ms p95={ttft['p95_ms']}ms p99={ttft['p99_ms']}ms")
+        if latency.get("count"):
+            print(f"      latency p50={latency['p50_ms']}ms p95={latency['p95_ms']}ms p99={latency['p99_ms']}ms")
+        for message, count in result["error_messages"].items():
+            print(f"      {count}x {message}")
+    lag = report["event_loop_lag"]
+    print(f"server loop lag {lag['server']}")
+    print(f"client loop lag {lag['client']}")
+
+def compare(before_path: str, after_path: str):
+    """Print relative change of the headline numbers between two saved runs."""
+    before = json.loads(Path(before_path).read_text())
+    after = json.loads(Path(after_path).read_text())
+    print(f"{before['commit']} -> {after['commit']}")
+    for transport in after["results"]:
+        if transport not in before["results"]:
+            continue
+        old, new = before["results"][transport], after["results"][transport]
+        rows = [("turns_per_s", old["turns_per_s"], new["turns_per_s"])]
+        for metric in ("ttft", "latency"):
+            for pct in ("p50_ms", "p95_ms", "p99_ms"):
+                rows.append((f"{metric} {pct}", old[metric].get(pct), new[metric].get(pct)))
+        for label, old_value, new_value in rows:
+            if old_value is None or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            print(f"{transport:<5} {label:<16} {old_value:>10} -> {new_value:>10}  ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50, help="Concurrent sessions per transport")
+    parser.add_argument("--turns", type=int, default=3, help="Sequential queries per session")
+    parser.add_argument("--transport", choices=["rest", "ws", "both"], default="both")
+    parser.add_argument("--agent", default="paper_writer")
+    parser.add_argument("--target", help="Base URL of a running backend instead of starting one")
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--token-jitter", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--response-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two saved reports")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Saved {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Local stand-in for the OpenAI chat completions API, for offline load tests.
+
+Streams word-sized tokens as server-sent events with a configurable time to
+first token, jitter, throughput and error rates. Errors are 429s (with
+Retry-After) and 500s, returned before any token is sent.
+
+Usage (from backend/):
+    python benchmarks/mock_openai.py [--port 9100] [--ttft-ms 300] [--tokens-per-second 50]
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:9100/v1.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "the of and to in is that for it as with was on be by this are or from at which "
+    "an have not but they their were has more can one all other these its also such "
+    "research results model data system analysis between however first used study"
+).split()
+
+class MockSettings:
+    """Behaviour of the mock server; mutable so tests can adjust it in-process."""
+
+    def __init__(
+        self,
+        ttft_ms: float = 300,
+        jitter_ms: float = 50,
+        token_jitter: float = 0.2,
+        tokens_per_second: float = 50,
+        response_tokens: int = 120,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        seed: int = 0
+    ):
+        self.ttft_ms = ttft_ms
+        self.jitter_ms = jitter_ms
+        self.token_jitter = token_jitter
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+    def delay(self, base_ms: float, jitter_ms: float) -> float:
+        """Seconds to wait: base plus uniform jitter, never negative."""
+        jitter = self.random.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0.0
+        return max(0.0, base_ms + jitter) / 1000
+
+    def first_token_delay(self) -> float:
+        return self.delay(self.ttft_ms, self.jitter_ms)
+
+    def token_delay(self, gap_ms: float) -> float:
+        # Jitter proportional to the gap keeps the configured throughput on average
+        return self.delay(gap_ms, gap_ms * self.token_jitter)
+
+def _error(status: int, message: str, error_type: str, headers: dict | None = None) -> JSONResponse:
+    body = {"error": {"message": message, "type": error_type, "param": None, "code": None}}
+    return JSONResponse(body, status_code=status, headers=headers)
+
+def _chunk(completion_id: str, model: str, created: int, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+def create_app(settings: MockSettings) -> FastAPI:
+    """Build the mock API app."""
+    app = FastAPI(title="Mock OpenAI")
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        model = body.get("model", "gpt-4o-mini")
+
+        roll = settings.random.random()
+        if roll < settings.rate_limit_rate:
+            return _error(
+                429, "Rate limit reached (mock)", "requests",
+                headers={"Retry-After": str(settings.retry_after)}
+            )
+        if roll < settings.rate_limit_rate + settings.error_rate:
+            return _error(500, "Internal server error (mock)", "server_error")
+
+        limit = body.get("max_tokens") or settings.response_tokens
+        count = min(settings.response_tokens, limit)
+        words = [settings.random.choice(WORDS) for _ in range(count)]
+        tokens = [word if i == 0 else " " + word for i, word in enumerate(words)]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        gap_ms = 1000 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0
+
+        if not body.get("stream"):
+            await asyncio.sleep(settings.first_token_delay() + len(tokens) * gap_ms / 1000)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+            }
+
+        async def stream():
+            await asyncio.sleep(settings.first_token_delay())
+            yield _chunk(completion_id, model, created, {"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(settings.token_delay(gap_ms) if gap_ms else 0)
+                yield _chunk(completion_id, model, created, {"content": token})
+            yield _chunk(completion_id, model, created, {}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Uniform jitter of the time to first token")
+    parser.add_argument("--token-jitter", type=float, default=0.2, help="Jitter of token gaps, as a fraction of the gap")
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--response-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        ttft_ms=args.ttft_ms,
+        jitter_ms=args.jitter_ms,
+        token_jitter=args.token_jitter,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
 """Core modules for agent orchestration and memory."""
 
 from .memory import MemoryManager
+from .memory_store import MemoryStore
 from .router import AgentRouter
+from .discovery import AgentManifest
 from .orchestrator import Orchestrator
+from .registry import AgentRegistry
+from .resources import AppResources
 
-__all__ = ["MemoryManager", "AgentRouter", "Orchestrator"]
+__all__ = ["MemoryManager", "MemoryStore", "AgentRouter", "AgentManifest", "Orchestrator", "AgentRegistry", "AppResources"]
@@ -0,0 +1,224 @@
+"""Bulk execution of chat queries with bounded concurrency and checkpoints."""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncGenerator, Iterable, Optional
+from utils.llm_scheduler import LLMOverloaded, Priority, llm_priority
+from utils.logger import logger
+from .orchestrator import Orchestrator
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+MAX_BATCH_CONCURRENCY = 64
+# Attempts per item when the LLM scheduler rejects it under load
+BATCH_MAX_ATTEMPTS = int(os.getenv("BATCH_MAX_ATTEMPTS", "3"))
+BATCH_RETRY_SECONDS = float(os.getenv("BATCH_RETRY_SECONDS", "5"))
+# Where the HTTP endpoint keeps checkpoints of named batches; the default does
+# not depend on the directory the server or CLI is started from
+BATCH_DIR = Path(os.getenv("BATCH_DIR", "").strip() or Path(__file__).resolve().parent.parent / "cache" / "batches")
+
+def parse_items(lines: Iterable[str]) -> tuple[list[dict], list[dict]]:
+    """
+    Parse JSONL lines of {"query", "session_id", "agent_name", "id"}.
+
+    Items without an "id" are numbered by line, so re-reading the same
+    input gives the same ids.
+
+    Returns:
+        Valid items, and error results for invalid lines
+    """
+    items, invalid = [], []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            if not isinstance(item, dict) or not isinstance(item.get("query"), str) or not item["query"]:
+                raise ValueError("expected an object with a non-empty \"query\"")
+        except ValueError as e:
+            invalid.append({"id": str(number), "status": "error", "error": f"Line {number}: {e}"})
+            continue
+        item["id"] = str(item.get("id", number))
+        items.append(item)
+    return items, invalid
+
+class BatchCheckpoint:
+    """
+    Progress of a batch, stored as its JSONL results.
+
+    Results are appended as items finish; on restart, items with an "ok"
+    result are skipped. A line cut off by a crash is ignored.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.completed: dict[str, dict] = {}  # id -> ok result
+        self._file = None
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                if result.get("status") == "ok":
+                    self.completed[str(result.get("id"))] = result
+
+    def record(self, result: dict):
+        """Append one result and flush it to the OS."""
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a+")
+            # Start on a fresh line if the last write was cut off
+            if self._file.tell() > 0:
+                self._file.seek(self._file.tell() - 1)
+                if self._file.read(1) != "\n":
+                    self._file.write("\n")
+        self._file.write(json.dumps(result) + "\n")
+        self._file.flush()
+        if result.get("status") == "ok":
+            self.completed[result["id"]] = result
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class BatchRunner:
+    """
+    Runs chat queries through the orchestrator with at most `concurrency` at once.
+
+    Items of the same session run one at a time in input order, so
+    multi-turn conversations keep their order; other items run in parallel.
+    Results are yielded as items finish, not in input order. Calls run at
+    background priority, behind interactive traffic on the same server.
+    """
+
+    def __init__(self, orchestrator: Orchestrator, concurrency: int = BATCH_CONCURRENCY):
+        self.orchestrator = orchestrator
+        self.concurrency = min(max(1, concurrency), MAX_BATCH_CONCURRENCY)
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.response_chars = 0
+        self.latencies: list[float] = []
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    async def _answer(self, item: dict) -> dict:
+        """Run one item, retrying while the LLM scheduler is overloaded."""
+        session_id = item.get("session_id") or str(uuid.uuid4())
+        result = {"id": item["id"], "session_id": session_id, "agent_used": item.get("agent_name") or "auto"}
+        start = time.perf_counter()
+        for attempt in range(1, BATCH_MAX_ATTEMPTS + 1):
+            try:
+                with llm_priority(Priority.BACKGROUND):
+                    response = await self.orchestrator.handle_query(
+                        query=item["query"],
+                        session_id=session_id,
+                        agent_name=item.get("agent_name"),
+                        stream=False,
+                        # An error reply is not an answer: recorded as failed, so a resumed batch retries it
+                        raise_errors=True
+                    )
+                result.update(status="ok", response=response)
+                break
+            except LLMOverloaded as e:
+                if attempt == BATCH_MAX_ATTEMPTS:
+                    result.update(status="error", error=str(e))
+                    break
+                logger.warning(f"Batch item {item['id']} rejected under load, retrying: {e}")
+                await asyncio.sleep(BATCH_RETRY_SECONDS * attempt)
+            except Exception as e:
+                result.update(status="error", error=str(e))
+                break
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        return result
+
+    async def run(
+        self,
+        items: list[dict],
+        checkpoint: Optional[BatchCheckpoint] = None
+    ) -> AsyncGenerator[dict, None]:
+        """
+        Execute items and yield their results in completion order.
+
+        Args:
+            items: Parsed items (see parse_items)
+            checkpoint: Skips items it already completed and records new results
+
+        Yields:
+            One result per executed item, with "status" "ok" or "error"
+        """
+        self.started = time.perf_counter()
+        pending = [item for item in items if not (checkpoint and item["id"] in checkpoint.completed)]
+        self.skipped = len(items) - len(pending)
+        if self.skipped:
+            logger.info(f"Batch resuming: {self.skipped} items already done, {len(pending)} to go")
+
+        queue = iter(pending)
+        results: asyncio.Queue = asyncio.Queue()
+        session_locks: dict[str, asyncio.Lock] = {}
+        # Locks are taken in input order (items are dequeued in order), so a session's turns stay ordered
+        for item in pending:
+            if item.get("session_id"):
+                session_locks.setdefault(item["session_id"], asyncio.Lock())
+
+        async def worker():
+            for item in queue:
+                lock = session_locks.get(item.get("session_id"))
+                if lock:
+                    async with lock:
+                        result = await self._answer(item)
+                else:
+                    result = await self._answer(item)
+                await results.put(result)
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, len(pending)))]
+        try:
+            for _ in range(len(pending)):
+                result = await results.get()
+                if result["status"] == "ok":
+                    self.completed += 1
+                    self.response_chars += len(result["response"])
+                else:
+                    self.failed += 1
+                self.latencies.append(result["seconds"])
+                if checkpoint:
+                    checkpoint.record(result)
+                yield result
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.finished = time.perf_counter()
+
+    def report(self) -> dict:
+        """Throughput and latency of the items executed so far."""
+        elapsed = ((self.finished or time.perf_counter()) - self.started) if self.started else 0.0
+        latencies = sorted(self.latencies)
+
+        def percentile(pct: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))]
+
+        executed = self.completed + self.failed
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed_seconds": round(elapsed, 3),
+            "items_per_second": round(executed / elapsed, 3) if elapsed else 0.0,
+            "response_chars_per_second": round(self.response_chars / elapsed, 1) if elapsed else 0.0,
+            "p50_seconds": percentile(50),
+            "p95_seconds": percentile(95),
+            "concurrency": self.concurrency
+        }
@@ -0,0 +1,115 @@
+"""Background compaction of old conversation turns into running summaries."""
+
+import asyncio
+import os
+import time
+from typing import Optional
+from utils.llm_scheduler import Priority, llm_priority
+from utils.logger import logger
+from utils.openai_client import llm_call
+from .memory import MemoryManager, Summarizer
+
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPACTION_MODEL = os.getenv("COMPACTION_MODEL", "gpt-4o-mini")
+COMPACTION_KEEP_RECENT = int(os.getenv("COMPACTION_KEEP_RECENT", "6"))
+COMPACTION_MIN_MESSAGES = int(os.getenv("COMPACTION_MIN_MESSAGES", "10"))
+COMPACTION_INTERVAL_SECONDS = float(os.getenv("COMPACTION_INTERVAL_SECONDS", "60"))
+COMPACTION_CONCURRENCY = int(os.getenv("COMPACTION_CONCURRENCY", "2"))
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an assistant.
+
+Current summary:
+{previous}
+
+New messages:
+{messages}
+
+Rewrite the summary so it also covers the new messages. Keep facts, decisions,
+user preferences and open questions; drop pleasantries. Answer with the summary
+only, in at most 200 words."""
+
+def llm_summarizer(model: str = COMPACTION_MODEL) -> Summarizer:
+    """Build a summarizer that folds messages into the summary with an LLM call."""
+
+    async def summarize(previous: Optional[str], messages: list[dict]) -> str:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = SUMMARY_PROMPT.format(previous=previous or "(none yet)", messages=transcript)
+        with llm_priority(Priority.BACKGROUND):
+            return await llm_call(prompt, model=model, temperature=0.2, max_tokens=400)
+
+    return summarize
+
+class CompactionScheduler:
+    """
+    Runs summarization jobs off the request path.
+
+    `schedule` returns immediately. Each session is compacted at most once per
+    `min_interval` seconds and never twice at the same time, and at most
+    `max_concurrent` jobs run across all sessions.
+    """
+
+    def __init__(
+        self,
+        summarizer: Optional[Summarizer] = None,
+        keep_recent: int = COMPACTION_KEEP_RECENT,
+        min_messages: int = COMPACTION_MIN_MESSAGES,
+        min_interval: float = COMPACTION_INTERVAL_SECONDS,
+        max_concurrent: int = COMPACTION_CONCURRENCY
+    ):
+        self.summarizer = summarizer or llm_summarizer()
+        self.keep_recent = keep_recent
+        self.min_messages = min_messages
+        self.min_interval = min_interval
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._last_run: dict[tuple, float] = {}  # (agent, session) -> monotonic start time
+        self._tasks: dict[tuple, asyncio.Task] = {}
+
+    def schedule(self, memory: MemoryManager, session_id: str) -> bool:
+        """
+        Queue compaction for a session unless it ran recently or is running.
+
+        Returns:
+            True if a job was started
+        """
+        key = (memory.agent_name, session_id)
+        now = time.monotonic()
+        if key in self._tasks or now - self._last_run.get(key, float("-inf")) < self.min_interval:
+            return False
+
+        self._last_run[key] = now
+        self._prune(now)
+        task = asyncio.create_task(self._run(memory, session_id))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return True
+
+    async def _run(self, memory: MemoryManager, session_id: str):
+        async with self._semaphore:
+            try:
+                await memory.summarize_old_context(
+                    session_id,
+                    self.summarizer,
+                    keep_recent=self.keep_recent,
+                    min_messages=self.min_messages
+                )
+            except Exception as e:
+                logger.error(f"Compaction failed for session {session_id}: {e}")
+
+    def _prune(self, now: float):
+        """Forget rate-limit entries older than the interval."""
+        if len(self._last_run) > 10_000:
+            self._last_run = {
+                key: started for key, started in self._last_run.items()
+                if now - started < self.min_interval
+            }
+
+    async def drain(self):
+        """Wait for running jobs to finish."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def close(self):
+        """Cancel running jobs."""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await self.drain()
@@ -0,0 +1,205 @@
+"""In-memory LRU cache of recent messages per session."""
+
+import os
+from collections import OrderedDict, deque
+from typing import Iterable, List, Optional, Sequence
+
+CACHE_MAX_SESSIONS = int(os.getenv("CONTEXT_CACHE_SESSIONS", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("CONTEXT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+CACHE_RING_SIZE = int(os.getenv("CONTEXT_CACHE_RING_SIZE", "20"))
+
+def select_window(
+    messages: Sequence[tuple],
+    limit: int,
+    token_budget: Optional[int] = None
+) -> tuple[list[tuple], bool]:
+    """
+    Pick the most recent messages that fit a message limit and token budget.
+
+    Args:
+        messages: Chronological tuples starting with (role, content, tokens)
+        limit: Maximum number of messages
+        token_budget: Maximum total tokens, or None for no budget
+
+    Returns:
+        Selected messages in chronological order, and whether a limit was hit
+        (False means every message fitted, so older history could add more)
+    """
+    selected = []
+    used = 0
+    for message in reversed(messages):
+        if len(selected) >= limit:
+            return selected[::-1], True
+        if token_budget is not None and used + message[2] > token_budget:
+            return selected[::-1], True
+        selected.append(message)
+        used += message[2]
+    return selected[::-1], len(selected) >= limit
+
+class _Entry:
+    """Ring buffer of a session's most recent messages."""
+
+    __slots__ = ("messages", "summary", "size", "complete")
+
+    def __init__(self, ring_size: int, summary: Optional[tuple] = None):
+        self.messages = deque(maxlen=ring_size)  # (role, content, tokens, size)
+        self.summary = summary  # (content, tokens) of the running summary, if any
+        self.size = len(summary[0].encode("utf-8")) if summary else 0
+        # True while the ring holds the session's entire unsummarized history
+        self.complete = False
+
+class SessionContextCache:
+    """
+    Bounded LRU cache mapping session_id to its most recent messages.
+
+    Sessions are evicted least-recently-used first once either the number of
+    cached sessions or the total size of cached message text exceeds its
+    limit. A lookup is a hit when the ring holds enough messages to reach
+    the requested message limit or token budget, or holds the whole session.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = CACHE_MAX_SESSIONS,
+        max_bytes: int = CACHE_MAX_BYTES,
+        ring_size: int = CACHE_RING_SIZE
+    ):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ring_size = ring_size
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._fills: dict[str, object] = {}  # session_id -> token of the latest fill
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_sessions > 0 and self.ring_size > 0
+
+    def get(
+        self,
+        session_id: str,
+        limit: int,
+        token_budget: Optional[int] = None
+    ) -> Optional[tuple[Optional[tuple], List[tuple]]]:
+        """
+        Return the session's context window, or None on a miss.
+
+        Returns:
+            The (content, tokens) running summary or None, and the chronological
+            (role, content, tokens) messages selected by select_window
+        """
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if token_budget is not None and entry.summary:
+            token_budget = max(0, token_budget - entry.summary[1])
+        selected, saturated = select_window(entry.messages, limit, token_budget)
+        if not saturated and not entry.complete:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(session_id)
+        return entry.summary, [(role, content, tokens) for role, content, tokens, _ in selected]
+
+    def begin_fill(self, session_id: str) -> object:
+        """
+        Mark the start of a database read that will populate the cache.
+
+        Returns:
+            Token to pass to `fill`; writes to the session in the meantime
+            invalidate it so a stale read is never cached
+        """
+        token = object()
+        self._fills[session_id] = token
+        return token
+
+    def fill(
+        self,
+        session_id: str,
+        summary: Optional[tuple],
+        messages: Iterable[tuple],
+        complete: bool,
+        token: object
+    ):
+        """Cache a summary and the (role, content, tokens) messages after it, oldest first."""
+        if self._fills.get(session_id) is not token:
+            return
+        del self._fills[session_id]
+
+        self._drop(session_id)
+        entry = _Entry(self.ring_size, summary)
+        self.total_bytes += entry.size
+        count = 0
+        for role, content, tokens in messages:
+            self._push(entry, role, content, tokens)
+            count += 1
+        entry.complete = complete and count <= self.ring_size
+        self._entries[session_id] = entry
+        self._evict()
+
+    def cancel_fill(self, session_id: str, token: object):
+        """Forget a fill that will not complete."""
+        if self._fills.get(session_id) is token:
+            del self._fills[session_id]
+
+    def discard_fill(self, session_id: str):
+        """Stop an in-progress fill from caching a read that may predate a write."""
+        self._fills.pop(session_id, None)
+
+    def append(self, session_id: str, role: str, content: str, tokens: int):
+        """Record a newly saved message for a session that is already cached."""
+        self._fills.pop(session_id, None)
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+        self._push(entry, role, content, tokens)
+        self._entries.move_to_end(session_id)
+        self._evict()
+
+    def invalidate(self, session_id: str):
+        """Drop a session from the cache."""
+        self._fills.pop(session_id, None)
+        self._drop(session_id)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current occupancy."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "sessions": len(self._entries),
+            "bytes": self.total_bytes
+        }
+
+    def _push(self, entry: _Entry, role: str, content: str, tokens: int):
+        """Append to a ring, accounting for the message it pushes out."""
+        size = len(content.encode("utf-8"))
+        if len(entry.messages) == entry.messages.maxlen:
+            entry.size -= entry.messages[0][3]
+            self.total_bytes -= entry.messages[0][3]
+            entry.complete = False
+        entry.messages.append((role, content, tokens, size))
+        entry.size += size
+        self.total_bytes += size
+
+    def _drop(self, session_id: str):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    def _evict(self):
+        """Evict least recently used sessions until both limits hold."""
+        while self._entries and (
+            len(self._entries) > self.max_sessions or self.total_bytes > self.max_bytes
+        ):
+            session_id, entry = self._entries.popitem(last=False)
+            self.total_bytes -= entry.size
+            self.evictions += 1
@@ -0,0 +1,109 @@
+"""Discovery of agents from their config files, without importing agent code."""
+
+from pathlib import Path
+from typing import Optional
+import yaml
+from utils.logger import logger
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent / "agents"
+
+# The C loader parses configs several times faster when libyaml is available
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+def _parse_keywords(raw) -> dict[str, float]:
+    """Accept a list of keywords (weight 1) or a mapping of keyword to weight."""
+    if isinstance(raw, dict):
+        return {str(keyword): float(weight) for keyword, weight in raw.items()}
+    return {str(keyword): 1.0 for keyword in raw or []}
+
+class AgentSpec:
+    """What the manifest knows about one agent, read from its config.yaml."""
+
+    def __init__(self, name: str, config: dict, mtime: float):
+        routing = config.get("routing") or {}
+        self.name = name
+        self.mtime = mtime
+        self.description = config.get("description", "")
+        self.model = config.get("model", "unknown")
+        self.keywords = _parse_keywords(routing.get("keywords"))
+        self.examples = [str(example) for example in routing.get("examples") or []]
+        self.default = bool(routing.get("default"))
+
+    def metadata(self) -> dict:
+        """Public metadata served by the agents API."""
+        return {
+            "name": self.name,
+            "description": self.description or "No description available",
+            "model": self.model
+        }
+
+class AgentManifest:
+    """
+    Index of the agents under `agents_dir`.
+
+    An agent is a folder with both config.yaml and agent.py. Scanning only
+    stats files and parses configs that changed, so it is cheap to repeat;
+    agent modules are imported later, by the registry, on first use. An
+    edited config that fails to parse leaves the agent as it was until the
+    file is fixed; only a missing folder or file removes it.
+    """
+
+    def __init__(self, agents_dir: Path = AGENTS_DIR):
+        self.agents_dir = agents_dir
+        self.specs: dict[str, AgentSpec] = {}
+        self._unreadable: dict[str, float] = {}  # agent -> mtime of a config that failed to parse
+        # Incremented whenever an agent is added, removed or its config changes
+        self.version = 0
+        self.scan()
+
+    def scan(self) -> list[str]:
+        """
+        Pick up added, removed and edited agents.
+
+        Returns:
+            Names of the agents that changed
+        """
+        found = {}
+        changed = []
+        for agent_dir in sorted(self.agents_dir.iterdir()):
+            config_path = agent_dir / "config.yaml"
+            if agent_dir.name.startswith(("_", ".")) or not (agent_dir / "agent.py").is_file():
+                continue
+            try:
+                mtime = config_path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+
+            spec = self.specs.get(agent_dir.name)
+            if (spec is None or spec.mtime != mtime) and self._unreadable.get(agent_dir.name) != mtime:
+                try:
+                    with open(config_path) as f:
+                        parsed = AgentSpec(agent_dir.name, yaml.load(f, Loader=_YAML_LOADER) or {}, mtime)
+                except Exception as e:
+                    # Logged once per edit; a known agent keeps its previous config
+                    self._unreadable[agent_dir.name] = mtime
+                    kept = "keeping its previous config" if spec else "skipping it"
+                    logger.error(f"Unreadable config for agent {agent_dir.name}, {kept}: {e}")
+                else:
+                    self._unreadable.pop(agent_dir.name, None)
+                    spec = parsed
+                    changed.append(agent_dir.name)
+            if spec is not None:
+                found[agent_dir.name] = spec
+
+        changed.extend(name for name in self.specs if name not in found)
+        if changed:
+            self.specs = found
+            self.version += 1
+            logger.info(f"Discovered agents {list(found)} (changed: {changed})")
+        return changed
+
+    def get(self, agent_name: str) -> Optional[AgentSpec]:
+        return self.specs.get(agent_name)
+
+    def names(self) -> list[str]:
+        """Return discovered agent names in a stable order."""
+        return list(self.specs)
+
+    def __contains__(self, agent_name: str) -> bool:
+        return agent_name in self.specs
@@ -1,130 +1,347 @@
-"""Memory management for agent conversations using SQLite."""
+"""Memory management for agent conversations."""
 
-import sqlite3
-import json
-from pathlib import Path
-from typing import List, Dict
-from datetime import datetime
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, List, Dict, Optional
 from utils.logger import logger
+from utils.tokenizer import count_tokens
+from .memory_store import MemoryStore, MEMORY_BACKEND, create_memory_store, memory_store_class
+from .sqlite_pool import DEFAULT_POOL_SIZE
+from .write_behind import WriteBehindQueue, WRITE_BEHIND_ENABLED
+from .context_cache import SessionContextCache, select_window
+
+# Folds new messages into a running summary: (previous_summary, messages) -> summary
+Summarizer = Callable[[Optional[str], List[Dict[str, str]]], Awaitable[str]]
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+# A streamed reply is appended to its row once this much text is buffered or
+# this long after the first unsaved chunk, whichever comes first
+STREAM_FLUSH_CHARS = int(os.getenv("MEMORY_STREAM_FLUSH_CHARS", "2048"))
+STREAM_FLUSH_MS = int(os.getenv("MEMORY_STREAM_FLUSH_MS", "500"))
+
+class StreamRecorder:
+    """
+    Persists a streamed assistant reply while it is being generated.
+
+    `MemoryManager.open_stream` creates the row with status "streaming";
+    chunks are appended to it in batches by a background write, so only the
+    unsaved tail is held in memory and a crash loses at most one batch.
+    `finish` writes the rest and marks the row "complete" or "aborted".
+    """
+
+    def __init__(
+        self,
+        memory: "MemoryManager",
+        session_id: str,
+        row_id: int,
+        flush_chars: int = STREAM_FLUSH_CHARS,
+        flush_ms: int = STREAM_FLUSH_MS
+    ):
+        self.memory = memory
+        self.session_id = session_id
+        self.row_id = row_id
+        self.flush_chars = flush_chars
+        self.flush_interval = flush_ms / 1000
+        self.finished = False
+        self._buffer: list[str] = []
+        self._buffered = 0
+        self._first_buffered: Optional[float] = None
+        self._flushing: Optional[asyncio.Task] = None
+
+    def add(self, chunk: str):
+        """Buffer a chunk, starting a background append when a batch is due."""
+        self._buffer.append(chunk)
+        self._buffered += len(chunk)
+        now = time.monotonic()
+        if self._first_buffered is None:
+            self._first_buffered = now
+        due = self._buffered >= self.flush_chars or now - self._first_buffered >= self.flush_interval
+        # One append at a time keeps the batches in order
+        if due and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.create_task(self._flush())
+
+    def _take(self) -> str:
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffered = 0
+        self._first_buffered = None
+        return text
+
+    async def _flush(self):
+        text = self._take()
+        try:
+            await self.memory.store.append_stream(self.session_id, self.row_id, text)
+        except Exception as e:
+            # Keep the text so the next batch or `finish` writes it
+            self._buffer.insert(0, text)
+            self._buffered += len(text)
+            logger.error(f"Failed to append streamed reply {self.row_id}: {e}")
+
+    async def finish(self, status: str = "complete"):
+        """
+        Write the remaining text and record how the stream ended.
+
+        Args:
+            status: "complete", or "aborted" for a stream cut short
+        """
+        if self.finished:
+            return
+        self.finished = True
+        if self._flushing is not None:
+            await self._flushing
+        await self.memory._finish_stream(self, self._take(), status)
 
 class MemoryManager:
-    """Manages conversation memory for each agent using SQLite."""
+    """
+    Manages conversation memory for each agent.
+
+    Messages are kept in the MemoryStore of the configured backend (SQLite
+    by default, see memory_store). In write-behind mode,
+    saved messages are batched by a WriteBehindQueue and merged back into
+    `load_context` until they are committed. Recent messages of active
+    sessions are served from a SessionContextCache, unless the store is
+    shared with other processes, whose writes the cache would miss.
+
+    Older turns can be folded into a stored running summary per session by
+    `summarize_old_context`; `load_context` then returns that summary
+    followed by the turns that came after it.
 
-    def __init__(self, agent_name: str):
+    Streamed replies are saved while they are generated, through the
+    StreamRecorder returned by `open_stream`.
+    """
+
+    def __init__(
+        self,
+        agent_name: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        write_behind: bool = WRITE_BEHIND_ENABLED,
+        backend: str = MEMORY_BACKEND,
+        store: Optional[MemoryStore] = None
+    ):
         self.agent_name = agent_name
-        self.db_path = Path(f"agents/{agent_name}/memory.db")
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self._init_db()
-
-    def _init_db(self):
-        """Initialize SQLite database schema."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS conversations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT NOT NULL,
-                    role TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_session
-                ON conversations(session_id, timestamp)
-            """)
-            conn.commit()
-
-    def save_message(self, session_id: str, role: str, content: str):
+        if store is None:
+            options = {"pool_size": pool_size} if backend == "sqlite" else {}
+            store = create_memory_store(agent_name, backend, **options)
+        self.store = store
+        self.writer = WriteBehindQueue(self.store) if write_behind else None
+        self.cache = SessionContextCache(max_sessions=0) if self.store.shared else SessionContextCache()
+        self._writes_in_flight = {}  # session_id -> number of unfinished saves
+
+    @staticmethod
+    def has_stored_memory(agent_name: str, backend: str = MEMORY_BACKEND) -> bool:
+        """Return False if the agent certainly has no stored conversations."""
+        return memory_store_class(backend).has_data(agent_name)
+
+    async def save_message(self, session_id: str, role: str, content: str):
         """Save a message to the conversation history."""
+        # Counted once here and stored, so reads never re-tokenize
+        tokens = count_tokens(content)
+        # Update the cache before writing and track the write as in flight, so a
+        # concurrent load_context never caches a read that missed this message
+        self.cache.append(session_id, role, content, tokens)
+        self._writes_in_flight[session_id] = self._writes_in_flight.get(session_id, 0) + 1
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute(
-                    "INSERT INTO conversations (session_id, role, content) VALUES (?, ?, ?)",
-                    (session_id, role, content)
-                )
-                conn.commit()
-            logger.info(f"Saved {role} message for session {session_id}")
+            if self.writer:
+                await self.writer.enqueue(session_id, role, content, tokens)
+                logger.info(f"Queued {role} message for session {session_id}")
+            else:
+                await self.store.insert(session_id, role, content, tokens)
+                logger.info(f"Saved {role} message for session {session_id}")
         except Exception as e:
+            self.cache.invalidate(session_id)
             logger.error(f"Failed to save message: {e}")
             raise
+        finally:
+            self._write_done(session_id)
+
+    async def open_stream(self, session_id: str) -> StreamRecorder:
+        """
+        Create the row of a streamed assistant reply before its first chunk.
+
+        Returns:
+            Recorder that appends chunks to the row; its `finish` must be awaited
+        """
+        if self.writer:
+            # The reply row must come after the queued user message
+            await self.writer.flush()
+        # Until the reply is finished, no read may fill the cache with a partial row
+        self.cache.discard_fill(session_id)
+        self._writes_in_flight[session_id] = self._writes_in_flight.get(session_id, 0) + 1
+        try:
+            row_id = await self.store.insert_stream(session_id)
+        except Exception:
+            self._write_done(session_id)
+            raise
+        return StreamRecorder(self, session_id, row_id)
+
+    async def _finish_stream(self, recorder: StreamRecorder, text: str, status: str):
+        session_id = recorder.session_id
+        try:
+            saved = await self.store.complete_stream(session_id, recorder.row_id, text, status)
+            if saved:
+                self.cache.append(session_id, "assistant", *saved)
+            logger.info(f"Saved {status} streamed reply for session {session_id}")
+        except Exception as e:
+            self.cache.invalidate(session_id)
+            logger.error(f"Failed to save streamed reply: {e}")
+            raise
+        finally:
+            self._write_done(session_id)
 
-    def load_context(self, session_id: str, limit: int = 5) -> List[Dict[str, str]]:
+    def _write_done(self, session_id: str):
+        self._writes_in_flight[session_id] -= 1
+        if not self._writes_in_flight[session_id]:
+            del self._writes_in_flight[session_id]
+
+    async def latest_reply(self, session_id: str) -> Optional[Dict]:
+        """
+        Return the newest assistant reply of a session, including one still streaming.
+
+        Returns:
+            Dict with 'message_id', 'content', 'status' and 'timestamp', or None
+        """
+        if self.writer:
+            await self.writer.flush()
+        row = await self.store.latest_reply(session_id)
+        if row is None:
+            return None
+        message_id, content, status, timestamp = row
+        return {"message_id": message_id, "content": content, "status": status, "timestamp": timestamp}
+
+    async def load_context(
+        self,
+        session_id: str,
+        limit: int = 5,
+        token_budget: Optional[int] = None
+    ) -> List[Dict[str, str]]:
         """
         Load recent conversation context for a session.
 
         Args:
             session_id: Session identifier
             limit: Maximum number of messages to load
+            token_budget: If set, load only the most recent messages whose
+                combined token count fits within it
 
         Returns:
-            List of message dicts with 'role' and 'content'
+            List of message dicts with 'role' and 'content', starting with a
+            system message carrying the running summary when one exists
         """
+        if self.cache.enabled:
+            cached = self.cache.get(session_id, limit, token_budget)
+            if cached is not None:
+                return self._format_context(*cached)
+
+        # Read a full ring on a miss so the following turns can hit the cache
+        cacheable = self.cache.enabled and session_id not in self._writes_in_flight
+        fetch = max(limit, self.cache.ring_size) if cacheable else limit
+        token = self.cache.begin_fill(session_id) if cacheable else None
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute(
-                    """
-                    SELECT role, content FROM conversations
-                    WHERE session_id = ?
-                    ORDER BY timestamp DESC
-                    LIMIT ?
-                    """,
-                    (session_id, limit)
+            # Snapshot unflushed messages before reading, so a batch committing
+            # in between shows up in the rows and is dropped from the snapshot
+            pending = self.writer.pending(session_id) if self.writer else []
+            db_budget = token_budget
+            if token_budget is not None:
+                db_budget = max(0, token_budget - sum(m.tokens for m in pending))
+            summary, rows = await self.store.select_context(session_id, fetch, db_budget)
+            summary = summary[:2] if summary else None
+
+            row_ids = {row[0] for row in rows}
+            messages = [row[1:] for row in reversed(rows)]  # Chronological order
+            messages.extend(
+                (m.role, m.content, m.tokens)
+                for m in pending
+                if m.row_id not in row_ids
+            )
+
+            if cacheable:
+                # Fewer rows than asked for, without reaching the budget, is the whole history
+                row_budget = db_budget
+                if summary and db_budget is not None:
+                    row_budget = max(0, db_budget - summary[1])
+                exhausted = len(rows) < fetch and (
+                    row_budget is None or sum(row[3] for row in rows) <= row_budget
                 )
-                messages = [
-                    {"role": row[0], "content": row[1]}
-                    for row in cursor.fetchall()
-                ]
-                # Reverse to get chronological order
-                messages.reverse()
-                logger.info(f"Loaded {len(messages)} messages for session {session_id}")
-                return messages
+                self.cache.fill(session_id, summary, messages, exhausted, token)
+
+            if token_budget is not None and summary:
+                token_budget = max(0, token_budget - summary[1])
+            selected, _ = select_window(messages, limit, token_budget)
+            logger.info(f"Loaded {len(selected)} messages for session {session_id}")
+            return self._format_context(summary, selected)
         except Exception as e:
             logger.error(f"Failed to load context: {e}")
             return []
+        finally:
+            if cacheable:
+                self.cache.cancel_fill(session_id, token)
+
+    @staticmethod
+    def _format_context(summary: Optional[tuple], messages: list[tuple]) -> List[Dict[str, str]]:
+        """Turn a summary and (role, content, tokens) tuples into chat messages."""
+        context = [{"role": role, "content": content} for role, content, _ in messages]
+        if summary:
+            context.insert(0, {"role": "system", "content": SUMMARY_PREFIX + summary[0]})
+        return context
 
-    def summarize_old_context(self, session_id: str, keep_recent: int = 5):
+    async def summarize_old_context(
+        self,
+        session_id: str,
+        summarizer: Summarizer,
+        keep_recent: int = 5,
+        min_messages: int = 1
+    ) -> bool:
         """
-        Summarize old messages to save tokens (future enhancement).
+        Fold turns older than the most recent ones into the session's running summary.
 
-        For MVP, we just delete old messages beyond the limit.
+        Only messages added since the previous summary are sent to the
+        summarizer, together with that summary, so each run costs in
+        proportion to the new turns. Messages stay in the store.
+
+        Args:
+            session_id: Session identifier
+            summarizer: Coroutine producing the updated summary
+            keep_recent: Number of newest messages left out of the summary
+            min_messages: Skip the run until at least this many messages are foldable
+
+        Returns:
+            True if the summary was updated
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                # Count total messages
-                cursor = conn.execute(
-                    "SELECT COUNT(*) FROM conversations WHERE session_id = ?",
-                    (session_id,)
-                )
-                total = cursor.fetchone()[0]
-
-                if total > keep_recent * 2:  # Only clean when significantly over limit
-                    # Delete oldest messages, keeping the most recent ones
-                    conn.execute(
-                        """
-                        DELETE FROM conversations
-                        WHERE id IN (
-                            SELECT id FROM conversations
-                            WHERE session_id = ?
-                            ORDER BY timestamp DESC
-                            LIMIT -1 OFFSET ?
-                        )
-                        """,
-                        (session_id, keep_recent)
-                    )
-                    conn.commit()
-                    logger.info(f"Cleaned old messages for session {session_id}")
+            if self.writer:
+                await self.writer.flush()
+            previous, rows = await self.store.select_unsummarized(session_id, keep_recent)
+            if not rows or len(rows) < min_messages:
+                return False
+
+            content = await summarizer(
+                previous,
+                [{"role": role, "content": text} for _, role, text in rows]
+            )
+            await self.store.store_summary(session_id, content, count_tokens(content), rows[-1][0])
+            self.cache.invalidate(session_id)
+            logger.info(f"Summarized {len(rows)} messages for session {session_id}")
+            return True
         except Exception as e:
             logger.error(f"Failed to summarize context: {e}")
+            return False
 
-    def clear_session(self, session_id: str):
+    async def clear_session(self, session_id: str):
         """Delete all messages for a session."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute(
-                    "DELETE FROM conversations WHERE session_id = ?",
-                    (session_id,)
-                )
-                conn.commit()
+            if self.writer:
+                # Queued messages would otherwise be inserted after the delete
+                await self.writer.flush()
+            await self.store.delete_session(session_id)
+            self.cache.invalidate(session_id)
             logger.info(f"Cleared session {session_id}")
         except Exception as e:
             logger.error(f"Failed to clear session: {e}")
+
+    async def close(self):
+        """Flush queued messages and close the store."""
+        if self.writer:
+            await self.writer.close()
+        await self.store.close()
@@ -0,0 +1,289 @@
+"""Storage backends for conversation memory, selected with MEMORY_BACKEND."""
+
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Iterable, Optional
+from utils.tokenizer import count_tokens
+
+BACKENDS = ("sqlite", "memory", "redis")
+MEMORY_BACKEND = os.getenv("MEMORY_BACKEND", "sqlite").strip().lower()
+# Messages kept per session by the in-memory and Redis stores, oldest trimmed first
+MAX_SESSION_MESSAGES = int(os.getenv("MEMORY_MAX_SESSION_MESSAGES", "1000"))
+# Sessions kept by the in-memory store, least recently used evicted first
+MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", "10000"))
+
+def timestamp() -> str:
+    """Current UTC time in the format of SQLite's CURRENT_TIMESTAMP."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+
+def within_budget(rows: Iterable[tuple], token_budget: Optional[int]) -> list[tuple]:
+    """
+    Take (id, role, content, tokens) rows, newest first, until the budget is exceeded.
+
+    The row that crosses the budget is included so callers can tell the
+    budget was reached rather than the history exhausted.
+    """
+    if token_budget is None:
+        return list(rows)
+    taken = []
+    used = 0
+    for row in rows:  # Stops early, so lazy iterables skip the rest
+        taken.append(row)
+        used += row[3]
+        if used > token_budget:
+            break
+    return taken
+
+class MemoryStore:
+    """
+    Where one agent's messages and running summaries are kept.
+
+    Messages get increasing integer ids per agent. A streamed reply is
+    inserted empty with status "streaming", appended to while it is
+    generated and completed with status "complete" or "aborted". The
+    MemoryManager adds caching, write-behind batching and summarization on
+    top, so stores only persist and read rows.
+    """
+
+    name = ""
+    # True when other processes read and write the same data, so nothing
+    # read from the store may be cached in this process
+    shared = False
+
+    def __init__(self, agent_name: str):
+        self.agent_name = agent_name
+
+    @classmethod
+    def has_data(cls, agent_name: str) -> bool:
+        """Return False only when the agent certainly has nothing stored yet."""
+        return True
+
+    async def insert(self, session_id: str, role: str, content: str, tokens: int) -> int:
+        """Save a message and return its id."""
+        raise NotImplementedError
+
+    async def insert_many(self, batch: list):
+        """Save queued messages (see write_behind.PendingMessage), setting their row_id."""
+        raise NotImplementedError
+
+    async def insert_stream(self, session_id: str) -> int:
+        """Create the empty "streaming" row of a reply and return its id."""
+        raise NotImplementedError
+
+    async def append_stream(self, session_id: str, row_id: int, text: str):
+        """Append text to a streaming reply."""
+        raise NotImplementedError
+
+    async def complete_stream(
+        self,
+        session_id: str,
+        row_id: int,
+        text: str,
+        status: str
+    ) -> Optional[tuple[str, int]]:
+        """
+        Append the final text and set the reply's status and token count.
+
+        Returns:
+            (content, tokens) of the reply, or None if it was empty and deleted
+        """
+        raise NotImplementedError
+
+    async def latest_reply(self, session_id: str) -> Optional[tuple]:
+        """Return (id, content, status, timestamp) of the newest assistant reply, or None."""
+        raise NotImplementedError
+
+    async def select_context(
+        self,
+        session_id: str,
+        limit: int,
+        token_budget: Optional[int]
+    ) -> tuple[Optional[tuple], list[tuple]]:
+        """
+        Read the session summary and the newest rows after it.
+
+        Rows stop at `limit` or once `token_budget` (less the summary) is
+        exceeded, as in within_budget.
+
+        Returns:
+            (content, tokens, last_message_id) of the summary or None, and
+            (id, role, content, tokens) rows, newest first
+        """
+        raise NotImplementedError
+
+    async def select_unsummarized(self, session_id: str, keep_recent: int) -> tuple[Optional[str], list[tuple]]:
+        """
+        Read the summary and the rows it does not cover yet, except the newest ones.
+
+        Returns:
+            Previous summary text or None, and (id, role, content) rows oldest first
+        """
+        raise NotImplementedError
+
+    async def store_summary(self, session_id: str, content: str, tokens: int, last_message_id: int):
+        """Replace the session's running summary."""
+        raise NotImplementedError
+
+    async def delete_session(self, session_id: str):
+        """Delete a session's messages and summary."""
+        raise NotImplementedError
+
+    async def close(self):
+        """Release connections; the store is not used afterwards."""
+
+class InMemoryStore(MemoryStore):
+    """
+    Keeps conversations in this process only, for tests and ephemeral deployments.
+
+    Nothing survives a restart and workers do not see each other's
+    sessions. Memory is bounded by `max_messages` per session and
+    `max_sessions` sessions.
+    """
+
+    name = "memory"
+
+    def __init__(
+        self,
+        agent_name: str,
+        max_sessions: int = MAX_SESSIONS,
+        max_messages: int = MAX_SESSION_MESSAGES
+    ):
+        super().__init__(agent_name)
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._sessions: OrderedDict[str, deque] = OrderedDict()  # session_id -> [id, role, content, tokens, status, timestamp] rows
+        self._summaries: dict[str, tuple] = {}  # session_id -> (content, tokens, last_message_id)
+        self._streams: dict[int, list] = {}  # row_id -> row of a streaming reply
+        self._last_id = 0
+
+    @classmethod
+    def has_data(cls, agent_name: str) -> bool:
+        # Only a live manager holds data, and callers check those first
+        return False
+
+    def _rows(self, session_id: str, create: bool = False) -> Optional[deque]:
+        rows = self._sessions.get(session_id)
+        if rows is None:
+            if not create:
+                return None
+            rows = self._sessions[session_id] = deque(maxlen=self.max_messages)
+            while len(self._sessions) > self.max_sessions:
+                evicted, _ = self._sessions.popitem(last=False)
+                self._summaries.pop(evicted, None)
+        self._sessions.move_to_end(session_id)
+        return rows
+
+    def _add(self, session_id: str, role: str, content: str, tokens: int, status: str = "complete") -> list:
+        self._last_id += 1
+        row = [self._last_id, role, content, tokens, status, timestamp()]
+        self._rows(session_id, create=True).append(row)
+        return row
+
+    async def insert(self, session_id: str, role: str, content: str, tokens: int) -> int:
+        return self._add(session_id, role, content, tokens)[0]
+
+    async def insert_many(self, batch: list):
+        for message in batch:
+            message.row_id = self._add(message.session_id, message.role, message.content, message.tokens)[0]
+
+    async def insert_stream(self, session_id: str) -> int:
+        row = self._add(session_id, "assistant", "", 0, "streaming")
+        self._streams[row[0]] = row
+        return row[0]
+
+    async def append_stream(self, session_id: str, row_id: int, text: str):
+        row = self._streams.get(row_id)
+        if row is not None:
+            row[2] += text
+
+    async def complete_stream(
+        self,
+        session_id: str,
+        row_id: int,
+        text: str,
+        status: str
+    ) -> Optional[tuple[str, int]]:
+        row = self._streams.pop(row_id, None)
+        if row is None:
+            return None
+        row[2] += text
+        if not row[2]:
+            rows = self._rows(session_id)
+            if rows is not None and row in rows:
+                rows.remove(row)
+            return None
+        row[3] = count_tokens(row[2])
+        row[4] = status
+        return row[2], row[3]
+
+    async def latest_reply(self, session_id: str) -> Optional[tuple]:
+        for row_id, role, content, _, status, ts in reversed(self._rows(session_id) or ()):
+            if role == "assistant":
+                return row_id, content, status, ts
+        return None
+
+    async def select_context(
+        self,
+        session_id: str,
+        limit: int,
+        token_budget: Optional[int]
+    ) -> tuple[Optional[tuple], list[tuple]]:
+        summary = self._summaries.get(session_id)
+        after_id = 0
+        if summary:
+            after_id = summary[2]
+            if token_budget is not None:
+                token_budget = max(0, token_budget - summary[1])
+
+        newest = (
+            (row[0], row[1], row[2], row[3])
+            for row in reversed(self._rows(session_id) or ())
+            if row[0] > after_id
+        )
+        return summary, within_budget((row for _, row in zip(range(limit), newest)), token_budget)
+
+    async def select_unsummarized(self, session_id: str, keep_recent: int) -> tuple[Optional[str], list[tuple]]:
+        summary = self._summaries.get(session_id)
+        previous, after_id = (summary[0], summary[2]) if summary else (None, 0)
+        rows = list(self._rows(session_id) or ())
+        older = rows[:-keep_recent] if keep_recent else []
+        return previous, [(row[0], row[1], row[2]) for row in older if row[0] > after_id]
+
+    async def store_summary(self, session_id: str, content: str, tokens: int, last_message_id: int):
+        self._summaries[session_id] = (content, tokens, last_message_id)
+
+    async def delete_session(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self._summaries.pop(session_id, None)
+
+def memory_store_class(backend: str = MEMORY_BACKEND) -> type:
+    """
+    Return the store class of a backend name.
+
+    Raises:
+        ValueError: If the backend is not one of BACKENDS
+    """
+    if backend == "sqlite":
+        from .sqlite_store import SQLiteStore
+        return SQLiteStore
+    if backend == "memory":
+        return InMemoryStore
+    if backend == "redis":
+        from .redis_store import RedisStore
+        return RedisStore
+    raise ValueError(f"MEMORY_BACKEND must be one of {BACKENDS}, got '{backend}'")
+
+def create_memory_store(agent_name: str, backend: str = MEMORY_BACKEND, **options) -> MemoryStore:
+    """
+    Create the store of an agent's conversations.
+
+    Args:
+        agent_name: Agent whose conversations are stored
+        backend: "sqlite", "memory" or "redis"
+        **options: Passed to the store, e.g. pool_size for SQLite
+
+    Returns:
+        A MemoryStore
+    """
+    return memory_store_class(backend)(agent_name, **options)
@@ -1,27 +1,108 @@
 """Main orchestrator for routing and executing agent requests."""
 
-import importlib
-from typing import AsyncGenerator, Optional
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import AsyncGenerator, Iterable, Optional
 from .memory import MemoryManager
 from .router import AgentRouter
+from .registry import AgentRegistry
+from .compaction import CompactionScheduler, COMPACTION_ENABLED
+from utils.llm_scheduler import LLMOverloaded
 from utils.logger import logger
+from utils.metrics import Histogram, RATE_BUCKETS
+
+# Messages loaded per turn when an agent has no token budget, and the cap
+# on messages when it does
+CONTEXT_MESSAGES = 5
+MAX_BUDGETED_MESSAGES = 50
+
+# Minimum seconds between checks of agent config files when serving metadata
+AGENT_FILES_CHECK_SECONDS = float(os.getenv("AGENT_FILES_CHECK_SECONDS", "2"))
+
+ROUTE_SECONDS = Histogram("agora_route_seconds", "Time to pick an agent for a query", ("agent",))
+AGENT_LOAD_SECONDS = Histogram("agora_agent_load_seconds", "Time to get the agent instance", ("agent",))
+CONTEXT_LOAD_SECONDS = Histogram("agora_context_load_seconds", "Time to load conversation context", ("agent",))
+MESSAGE_SAVE_SECONDS = Histogram("agora_message_save_seconds", "Time to save a message", ("agent", "role"))
+TTFT_SECONDS = Histogram(
+    "agora_time_to_first_token_seconds",
+    "Time from running the agent to its first streamed chunk, including queueing",
+    ("agent", "model")
+)
+TOKEN_GAP_SECONDS = Histogram(
+    "agora_inter_token_seconds", "Gap between consecutive streamed chunks", ("agent", "model")
+)
+GENERATION_SECONDS = Histogram(
+    "agora_generation_seconds", "Time from running the agent to its complete response", ("agent", "model", "stream")
+)
+TOKENS_PER_SECOND = Histogram(
+    "agora_stream_tokens_per_second",
+    "Streamed chunks (about one token each) per second after the first",
+    ("agent", "model"),
+    buckets=RATE_BUCKETS
+)
+
+class AgentFailed(Exception):
+    """The agent raised instead of answering; its error reply was saved to the session."""
+
+def _etag(value) -> str:
+    """Strong ETag for a JSON-serializable value."""
+    payload = json.dumps(value, sort_keys=True).encode("utf-8")
+    return '"' + hashlib.sha1(payload).hexdigest() + '"'
 
 class Orchestrator:
     """Coordinates agent selection, memory management, and execution."""
 
-    def __init__(self):
-        self.router = AgentRouter()
+    def __init__(self, registry: Optional[AgentRegistry] = None):
+        self.registry = registry or AgentRegistry()
+        self.manifest = self.registry.manifest
+        self.router = AgentRouter(self.manifest)
         self.memory_managers = {}  # Cache memory managers per agent
+        self._opening_memory: dict[str, asyncio.Future] = {}  # agent -> manager being created
+        self.compactor = CompactionScheduler() if COMPACTION_ENABLED else None
+
+        # Agent metadata keyed by name, rebuilt only when the manifest changes
+        self._agent_index: Optional[dict[str, dict]] = None
+        self._agent_index_version = -1
+        self._agent_etags: dict[str, str] = {}
+        self._agents_etag = ""
+        self._agent_files_checked = float("-inf")
+
+    async def _get_memory_manager(self, agent_name: str) -> MemoryManager:
+        """
+        Get or create a memory manager for an agent.
+
+        Opening a store can create or move its database and count the tokens
+        of old rows, so managers are created in a worker thread, once per
+        agent however many requests wait for it.
+        """
+        memory = self.memory_managers.get(agent_name)
+        if memory is not None:
+            return memory
+        opening = self._opening_memory.get(agent_name)
+        if opening is None:
+            opening = asyncio.ensure_future(asyncio.to_thread(MemoryManager, agent_name))
+            self._opening_memory[agent_name] = opening
+
+            def opened(future: asyncio.Future):
+                del self._opening_memory[agent_name]
+                if not future.cancelled() and future.exception() is None:
+                    self.memory_managers[agent_name] = future.result()
+            opening.add_done_callback(opened)
+        # Shielded so a cancelled request never abandons a store half opened
+        return await asyncio.shield(opening)
 
-    def _get_memory_manager(self, agent_name: str) -> MemoryManager:
-        """Get or create a memory manager for an agent."""
-        if agent_name not in self.memory_managers:
-            self.memory_managers[agent_name] = MemoryManager(agent_name)
-        return self.memory_managers[agent_name]
+    async def open_memory(self):
+        """Open the memory of every agent with stored conversations, so migrations run before serving."""
+        for agent_name in self.manifest.names():
+            if MemoryManager.has_stored_memory(agent_name):
+                await self._get_memory_manager(agent_name)
 
     def _load_agent(self, agent_name: str):
         """
-        Dynamically load an agent module.
+        Get the shared agent instance from the registry.
 
         Args:
             agent_name: Name of the agent folder
@@ -29,22 +110,15 @@ class Orchestrator:
         Returns:
             Agent instance
         """
-        try:
-            module = importlib.import_module(f"agents.{agent_name}.agent")
-            agent_class = getattr(module, "Agent")
-            agent_instance = agent_class()
-            logger.info(f"Loaded agent: {agent_name}")
-            return agent_instance
-        except Exception as e:
-            logger.error(f"Failed to load agent {agent_name}: {e}")
-            raise ValueError(f"Agent '{agent_name}' not found or failed to load")
+        return self.registry.get(agent_name)
 
     async def handle_query(
         self,
         query: str,
         session_id: str,
         agent_name: Optional[str] = None,
-        stream: bool = False
+        stream: bool = False,
+        raise_errors: bool = False
     ) -> str | AsyncGenerator[str, None]:
         """
         Process a user query through the appropriate agent.
@@ -54,65 +128,222 @@ class Orchestrator:
             session_id: Unique session identifier
             agent_name: Explicitly specified agent (optional)
             stream: Whether to stream the response
+            raise_errors: Raise AgentFailed when the agent fails, instead of
+                returning the error message saved as its reply
 
         Returns:
             Agent's response as string or async generator
+
+        Raises:
+            LLMOverloaded: If the LLM call was not admitted; nothing is saved
+            AgentFailed: If the agent failed and raise_errors is set
         """
         # Route to appropriate agent
-        selected_agent = self.router.route(query, agent_name)
+        start = time.perf_counter()
+        selected_agent = await self.router.route(query, agent_name)
+        ROUTE_SECONDS.labels(selected_agent).observe(time.perf_counter() - start)
         logger.info(f"Query routed to agent: {selected_agent}")
 
         # Load agent
-        agent = self._load_agent(selected_agent)
+        with AGENT_LOAD_SECONDS.labels(selected_agent).time():
+            agent = self._load_agent(selected_agent)
+        model = getattr(agent, "model", "unknown")
 
         # Get memory manager for this agent
-        memory = self._get_memory_manager(selected_agent)
+        memory = await self._get_memory_manager(selected_agent)
 
-        # Load conversation context
-        context = memory.load_context(session_id, limit=5)
+        # Load conversation context, fitted to the agent's token budget if it has one
+        token_budget = getattr(agent, "max_context", None)
+        with CONTEXT_LOAD_SECONDS.labels(selected_agent).time():
+            context = await memory.load_context(
+                session_id,
+                limit=MAX_BUDGETED_MESSAGES if token_budget else CONTEXT_MESSAGES,
+                token_budget=token_budget
+            )
 
-        # Save user query
-        memory.save_message(session_id, "user", query)
+        async def save_query():
+            with MESSAGE_SAVE_SECONDS.labels(selected_agent, "user").time():
+                await memory.save_message(session_id, "user", query)
 
-        # Run agent
+        # Run agent. The query is saved only once the LLM call was admitted, so a
+        # request rejected under load leaves no unanswered turn in the context.
+        query_saved = False
         try:
+            run_start = time.perf_counter()
             response = await agent.run(query, context, stream=stream)
+            await save_query()
+            query_saved = True
 
             if stream:
-                # For streaming, we need to collect and save the response
+                # Persist the reply as it streams, so a disconnect or crash keeps what was sent
                 async def stream_and_save():
-                    collected = []
-                    async for chunk in response:
-                        collected.append(chunk)
-                        yield chunk
-                    # Save complete response after streaming
-                    full_response = "".join(collected)
-                    memory.save_message(session_id, "assistant", full_response)
+                    recorder = await memory.open_stream(session_id)
+                    status = "aborted"
+                    chunks = 0
+                    gap = TOKEN_GAP_SECONDS.labels(selected_agent, model)
+                    first = last = None
+                    try:
+                        async for chunk in response:
+                            now = time.perf_counter()
+                            if first is None:
+                                first = now
+                                TTFT_SECONDS.labels(selected_agent, model).observe(now - run_start)
+                            else:
+                                gap.observe(now - last)
+                            last = now
+                            chunks += 1
+                            recorder.add(chunk)
+                            yield chunk
+                        status = "complete"
+                        self._observe_stream(selected_agent, model, run_start, first, last, chunks)
+                    finally:
+                        # Shielded so a cancelled consumer still records where the reply stopped
+                        with MESSAGE_SAVE_SECONDS.labels(selected_agent, "assistant").time():
+                            await asyncio.shield(recorder.finish(status))
+                    self._schedule_compaction(memory, session_id)
 
                 return stream_and_save()
             else:
+                GENERATION_SECONDS.labels(selected_agent, model, "false").observe(time.perf_counter() - run_start)
                 # Save assistant response
-                memory.save_message(session_id, "assistant", response)
+                with MESSAGE_SAVE_SECONDS.labels(selected_agent, "assistant").time():
+                    await memory.save_message(session_id, "assistant", response)
+                self._schedule_compaction(memory, session_id)
                 return response
 
+        except LLMOverloaded:
+            # Not an answer: let the caller report it instead of saving it to memory
+            raise
         except Exception as e:
             logger.error(f"Agent execution failed: {e}")
             error_msg = f"I encountered an error: {str(e)}"
-            memory.save_message(session_id, "assistant", error_msg)
+            if not query_saved:
+                await save_query()
+            await memory.save_message(session_id, "assistant", error_msg)
+            if raise_errors:
+                raise AgentFailed(str(e)) from e
             return error_msg
 
+    @staticmethod
+    def _observe_stream(agent_name: str, model: str, start: float, first: Optional[float], last: Optional[float], chunks: int):
+        """Record duration and throughput of a completed stream."""
+        end = time.perf_counter()
+        GENERATION_SECONDS.labels(agent_name, model, "true").observe(end - start)
+        if first is not None and chunks > 1 and last > first:
+            TOKENS_PER_SECOND.labels(agent_name, model).observe((chunks - 1) / (last - first))
+
+    def _refresh_agent_index(self):
+        """Rebuild the metadata index if agent files changed since it was built."""
+        now = time.monotonic()
+        if now - self._agent_files_checked >= AGENT_FILES_CHECK_SECONDS:
+            self._agent_files_checked = now
+            self.reload_agents()
+
+        if self._agent_index is not None and self._agent_index_version == self.manifest.version:
+            return
+
+        # Served from the manifest, so listing agents never imports their code
+        index = {name: spec.metadata() for name, spec in self.manifest.specs.items()}
+
+        self._agent_index = index
+        self._agent_etags = {name: _etag(metadata) for name, metadata in index.items()}
+        self._agents_etag = _etag(list(index.values()))
+        self._agent_index_version = self.manifest.version
+
     def list_available_agents(self) -> list[dict]:
         """Return list of available agents with metadata."""
-        agents = []
-        for agent_name in self.router.list_agents():
-            try:
-                agent = self._load_agent(agent_name)
-                agents.append({
-                    "name": agent_name,
-                    "description": getattr(agent, "description", "No description available"),
-                    "model": getattr(agent, "model", "unknown")
-                })
-            except Exception as e:
-                logger.warning(f"Could not load metadata for agent {agent_name}: {e}")
-
-        return agents
+        self._refresh_agent_index()
+        return list(self._agent_index.values())
+
+    def agents_etag(self) -> str:
+        """Return the ETag of the current agent list."""
+        self._refresh_agent_index()
+        return self._agents_etag
+
+    def get_agent_metadata(self, agent_name: str) -> Optional[tuple[dict, str]]:
+        """Return an agent's metadata and ETag, or None if it does not exist."""
+        self._refresh_agent_index()
+        metadata = self._agent_index.get(agent_name)
+        if metadata is None:
+            return None
+        return metadata, self._agent_etags[agent_name]
+
+    async def latest_reply(self, session_id: str, agent_name: Optional[str] = None) -> Optional[dict]:
+        """
+        Return the newest assistant reply of a session, which may still be streaming.
+
+        Args:
+            session_id: Session identifier
+            agent_name: Agent whose memory to read; if omitted, every agent
+                with stored conversations is checked
+
+        Returns:
+            The reply (see MemoryManager.latest_reply) with its 'agent', or None
+        """
+        if agent_name:
+            candidates = [agent_name] if agent_name in self.manifest else []
+        else:
+            candidates = [
+                name for name in self.manifest.names()
+                if name in self.memory_managers or MemoryManager.has_stored_memory(name)
+            ]
+
+        latest = None
+        for name in candidates:
+            memory = await self._get_memory_manager(name)
+            reply = await memory.latest_reply(session_id)
+            if reply is None:
+                continue
+            reply["agent"] = name
+            # A reply still streaming is the one a reconnecting client is after
+            rank = (reply["status"] == "streaming", reply["timestamp"])
+            if latest is None or rank > latest[0]:
+                latest = (rank, reply)
+        return latest[1] if latest else None
+
+    def cache_stats(self) -> dict:
+        """Return context cache counters for each agent's memory manager."""
+        return {
+            agent_name: memory.cache.stats()
+            for agent_name, memory in self.memory_managers.items()
+        }
+
+    def _schedule_compaction(self, memory: MemoryManager, session_id: str):
+        """Fold older turns into the session summary in the background."""
+        if self.compactor:
+            self.compactor.schedule(memory, session_id)
+
+    async def close(self):
+        """Stop compaction jobs and close the stores of all memory managers."""
+        if self.compactor:
+            await self.compactor.close()
+        # Managers still opening are registered when done, and closed with the rest
+        await asyncio.gather(*self._opening_memory.values(), return_exceptions=True)
+        for memory in self.memory_managers.values():
+            await memory.close()
+        self.memory_managers.clear()
+
+    def preload_agents(self, agent_names: Optional[Iterable[str]] = None):
+        """
+        Instantiate agents so their first request skips loading.
+
+        Args:
+            agent_names: Agents to load, or None for every discovered agent
+        """
+        self.registry.preload(self.manifest.names() if agent_names is None else agent_names)
+
+    def reload_agents(self) -> list[str]:
+        """
+        Pick up added, removed and edited agent folders.
+
+        Rescans the manifest, rebuilds routing if it changed, and reloads
+        instantiated agents whose config or prompt changed.
+
+        Returns:
+            Names of the agents that changed
+        """
+        discovered = self.manifest.scan()
+        if discovered:
+            self.router.reload()
+        reloaded = self.registry.reload_changed()
+        return sorted(set(discovered) | set(reloaded))
@@ -0,0 +1,207 @@
+"""Redis memory store, shared by every worker and host pointed at the same server."""
+
+import json
+import os
+from collections import defaultdict
+from typing import Optional
+from utils.tokenizer import count_tokens
+from .memory_store import MemoryStore, MAX_SESSION_MESSAGES, timestamp, within_budget
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # Optional: only needed with MEMORY_BACKEND=redis
+    redis = None
+
+REDIS_URL = os.getenv("MEMORY_REDIS_URL", "redis://localhost:6379/0")
+REDIS_PREFIX = os.getenv("MEMORY_REDIS_PREFIX", "agora:")
+
+class RedisStore(MemoryStore):
+    """
+    Stores an agent's conversations on a Redis-protocol server.
+
+    Each session is a list of JSON messages, trimmed to the newest
+    `max_messages`, next to a hash holding its running summary. Ids come
+    from one counter per agent. A streaming reply is a placeholder entry in
+    the list whose text grows in a separate string with APPEND, so chunks
+    never rewrite the list; completing it swaps in the final message.
+
+    Keys, under "{prefix}{agent_name}:":
+        ids                 message id counter
+        session:{id}        list of messages, oldest first
+        summary:{id}        hash of content, tokens, last_message_id
+        reply:{message_id}  text of a reply still streaming
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(
+        self,
+        agent_name: str,
+        url: str = REDIS_URL,
+        prefix: str = REDIS_PREFIX,
+        max_messages: int = MAX_SESSION_MESSAGES
+    ):
+        if redis is None:
+            raise RuntimeError("MEMORY_BACKEND=redis needs the redis package: pip install redis")
+        super().__init__(agent_name)
+        self.url = url
+        self.max_messages = max_messages
+        self._prefix = f"{prefix}{agent_name}:"
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        self._streams: dict[int, str] = {}  # message id -> placeholder entry of a reply streamed by this process
+
+    def _key(self, kind: str, name) -> str:
+        return f"{self._prefix}{kind}:{name}"
+
+    @staticmethod
+    def _encode(message_id: int, role: str, content: str, tokens: int, status: str = "complete") -> str:
+        return json.dumps({
+            "id": message_id, "role": role, "content": content,
+            "tokens": tokens, "status": status, "timestamp": timestamp()
+        })
+
+    async def _push(self, messages: dict[str, list[str]]):
+        """Append encoded messages per session and trim each list, in one transaction."""
+        async with self._client.pipeline(transaction=True) as pipe:
+            for session_id, entries in messages.items():
+                key = self._key("session", session_id)
+                pipe.rpush(key, *entries)
+                pipe.ltrim(key, -self.max_messages, -1)
+            await pipe.execute()
+
+    async def insert(self, session_id: str, role: str, content: str, tokens: int) -> int:
+        message_id = await self._client.incr(self._prefix + "ids")
+        await self._push({session_id: [self._encode(message_id, role, content, tokens)]})
+        return message_id
+
+    async def insert_many(self, batch: list):
+        last_id = await self._client.incrby(self._prefix + "ids", len(batch))
+        messages = defaultdict(list)
+        for offset, message in enumerate(batch):
+            message.row_id = last_id - len(batch) + 1 + offset
+            messages[message.session_id].append(
+                self._encode(message.row_id, message.role, message.content, message.tokens)
+            )
+        await self._push(messages)
+
+    async def insert_stream(self, session_id: str) -> int:
+        message_id = await self._client.incr(self._prefix + "ids")
+        placeholder = self._encode(message_id, "assistant", "", 0, "streaming")
+        await self._push({session_id: [placeholder]})
+        self._streams[message_id] = placeholder
+        return message_id
+
+    async def append_stream(self, session_id: str, row_id: int, text: str):
+        await self._client.append(self._key("reply", row_id), text)
+
+    async def complete_stream(
+        self,
+        session_id: str,
+        row_id: int,
+        text: str,
+        status: str
+    ) -> Optional[tuple[str, int]]:
+        placeholder = self._streams.pop(row_id, None)
+        reply_key = self._key("reply", row_id)
+        content = (await self._client.get(reply_key) or "") + text
+        tokens = count_tokens(content) if content else 0
+
+        key = self._key("session", session_id)
+        async with self._client.pipeline(transaction=True) as pipe:
+            if placeholder is not None:
+                # Matched by value, so entries pushed or trimmed meanwhile do not matter
+                if content:
+                    message = json.loads(placeholder)
+                    message.update(content=content, tokens=tokens, status=status)
+                    pipe.linsert(key, "BEFORE", placeholder, json.dumps(message))
+                pipe.lrem(key, 1, placeholder)
+            pipe.delete(reply_key)
+            await pipe.execute()
+        return (content, tokens) if content else None
+
+    async def _fill_streaming(self, messages: list[dict]):
+        """Replace the empty content of replies still streaming with their text so far."""
+        streaming = [message for message in messages if message["status"] == "streaming"]
+        if streaming:
+            texts = await self._client.mget([self._key("reply", message["id"]) for message in streaming])
+            for message, text in zip(streaming, texts):
+                message["content"] = text or ""
+
+    async def latest_reply(self, session_id: str) -> Optional[tuple]:
+        key = self._key("session", session_id)
+        # Replies alternate with user messages, so the newest is almost always in the last page
+        page = 8
+        end = -1
+        while True:
+            entries = await self._client.lrange(key, end - page + 1, end)
+            for entry in reversed(entries):
+                message = json.loads(entry)
+                if message["role"] == "assistant":
+                    await self._fill_streaming([message])
+                    return message["id"], message["content"], message["status"], message["timestamp"]
+            if len(entries) < page:
+                return None
+            end -= page
+
+    async def _read_summary(self, session_id: str) -> Optional[tuple]:
+        summary = await self._client.hgetall(self._key("summary", session_id))
+        if not summary:
+            return None
+        return summary["content"], int(summary["tokens"]), int(summary["last_message_id"])
+
+    async def select_context(
+        self,
+        session_id: str,
+        limit: int,
+        token_budget: Optional[int]
+    ) -> tuple[Optional[tuple], list[tuple]]:
+        if limit <= 0:
+            return await self._read_summary(session_id), []
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._key("summary", session_id))
+            pipe.lrange(self._key("session", session_id), -limit, -1)
+            summary, entries = await pipe.execute()
+
+        after_id = 0
+        if summary:
+            summary = (summary["content"], int(summary["tokens"]), int(summary["last_message_id"]))
+            after_id = summary[2]
+            if token_budget is not None:
+                token_budget = max(0, token_budget - summary[1])
+        else:
+            summary = None
+
+        messages = [message for message in map(json.loads, reversed(entries)) if message["id"] > after_id]
+        await self._fill_streaming(messages)
+        rows = ((m["id"], m["role"], m["content"], m["tokens"]) for m in messages)
+        return summary, within_budget(rows, token_budget)
+
+    async def select_unsummarized(self, session_id: str, keep_recent: int) -> tuple[Optional[str], list[tuple]]:
+        summary = await self._read_summary(session_id)
+        previous, after_id = (summary[0], summary[2]) if summary else (None, 0)
+        if keep_recent <= 0:
+            return previous, []
+        entries = await self._client.lrange(self._key("session", session_id), 0, -keep_recent - 1)
+        messages = [message for message in map(json.loads, entries) if message["id"] > after_id]
+        await self._fill_streaming(messages)
+        return previous, [(m["id"], m["role"], m["content"]) for m in messages]
+
+    async def store_summary(self, session_id: str, content: str, tokens: int, last_message_id: int):
+        await self._client.hset(
+            self._key("summary", session_id),
+            mapping={"content": content, "tokens": tokens, "last_message_id": last_message_id}
+        )
+
+    async def delete_session(self, session_id: str):
+        key = self._key("session", session_id)
+        entries = await self._client.lrange(key, 0, -1)
+        replies = [
+            self._key("reply", message["id"])
+            for message in map(json.loads, entries)
+            if message["status"] == "streaming"
+        ]
+        await self._client.delete(key, self._key("summary", session_id), *replies)
+
+    async def close(self):
+        await self._client.aclose()
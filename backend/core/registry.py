@@ -0,0 +1,111 @@
+"""Agent registry that instantiates each agent once and shares it across requests."""
+
+import importlib
+from typing import Iterable, Optional
+from utils.logger import logger
+from .discovery import AgentManifest
+
+# Files whose modification should trigger a reload of the agent instance
+WATCHED_FILES = ("config.yaml", "prompt.txt")
+
+class AgentRegistry:
+    """
+    Holds one live instance per agent, reloaded only when its files change.
+
+    Which agents exist comes from the manifest; an agent's module is imported
+    the first time it is requested.
+    """
+
+    def __init__(self, manifest: Optional[AgentManifest] = None):
+        self.manifest = manifest or AgentManifest()
+        self.agents_dir = self.manifest.agents_dir
+        self._agents = {}  # agent_name -> Agent instance
+        self._mtimes = {}  # agent_name -> {filename: mtime}
+        # Incremented on every (re)load so derived data can tell it is stale
+        self.version = 0
+
+    def _file_mtimes(self, agent_name: str) -> dict[str, float]:
+        """Return modification times of the watched files for an agent."""
+        mtimes = {}
+        for filename in WATCHED_FILES:
+            path = self.agents_dir / agent_name / filename
+            try:
+                mtimes[filename] = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+        return mtimes
+
+    def _instantiate(self, agent_name: str):
+        """Import an agent module and build its Agent instance."""
+        if agent_name not in self.manifest:
+            raise ValueError(f"Agent '{agent_name}' not found or failed to load")
+        try:
+            module = importlib.import_module(f"agents.{agent_name}.agent")
+            agent_class = getattr(module, "Agent")
+            agent_instance = agent_class()
+        except Exception as e:
+            logger.error(f"Failed to load agent {agent_name}: {e}")
+            raise ValueError(f"Agent '{agent_name}' not found or failed to load")
+
+        self._agents[agent_name] = agent_instance
+        self._mtimes[agent_name] = self._file_mtimes(agent_name)
+        self.version += 1
+        logger.info(f"Loaded agent: {agent_name}")
+        return agent_instance
+
+    def preload(self, agent_names: Iterable[str]):
+        """
+        Instantiate agents ahead of the first request.
+
+        Agents that fail to load are logged and skipped so one broken agent
+        does not prevent the application from starting.
+        """
+        for agent_name in agent_names:
+            try:
+                self._instantiate(agent_name)
+            except ValueError:
+                continue
+
+    def get(self, agent_name: str):
+        """
+        Return the shared instance for an agent, loading it on first use.
+
+        Raises:
+            ValueError: If the agent cannot be imported or instantiated
+        """
+        agent = self._agents.get(agent_name)
+        if agent is None:
+            agent = self._instantiate(agent_name)
+        return agent
+
+    def reload(self, agent_name: str):
+        """Rebuild an agent instance, re-reading its config and prompt."""
+        return self._instantiate(agent_name)
+
+    def reload_changed(self) -> list[str]:
+        """
+        Reload agents whose config or prompt files changed since they were loaded.
+
+        Returns:
+            Names of the agents that were reloaded
+        """
+        reloaded = []
+        for agent_name, known in list(self._mtimes.items()):
+            if agent_name not in self.manifest:
+                # The agent folder was removed
+                del self._agents[agent_name], self._mtimes[agent_name]
+                self.version += 1
+                logger.info(f"Unloaded agent: {agent_name}")
+                continue
+            if self._file_mtimes(agent_name) != known:
+                try:
+                    self._instantiate(agent_name)
+                    reloaded.append(agent_name)
+                except ValueError:
+                    # Keep serving the previous instance until the files are fixed
+                    continue
+        return reloaded
+
+    def loaded(self) -> list[str]:
+        """Return names of the agents currently instantiated."""
+        return list(self._agents.keys())
@@ -0,0 +1,89 @@
+"""Application-scoped resources shared by every route."""
+
+import asyncio
+import os
+import time
+from typing import Optional
+from openai import AsyncOpenAI
+from starlette.requests import HTTPConnection
+from utils.embeddings import load_embedder
+from utils.logger import logger
+from utils.metrics import EVENT_LOOP_PROBE_MS, monitor_event_loop
+from utils.openai_client import create_client, set_client
+from utils.replay import close_replay_buffer
+from utils.response_cache import close_response_cache
+from utils.tokenizer import load_tokenizer
+from utils.tools import close_tool_runtime
+from .orchestrator import Orchestrator
+from .discovery import AgentManifest
+from .memory_store import memory_store_class
+from .registry import AgentRegistry
+
+# Agents to import at startup: empty (all load on first use), "all", or a comma-separated list
+AGENT_PRELOAD = os.getenv("AGENT_PRELOAD", "").strip()
+
+class AppResources:
+    """
+    Owns the long-lived objects of one application process.
+
+    Created once in the FastAPI lifespan, so each uvicorn worker holds exactly
+    one orchestrator, one agent manifest and registry, one set of memory pools and one
+    OpenAI client, all released on shutdown.
+    """
+
+    def __init__(self):
+        start = time.perf_counter()
+        self.manifest = AgentManifest()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Discovered {len(self.manifest.names())} agents in {elapsed_ms:.1f}ms")
+        # Fails at startup rather than on the first query if MEMORY_BACKEND is unknown
+        logger.info(f"Conversation memory backend: {memory_store_class().name}")
+        self.registry = AgentRegistry(self.manifest)
+        self.orchestrator = Orchestrator(registry=self.registry)
+        self.openai_client: AsyncOpenAI = create_client()
+        self._loop_monitor: Optional[asyncio.Task] = None
+
+    async def startup(self):
+        """Install the shared client, load the tokenizer and embedder, build the semantic router, open stored memory, start the event loop probe and preload the configured agents."""
+        set_client(self.openai_client)
+        await load_tokenizer()
+        await load_embedder()
+        await self.orchestrator.router.load_semantic()
+        # After the tokenizer, so token counts backfilled by migrations are exact
+        start = time.perf_counter()
+        await self.orchestrator.open_memory()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Opened memory of {sorted(self.orchestrator.memory_managers)} in {elapsed_ms:.1f}ms")
+        if EVENT_LOOP_PROBE_MS > 0:
+            self._loop_monitor = asyncio.create_task(monitor_event_loop())
+
+        if not AGENT_PRELOAD:
+            return
+        start = time.perf_counter()
+        if AGENT_PRELOAD.lower() == "all":
+            self.orchestrator.preload_agents()
+        else:
+            self.orchestrator.preload_agents(name.strip() for name in AGENT_PRELOAD.split(",") if name.strip())
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Preloaded agents {self.registry.loaded()} in {elapsed_ms:.1f}ms")
+
+    async def shutdown(self):
+        """Stop the loop probe and detached generations, flush and close memory pools, the response cache and tool pools, then the OpenAI client."""
+        if self._loop_monitor:
+            self._loop_monitor.cancel()
+        # Detached WebSocket generations save their partial replies before memory closes
+        await close_replay_buffer()
+        await self.orchestrator.close()
+        await close_response_cache()
+        close_tool_runtime()
+        await self.openai_client.close()
+        set_client(None)
+        logger.info("Released application resources")
+
+def get_resources(connection: HTTPConnection) -> AppResources:
+    """FastAPI dependency returning the resources of the running app."""
+    return connection.app.state.resources
+
+def get_orchestrator(connection: HTTPConnection) -> Orchestrator:
+    """FastAPI dependency returning the shared orchestrator."""
+    return get_resources(connection).orchestrator
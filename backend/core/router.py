@@ -1,20 +1,207 @@
 """Agent routing logic based on intent detection."""
 
+import asyncio
+import os
+import re
+from functools import lru_cache
 from typing import Optional
+import numpy as np
+from utils.embeddings import get_embedder
 from utils.logger import logger
+from .discovery import AgentManifest
+
+# Used when no agent declares `routing.default: true`
+DEFAULT_AGENT = os.getenv("DEFAULT_AGENT", "paper_writer")
+
+# "semantic" routes by embedding similarity first, falling back to keywords
+ROUTER_MODE = os.getenv("ROUTER_MODE", "keyword").lower()
+# Cosine similarity a query needs with an agent's centroid to be routed by it
+ROUTER_SEMANTIC_THRESHOLD = float(os.getenv("ROUTER_SEMANTIC_THRESHOLD", "0.3"))
+ROUTER_QUERY_CACHE_SIZE = int(os.getenv("ROUTER_QUERY_CACHE_SIZE", "4096"))
+
+_WORD = re.compile(r"\w+")
+
+def _words(text: str) -> list[str]:
+    return _WORD.findall(text.lower())
+
+class KeywordMatcher:
+    """
+    Scores agents by the keywords a query contains, matching whole words only.
+
+    Keywords (single words or phrases) are indexed by their words, so a query
+    is matched in one pass over its words with dictionary lookups,
+    independent of how many agents and keywords exist. "find" matches
+    "find" and "finds" but not "findings"; each keyword counts once.
+    """
+
+    def __init__(self, agent_keywords: dict[str, dict[str, float]]):
+        # keyword word tuple -> [(agent, weight)]
+        self._index: dict[tuple, list[tuple[str, float]]] = {}
+        # first word of a multi-word keyword -> its word tuples
+        self._phrases: dict[str, list[tuple]] = {}
+        for agent, keywords in agent_keywords.items():
+            for keyword, weight in keywords.items():
+                words = tuple(_words(keyword))
+                if not words:
+                    continue
+                if words not in self._index:
+                    self._index[words] = []
+                    if len(words) > 1:
+                        self._phrases.setdefault(words[0], []).append(words)
+                self._index[words].append((agent, weight))
+
+    def _match(self, word: str, expected: str) -> bool:
+        return word == expected or word in (expected + "s", expected + "es")
+
+    def _keyword(self, word: str) -> Optional[tuple]:
+        """Return the single-word keyword a query word matches, or None."""
+        key = (word,)
+        if key in self._index:
+            return key
+        # Allow a plural or third-person "s"/"es"
+        if word.endswith("s"):
+            key = (word[:-1],)
+            if key in self._index:
+                return key
+            if word.endswith("es"):
+                key = (word[:-2],)
+                if key in self._index:
+                    return key
+        return None
+
+    def scores(self, query: str) -> dict[str, float]:
+        """Return the summed keyword weight per agent, for agents with any match."""
+        words = _words(query)
+        matched = set()
+        for start, word in enumerate(words):
+            keyword = self._keyword(word)
+            if keyword is not None:
+                matched.add(keyword)
+            for phrase in self._phrases.get(word, ()):
+                candidate = words[start:start + len(phrase)]
+                if (
+                    len(candidate) == len(phrase)
+                    and candidate[:-1] == list(phrase[:-1])
+                    and self._match(candidate[-1], phrase[-1])
+                ):
+                    matched.add(phrase)
+
+        scores: dict[str, float] = {}
+        for keyword in matched:
+            for agent, weight in self._index[keyword]:
+                scores[agent] = scores.get(agent, 0) + weight
+        return scores
+
+class SemanticIndex:
+    """
+    Routes queries by cosine similarity to per-agent centroid embeddings.
+
+    Each agent's description and example utterances are embedded once and
+    averaged into a unit centroid; the centroids form one matrix, so a
+    query costs one embedding (LRU-cached) and one matrix-vector product.
+    Building the index embeds every text, so it is done in a worker thread.
+    """
+
+    def __init__(
+        self,
+        agent_texts: dict[str, list[str]],
+        threshold: float = ROUTER_SEMANTIC_THRESHOLD,
+        cache_size: int = ROUTER_QUERY_CACHE_SIZE
+    ):
+        self.threshold = threshold
+        self.embedder = get_embedder()
+        self.agents: list[str] = []
+        centroids = []
+        for agent_name, texts in agent_texts.items():
+            texts = [text for text in texts if text and text.strip()]
+            if not texts:
+                continue
+            centroid = self.embedder.embed(texts).mean(axis=0)
+            norm = np.linalg.norm(centroid)
+            if norm == 0:
+                continue
+            self.agents.append(agent_name)
+            centroids.append(centroid / norm)
+        self.matrix = np.vstack(centroids).astype(np.float32) if centroids else None
+        self._embed_query = lru_cache(maxsize=cache_size)(self._embed)
+
+    def _embed(self, query: str) -> np.ndarray:
+        return self.embedder.embed([query])[0]
+
+    async def best(self, query: str) -> Optional[tuple[str, float]]:
+        """Return the closest agent and its similarity if it clears the threshold."""
+        if self.matrix is None:
+            return None
+        text = " ".join(_words(query))
+        if self.embedder.semantic:
+            # A model takes milliseconds to encode, too long to hold the event loop
+            vector = await asyncio.to_thread(self._embed_query, text)
+        else:
+            vector = self._embed_query(text)
+        scores = self.matrix @ vector
+        index = int(np.argmax(scores))
+        score = float(scores[index])
+        if score < self.threshold:
+            return None
+        return self.agents[index], score
 
 class AgentRouter:
     """Routes user queries to appropriate agents based on keywords."""
 
-    def __init__(self):
-        # Define keyword mappings for each agent
-        self.agent_keywords = {
-            "paper_writer": ["write", "academic", "paper", "research", "essay", "paragraph"],
-            "shopper": ["buy", "shop", "product", "price", "amazon", "search", "find"],
-        }
-        self.default_agent = "paper_writer"
+    def __init__(self, manifest: Optional[AgentManifest] = None, mode: str = ROUTER_MODE):
+        self.manifest = manifest or AgentManifest()
+        self.mode = mode
+        # Built by load_semantic; until then routing uses keywords only
+        self.semantic: Optional[SemanticIndex] = None
+        self._semantic_rebuild: Optional[asyncio.Task] = None
+        self.reload()
+
+    def reload(self):
+        """
+        Rebuild routing keywords from the agent manifest.
+
+        A semantic index already loaded is rebuilt in the background and
+        replaces the old one when ready.
+        """
+        agent_keywords = {}
+        agent_texts = {}
+        default_agent = None
+        for agent_name, spec in self.manifest.specs.items():
+            agent_keywords[agent_name] = spec.keywords
+            agent_texts[agent_name] = [spec.description] + spec.examples
+            if spec.default and default_agent is None:
+                default_agent = agent_name
+
+        # Keyword lists per agent, kept for listing and validation
+        self.agent_keywords = agent_keywords
+        self._order = {agent_name: i for i, agent_name in enumerate(agent_keywords)}
+        self.matcher = KeywordMatcher(agent_keywords)
+        self.default_agent = default_agent or DEFAULT_AGENT
+        self._agent_texts = agent_texts
+        if self.semantic is not None:
+            self._semantic_rebuild = asyncio.get_running_loop().create_task(self._rebuild_semantic())
+
+    async def load_semantic(self):
+        """Build the semantic index in a worker thread, if semantic routing is enabled."""
+        if self.mode != "semantic":
+            return
+        agent_texts = self._agent_texts
+        index = await asyncio.to_thread(SemanticIndex, agent_texts)
+        if self.semantic is None and not index.embedder.semantic:
+            logger.warning(
+                "ROUTER_MODE=semantic without EMBEDDING_MODEL: the hashing embedder routes by shared words, not meaning"
+            )
+        # A reload during the build started a newer one
+        if agent_texts is self._agent_texts:
+            self.semantic = index
 
-    def route(self, query: str, explicit_agent: Optional[str] = None) -> str:
+    async def _rebuild_semantic(self):
+        try:
+            await self.load_semantic()
+        except Exception as e:
+            logger.error(f"Could not rebuild the semantic routing index, keeping the previous one: {e}")
+
+    async def route(self, query: str, explicit_agent: Optional[str] = None) -> str:
         """
         Determine which agent should handle the query.
 
@@ -39,18 +226,20 @@ class AgentRouter:
                     logger.info(f"Detected slash command for agent: {potential_agent}")
                     return potential_agent
 
-        # Keyword-based routing
-        query_lower = query.lower()
-        agent_scores = {}
+        # Semantic routing, when enabled and confident enough
+        if self.semantic:
+            match = await self.semantic.best(query)
+            # An index still being rebuilt may name a removed agent
+            if match and self._is_valid_agent(match[0]):
+                logger.info(f"Routed to {match[0]} by similarity ({match[1]:.2f})")
+                return match[0]
 
-        for agent, keywords in self.agent_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in query_lower)
-            if score > 0:
-                agent_scores[agent] = score
+        # Keyword-based routing
+        agent_scores = self.matcher.scores(query)
 
         if agent_scores:
-            # Return agent with highest score
-            best_agent = max(agent_scores, key=agent_scores.get)
+            # Return agent with highest score (ties go to the first agent by name)
+            best_agent = max(agent_scores, key=lambda agent: (agent_scores[agent], -self._order[agent]))
             logger.info(f"Routed to {best_agent} based on keywords (score: {agent_scores[best_agent]})")
             return best_agent
 
@@ -0,0 +1,94 @@
+"""Small pool of long-lived SQLite connections used off the event loop."""
+
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable
+
+DEFAULT_POOL_SIZE = int(os.getenv("MEMORY_POOL_SIZE", "4"))
+
+# Applied to every connection. WAL lets readers proceed while a writer commits,
+# and synchronous=NORMAL only fsyncs at checkpoints, which is durable in WAL mode
+# against application crashes (a power loss can drop the last transactions).
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",  # 8 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+class SQLitePool:
+    """
+    Runs SQLite work in a dedicated thread pool over reusable connections.
+
+    Each query borrows one connection for the duration of a callable, so a
+    connection is never used by two threads at once.
+    """
+
+    def __init__(self, db_path: Path, size: int = DEFAULT_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._executor = ThreadPoolExecutor(
+            max_workers=size,
+            thread_name_prefix=f"sqlite-{Path(db_path).parent.name}"
+        )
+        self._connections = [self._connect() for _ in range(size)]
+        self._idle = None  # asyncio.Queue, created on first use inside the loop
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with the pool's pragmas applied."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _idle_queue(self) -> asyncio.Queue:
+        """Return the queue of idle connections, filling it on first call."""
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for conn in self._connections:
+                self._idle.put_nowait(conn)
+        return self._idle
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Execute fn(conn, *args) on a pooled connection in a worker thread.
+
+        Args:
+            fn: Callable receiving a sqlite3.Connection as first argument
+            *args: Extra positional arguments for fn
+
+        Returns:
+            Whatever fn returns
+        """
+        if self._closed:
+            raise RuntimeError(f"SQLite pool for {self.db_path} is closed")
+
+        idle = self._idle_queue()
+        conn = await idle.get()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, fn, conn, *args)
+        try:
+            # Shielded so a cancelled caller cannot hand the connection back
+            # while the worker thread is still using it
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                idle.put_nowait(conn)
+            else:
+                future.add_done_callback(lambda _: idle.put_nowait(conn))
+
+    async def close(self):
+        """Close all connections once in-flight queries have returned them."""
+        if self._closed:
+            return
+        self._closed = True
+        idle = self._idle_queue()
+        for _ in range(self.size):
+            conn = await idle.get()
+            conn.close()
+        self._executor.shutdown(wait=True)
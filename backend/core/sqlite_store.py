@@ -0,0 +1,348 @@
+"""SQLite memory store: one WAL database per agent, queried through a connection pool."""
+
+import os
+import shutil
+import sqlite3
+from pathlib import Path
+from typing import Optional
+from utils.logger import logger
+from utils.tokenizer import count_tokens
+from .discovery import AGENTS_DIR
+from .memory_store import MemoryStore, within_budget
+from .sqlite_pool import SQLitePool, DEFAULT_POOL_SIZE
+
+# Directory of the agent databases ({agent_name}.db), kept out of the code tree
+MEMORY_DIR = os.getenv("MEMORY_DIR", "").strip() or str(AGENTS_DIR.parent / "data" / "memory")
+# Files of a WAL database, moved together
+DATABASE_SUFFIXES = ("-wal", "-shm", "")
+# Server worker processes, as uvicorn and gunicorn read it; with several, each
+# writes the same databases
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "").strip() or "1")
+
+class SQLiteStore(MemoryStore):
+    """
+    Stores an agent's conversations in a local SQLite database.
+
+    All queries run on a pool of long-lived WAL connections in worker
+    threads, so awaiting them never blocks the event loop. Workers of one
+    host can share the file; separate hosts cannot. Shared between workers
+    (WEB_CONCURRENCY above 1), the store turns off the per-process context
+    cache, which would serve context missing the other workers' writes.
+    """
+
+    name = "sqlite"
+    shared = WEB_CONCURRENCY > 1
+
+    def __init__(self, agent_name: str, pool_size: int = DEFAULT_POOL_SIZE):
+        super().__init__(agent_name)
+        self.db_path = self._migrate_legacy_database(agent_name)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+        self.pool = SQLitePool(self.db_path, size=pool_size)
+
+    @staticmethod
+    def database_path(agent_name: str) -> Path:
+        """Return where an agent's conversations are stored."""
+        return Path(MEMORY_DIR) / f"{agent_name}.db"
+
+    @staticmethod
+    def legacy_database_path(agent_name: str) -> Path:
+        """Return where older versions stored an agent's conversations, next to its code."""
+        return AGENTS_DIR / agent_name / "memory.db"
+
+    @classmethod
+    def has_data(cls, agent_name: str) -> bool:
+        return cls.database_path(agent_name).exists() or cls.legacy_database_path(agent_name).exists()
+
+    @classmethod
+    def _migrate_legacy_database(cls, agent_name: str) -> Path:
+        """
+        Move a database left in the agent's directory to MEMORY_DIR, once.
+
+        The WAL and shared-memory files move first and the database last, so
+        the new path only appears once it is complete. If the move fails the
+        moved files are put back and the old database keeps being used.
+
+        Returns:
+            Path of the database to open
+        """
+        path = cls.database_path(agent_name)
+        legacy = cls.legacy_database_path(agent_name)
+        if path.exists() or not legacy.exists():
+            return path
+        moved = []
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            for suffix in DATABASE_SUFFIXES:
+                source = Path(f"{legacy}{suffix}")
+                if source.exists():
+                    shutil.move(source, f"{path}{suffix}")
+                    moved.append(suffix)
+        except OSError as e:
+            if path.exists():  # Another worker moved it meanwhile
+                return path
+            # A WAL without its database would lose writes, so put back what moved
+            for suffix in moved:
+                shutil.move(f"{path}{suffix}", f"{legacy}{suffix}")
+            logger.warning(f"Could not move {legacy} to {path}, still using it: {e}")
+            return legacy
+        logger.info(f"Moved conversations of {agent_name} from {legacy} to {path}")
+        return path
+
+    def _init_db(self):
+        """Initialize SQLite database schema."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    tokens INTEGER,
+                    status TEXT NOT NULL DEFAULT 'complete'
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_session
+                ON conversations(session_id, timestamp)
+            """)
+            # Recency queries order by id: timestamps only have second resolution
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_session_id
+                ON conversations(session_id, id)
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    session_id TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    tokens INTEGER NOT NULL,
+                    last_message_id INTEGER NOT NULL,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self._migrate_token_counts(conn)
+            conn.commit()
+
+    @staticmethod
+    def _migrate_token_counts(conn: sqlite3.Connection):
+        """Add the tokens and status columns to older databases and count existing rows once."""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(conversations)")}
+        if "tokens" not in columns:
+            conn.execute("ALTER TABLE conversations ADD COLUMN tokens INTEGER")
+        if "status" not in columns:
+            conn.execute("ALTER TABLE conversations ADD COLUMN status TEXT NOT NULL DEFAULT 'complete'")
+
+        rows = conn.execute("SELECT id, content FROM conversations WHERE tokens IS NULL").fetchall()
+        if rows:
+            conn.executemany(
+                "UPDATE conversations SET tokens = ? WHERE id = ?",
+                [(count_tokens(content), row_id) for row_id, content in rows]
+            )
+            logger.info(f"Counted tokens for {len(rows)} existing messages")
+
+    # Query helpers below run inside pool worker threads
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, session_id: str, role: str, content: str, tokens: int) -> int:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO conversations (session_id, role, content, tokens) VALUES (?, ?, ?, ?)",
+                (session_id, role, content, tokens)
+            )
+        return cursor.lastrowid
+
+    @staticmethod
+    def _insert_many(conn: sqlite3.Connection, batch: list):
+        """Insert a batch in one transaction and record the assigned row ids."""
+        with conn:
+            conn.executemany(
+                "INSERT INTO conversations (session_id, role, content, tokens) VALUES (?, ?, ?, ?)",
+                [(m.session_id, m.role, m.content, m.tokens) for m in batch]
+            )
+            # The transaction holds the write lock, so ids are consecutive
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            for offset, message in enumerate(batch):
+                message.row_id = last_id - len(batch) + 1 + offset
+
+    @staticmethod
+    def _insert_stream(conn: sqlite3.Connection, session_id: str) -> int:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO conversations (session_id, role, content, tokens, status) "
+                "VALUES (?, 'assistant', '', 0, 'streaming')",
+                (session_id,)
+            )
+        return cursor.lastrowid
+
+    @staticmethod
+    def _append_stream(conn: sqlite3.Connection, row_id: int, text: str):
+        with conn:
+            conn.execute(
+                "UPDATE conversations SET content = content || ? WHERE id = ?",
+                (text, row_id)
+            )
+
+    @staticmethod
+    def _complete_stream(conn: sqlite3.Connection, row_id: int, text: str, status: str) -> Optional[tuple[str, int]]:
+        with conn:
+            content = conn.execute(
+                "SELECT content FROM conversations WHERE id = ?", (row_id,)
+            ).fetchone()[0] + text
+            if not content:
+                conn.execute("DELETE FROM conversations WHERE id = ?", (row_id,))
+                return None
+            tokens = count_tokens(content)
+            conn.execute(
+                "UPDATE conversations SET content = ?, tokens = ?, status = ? WHERE id = ?",
+                (content, tokens, status, row_id)
+            )
+        return content, tokens
+
+    @staticmethod
+    def _select_latest_reply(conn: sqlite3.Connection, session_id: str) -> Optional[tuple]:
+        return conn.execute(
+            """
+            SELECT id, content, status, timestamp FROM conversations
+            WHERE session_id = ? AND role = 'assistant'
+            ORDER BY id DESC
+            LIMIT 1
+            """,
+            (session_id,)
+        ).fetchone()
+
+    @staticmethod
+    def _select_context(
+        conn: sqlite3.Connection,
+        session_id: str,
+        limit: int,
+        token_budget: Optional[int]
+    ) -> tuple[Optional[tuple], list[tuple]]:
+        summary = conn.execute(
+            "SELECT content, tokens, last_message_id FROM summaries WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        after_id = 0
+        if summary:
+            after_id = summary[2]
+            if token_budget is not None:
+                token_budget = max(0, token_budget - summary[1])
+
+        cursor = conn.execute(
+            """
+            SELECT id, role, content, tokens FROM conversations
+            WHERE session_id = ? AND id > ?
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            (session_id, after_id, limit)
+        )
+        # Rows are stepped lazily, so stopping at the budget skips the rest
+        return summary, within_budget(cursor, token_budget)
+
+    @staticmethod
+    def _select_unsummarized(
+        conn: sqlite3.Connection,
+        session_id: str,
+        keep_recent: int
+    ) -> tuple[Optional[str], list[tuple]]:
+        summary = conn.execute(
+            "SELECT content, last_message_id FROM summaries WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        previous, after_id = summary if summary else (None, 0)
+
+        rows = conn.execute(
+            """
+            SELECT id, role, content FROM conversations
+            WHERE session_id = ? AND id > ? AND id < (
+                SELECT MIN(id) FROM (
+                    SELECT id FROM conversations
+                    WHERE session_id = ?
+                    ORDER BY id DESC
+                    LIMIT ?
+                )
+            )
+            ORDER BY id
+            """,
+            (session_id, after_id, session_id, keep_recent)
+        ).fetchall()
+        return previous, rows
+
+    @staticmethod
+    def _store_summary(
+        conn: sqlite3.Connection,
+        session_id: str,
+        content: str,
+        tokens: int,
+        last_message_id: int
+    ):
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO summaries (session_id, content, tokens, last_message_id)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    content = excluded.content,
+                    tokens = excluded.tokens,
+                    last_message_id = excluded.last_message_id,
+                    updated_at = CURRENT_TIMESTAMP
+                """,
+                (session_id, content, tokens, last_message_id)
+            )
+
+    @staticmethod
+    def _delete_session(conn: sqlite3.Connection, session_id: str):
+        with conn:
+            conn.execute(
+                "DELETE FROM conversations WHERE session_id = ?",
+                (session_id,)
+            )
+            conn.execute(
+                "DELETE FROM summaries WHERE session_id = ?",
+                (session_id,)
+            )
+
+    async def insert(self, session_id: str, role: str, content: str, tokens: int) -> int:
+        return await self.pool.run(self._insert, session_id, role, content, tokens)
+
+    async def insert_many(self, batch: list):
+        await self.pool.run(self._insert_many, batch)
+
+    async def insert_stream(self, session_id: str) -> int:
+        return await self.pool.run(self._insert_stream, session_id)
+
+    async def append_stream(self, session_id: str, row_id: int, text: str):
+        await self.pool.run(self._append_stream, row_id, text)
+
+    async def complete_stream(
+        self,
+        session_id: str,
+        row_id: int,
+        text: str,
+        status: str
+    ) -> Optional[tuple[str, int]]:
+        return await self.pool.run(self._complete_stream, row_id, text, status)
+
+    async def latest_reply(self, session_id: str) -> Optional[tuple]:
+        return await self.pool.run(self._select_latest_reply, session_id)
+
+    async def select_context(
+        self,
+        session_id: str,
+        limit: int,
+        token_budget: Optional[int]
+    ) -> tuple[Optional[tuple], list[tuple]]:
+        return await self.pool.run(self._select_context, session_id, limit, token_budget)
+
+    async def select_unsummarized(self, session_id: str, keep_recent: int) -> tuple[Optional[str], list[tuple]]:
+        return await self.pool.run(self._select_unsummarized, session_id, keep_recent)
+
+    async def store_summary(self, session_id: str, content: str, tokens: int, last_message_id: int):
+        await self.pool.run(self._store_summary, session_id, content, tokens, last_message_id)
+
+    async def delete_session(self, session_id: str):
+        await self.pool.run(self._delete_session, session_id)
+
+    async def close(self):
+        await self.pool.close()
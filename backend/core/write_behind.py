@@ -0,0 +1,144 @@
+"""Write-behind queue that batches message inserts into few transactions."""
+
+import asyncio
+import os
+from collections import deque
+from typing import Optional
+from utils.logger import logger
+from .memory_store import MemoryStore
+
+WRITE_BEHIND_ENABLED = os.getenv("MEMORY_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+FLUSH_BATCH_SIZE = int(os.getenv("MEMORY_FLUSH_BATCH_SIZE", "64"))
+FLUSH_INTERVAL_MS = int(os.getenv("MEMORY_FLUSH_INTERVAL_MS", "50"))
+WRITE_QUEUE_SIZE = int(os.getenv("MEMORY_WRITE_QUEUE_SIZE", "1000"))
+FLUSH_RETRIES = 3
+
+class PendingMessage:
+    """A message accepted by the queue but possibly not yet committed."""
+
+    __slots__ = ("session_id", "role", "content", "tokens", "row_id")
+
+    def __init__(self, session_id: str, role: str, content: str, tokens: int):
+        self.session_id = session_id
+        self.role = role
+        self.content = content
+        self.tokens = tokens
+        # Assigned by the flusher before its transaction commits
+        self.row_id: Optional[int] = None
+
+class WriteBehindQueue:
+    """
+    Buffers messages in memory and flushes them with one store write per batch.
+
+    A batch is written once `batch_size` messages are queued or
+    `flush_interval_ms` has passed since its first message, whichever comes
+    first. The queue is bounded: `enqueue` waits when it is full, so a slow
+    disk pushes back on producers instead of growing memory without limit.
+
+    Messages stay visible through `pending()` until their transaction has
+    committed, which lets readers merge them with stored rows.
+    """
+
+    def __init__(
+        self,
+        store: MemoryStore,
+        batch_size: int = FLUSH_BATCH_SIZE,
+        flush_interval_ms: int = FLUSH_INTERVAL_MS,
+        max_queue: int = WRITE_QUEUE_SIZE
+    ):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._pending: dict[str, deque] = {}  # session_id -> unflushed messages
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self):
+        """Start the background flusher on first use inside the event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def enqueue(self, session_id: str, role: str, content: str, tokens: int) -> PendingMessage:
+        """Queue a message for insertion, waiting if the queue is full."""
+        self._ensure_started()
+        message = PendingMessage(session_id, role, content, tokens)
+        # Visible to readers right away, even while waiting for queue space
+        self._pending.setdefault(session_id, deque()).append(message)
+        try:
+            await self._queue.put(message)
+        except BaseException:
+            self._release([message])
+            raise
+        return message
+
+    def pending(self, session_id: str) -> list[PendingMessage]:
+        """Return a snapshot of the session's messages not yet removed after commit."""
+        return list(self._pending.get(session_id, ()))
+
+    async def flush(self):
+        """Wait until every queued message has been written."""
+        if self._task is not None:
+            await self._queue.join()
+
+    async def close(self):
+        """Flush outstanding messages and stop the background flusher."""
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _next_batch(self) -> list[PendingMessage]:
+        """Collect up to batch_size messages within one flush interval."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        """Background loop writing batches until cancelled."""
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            finally:
+                self._release(batch)
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: list[PendingMessage]):
+        """Insert a batch, retrying transient failures before giving up."""
+        for attempt in range(1, FLUSH_RETRIES + 1):
+            try:
+                await self.store.insert_many(batch)
+                logger.info(f"Flushed {len(batch)} queued messages")
+                return
+            except Exception as e:
+                logger.error(f"Failed to flush messages (attempt {attempt}/{FLUSH_RETRIES}): {e}")
+                await asyncio.sleep(0.05 * attempt)
+        logger.error(f"Dropped {len(batch)} messages after {FLUSH_RETRIES} failed flushes")
+
+    def _release(self, batch: list[PendingMessage]):
+        """Drop written messages from the per-session pending lists."""
+        for message in batch:
+            queued = self._pending.get(message.session_id)
+            if not queued:
+                continue
+            try:
+                queued.remove(message)
+            except ValueError:
+                pass
+            if not queued:
+                del self._pending[message.session_id]
@@ -3,16 +3,39 @@ ABOUTME: Main FastAPI application for Agora backend
 ABOUTME: Configures CORS, routes, and WebSocket support for agent orchestration
 """
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from core.orchestrator import Orchestrator
+from core.resources import AppResources, get_orchestrator
 from routes import chat_router, agents_router
+from utils.llm_scheduler import get_scheduler
 from utils.logger import logger
+from utils.metrics import render_metrics
+from utils.openai_client import client_pool_stats
+from utils.response_cache import get_response_cache
+from utils.replay import get_replay_buffer
+from utils.single_flight import get_single_flight
+from utils.tools import get_tool_runtime
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared resources before serving requests and release them on shutdown."""
+    resources = AppResources()
+    await resources.startup()
+    app.state.resources = resources
+    try:
+        yield
+    finally:
+        await resources.shutdown()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Agora API",
     description="Minimal, modular AI agent chat platform",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Configure CORS for frontend communication
@@ -38,7 +61,7 @@ async def root():
     }
 
 @app.get("/health")
-async def health():
+async def health(orchestrator: Orchestrator = Depends(get_orchestrator)):
     """Detailed health check."""
     return {
         "status": "healthy",
@@ -47,9 +70,21 @@ async def health():
             "chat": "/chat",
             "websocket": "/chat/ws",
             "agents": "/agents"
-        }
+        },
+        "context_cache": orchestrator.cache_stats(),
+        "response_cache": get_response_cache().stats(),
+        "single_flight": get_single_flight().stats(),
+        "openai_pool": client_pool_stats(),
+        "llm_scheduler": get_scheduler().stats(),
+        "tools": get_tool_runtime().stats(),
+        "ws_replay": get_replay_buffer().stats()
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Latency histograms in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     import uvicorn
     logger.info("Starting Agora backend server...")
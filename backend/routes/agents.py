@@ -1,24 +1,68 @@
 """API routes for listing and managing agents."""
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from core.orchestrator import Orchestrator
+from core.resources import get_orchestrator
 
 router = APIRouter(prefix="/agents", tags=["agents"])
-orchestrator = Orchestrator()
+
+# Clients may reuse metadata briefly, then revalidate with If-None-Match
+CACHE_CONTROL = "public, max-age=30"
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """Check whether the request's If-None-Match header matches an ETag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _cached_response(request: Request, response: Response, etag: str) -> Response | None:
+    """Return a 304 response for a matching conditional request, else set cache headers."""
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
 
 @router.get("/")
-async def list_agents():
+async def list_agents(
+    request: Request,
+    response: Response,
+    orchestrator: Orchestrator = Depends(get_orchestrator)
+):
     """
     Get list of available agents.
 
     Returns:
-        List of agent metadata
+        List of agent metadata, or 304 if the client's copy is current
     """
+    not_modified = _cached_response(request, response, orchestrator.agents_etag())
+    if not_modified:
+        return not_modified
+
     agents = orchestrator.list_available_agents()
     return {"agents": agents, "count": len(agents)}
 
+@router.post("/reload")
+async def reload_agents(orchestrator: Orchestrator = Depends(get_orchestrator)):
+    """
+    Discover added or removed agent folders and reload agents whose
+    config.yaml or prompt.txt changed on disk.
+
+    Returns:
+        Names of the changed agents
+    """
+    reloaded = orchestrator.reload_agents()
+    return {"reloaded": reloaded, "count": len(reloaded)}
+
 @router.get("/{agent_name}")
-async def get_agent_info(agent_name: str):
+async def get_agent_info(
+    agent_name: str,
+    request: Request,
+    response: Response,
+    orchestrator: Orchestrator = Depends(get_orchestrator)
+):
     """
     Get detailed information about a specific agent.
 
@@ -26,12 +70,15 @@ async def get_agent_info(agent_name: str):
         agent_name: Name of the agent
 
     Returns:
-        Agent metadata
+        Agent metadata, or 304 if the client's copy is current
     """
-    agents = orchestrator.list_available_agents()
-    agent = next((a for a in agents if a["name"] == agent_name), None)
+    found = orchestrator.get_agent_metadata(agent_name)
+    if not found:
+        raise HTTPException(status_code=404, detail=f"Agent '{agent_name}' not found")
 
-    if not agent:
-        return {"error": f"Agent '{agent_name}' not found"}, 404
+    agent, etag = found
+    not_modified = _cached_response(request, response, etag)
+    if not_modified:
+        return not_modified
 
     return agent
@@ -1,14 +1,58 @@
 """API routes for chat functionality."""
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import APIRouter, Depends, Request, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import AsyncGenerator, AsyncIterator, Optional
+import asyncio
+import json
+import os
+import re
+import time
 import uuid
+from core.batch import BATCH_CONCURRENCY, BATCH_DIR, BatchCheckpoint, BatchRunner, parse_items
 from core.orchestrator import Orchestrator
+from core.resources import get_orchestrator
+from utils.coalesce import FlushPolicy, coalesce
+from utils.llm_scheduler import LLMOverloaded, Priority, llm_priority
 from utils.logger import logger
+from utils.metrics import Histogram
+from utils.replay import ReplayGap, ReplayStream, get_replay_buffer
 
 router = APIRouter(prefix="/chat", tags=["chat"])
-orchestrator = Orchestrator()
+
+# Concurrent generations allowed on one WebSocket connection
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "4"))
+# Idle seconds before an SSE stream sends a comment to keep proxies from closing it
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+# Named batches currently running, so two requests never share a checkpoint
+_running_batches: set[str] = set()
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Stops nginx-style proxies from buffering the stream
+    "X-Accel-Buffering": "no"
+}
+
+WS_FIRST_FRAME_SECONDS = Histogram(
+    "agora_ws_first_token_frame_seconds", "Time from a WebSocket query to its first token frame", ("agent",)
+)
+WS_TURN_SECONDS = Histogram(
+    "agora_ws_turn_seconds", "Time from a WebSocket query to its end frame", ("agent",)
+)
+SSE_FIRST_EVENT_SECONDS = Histogram(
+    "agora_sse_first_token_event_seconds", "Time from an SSE chat request to its first token event", ("agent",)
+)
+
+def _agent_label(orchestrator: Orchestrator, agent_name: Optional[str]) -> str:
+    """
+    Label of a requested agent for events and metrics.
+
+    Names that are not installed agents are routed like no name at all, so
+    they become "auto"; metric series stay bounded by the installed agents.
+    """
+    return agent_name if agent_name and agent_name in orchestrator.manifest else "auto"
 
 class ChatRequest(BaseModel):
     """Request model for chat endpoint."""
@@ -23,25 +67,36 @@ class ChatResponse(BaseModel):
     agent_used: str
 
 @router.post("/")
-async def chat(request: ChatRequest):
+async def chat(
+    request: ChatRequest,
+    http_request: Request,
+    orchestrator: Orchestrator = Depends(get_orchestrator)
+):
     """
     Process a chat message (non-streaming).
 
+    Clients sending `Accept: text/event-stream` get the streamed response of
+    `/chat/stream` instead.
+
     Args:
         request: Chat request with query and optional session_id/agent_name
 
     Returns:
         Agent's response
     """
+    if "text/event-stream" in http_request.headers.get("accept", ""):
+        return await chat_stream(request, orchestrator)
+
     session_id = request.session_id or str(uuid.uuid4())
 
     try:
-        response = await orchestrator.handle_query(
-            query=request.query,
-            session_id=session_id,
-            agent_name=request.agent_name,
-            stream=False
-        )
+        with llm_priority(Priority.STANDARD):
+            response = await orchestrator.handle_query(
+                query=request.query,
+                session_id=session_id,
+                agent_name=request.agent_name,
+                stream=False
+            )
 
         return {
             "response": response,
@@ -49,77 +104,470 @@ async def chat(request: ChatRequest):
             "agent_used": request.agent_name or "auto"
         }
 
+    except LLMOverloaded as e:
+        logger.warning(f"Chat rejected under load: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         logger.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _as_stream(response: str | AsyncIterator[str]) -> AsyncIterator[str]:
+    """Stream a handle_query result; it is a plain error message when the agent fails to start."""
+    if not isinstance(response, str):
+        return response
+
+    async def single():
+        yield response
+    return single()
+
+def _sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """Format one Server-Sent Event; JSON data never spans lines."""
+    head = f"event: {event}\n" + (f"id: {event_id}\n" if event_id is not None else "")
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+async def _with_heartbeats(
+    chunks: AsyncIterator[str],
+    interval: float
+) -> AsyncGenerator[Optional[str], None]:
+    """
+    Yield chunks, and None whenever `interval` seconds pass without one.
+
+    The pending read is kept across heartbeats rather than cancelled, so
+    waiting never disturbs the upstream stream.
+    """
+    iterator = chunks.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=interval if interval > 0 else None)
+            if not done:
+                yield None
+                continue
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                return
+            finally:
+                pending = None
+            yield chunk
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        aclose = getattr(iterator, "aclose", None)
+        if aclose:
+            await aclose()
+
+async def _sse_events(
+    response_gen: AsyncIterator[str],
+    session_id: str,
+    agent_label: str,
+    received: float
+) -> AsyncGenerator[str, None]:
+    """Turn an agent's token stream into SSE events, with heartbeat comments while idle."""
+    event_id = 1
+    yield _sse("start", {"session_id": session_id, "agent": agent_label}, event_id)
+    first_event = True
+    try:
+        async for chunk in _with_heartbeats(coalesce(response_gen, FlushPolicy()), SSE_HEARTBEAT_SECONDS):
+            if chunk is None:
+                yield ": heartbeat\n\n"
+                continue
+            event_id += 1
+            yield _sse("token", {"content": chunk}, event_id)
+            if first_event:
+                first_event = False
+                SSE_FIRST_EVENT_SECONDS.labels(agent_label).observe(time.perf_counter() - received)
+        yield _sse("end", {"session_id": session_id}, event_id + 1)
+    except asyncio.CancelledError:
+        # The client went away; closing the generators above stops the upstream call
+        logger.info(f"SSE client disconnected from session {session_id}")
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming response: {e}")
+        yield _sse("error", {"content": str(e)}, event_id + 1)
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest, orchestrator: Orchestrator = Depends(get_orchestrator)):
+    """
+    Process a chat message, streaming the response as Server-Sent Events.
+
+    Events:
+        start: {"session_id": "...", "agent": "..."}
+        token: {"content": "..."} for each batch of tokens
+        end: {"session_id": "..."}
+        error: {"content": "..."}
+
+    Each event has an increasing `id`. A `: heartbeat` comment is sent after
+    SSE_HEARTBEAT_SECONDS without events. Disconnecting cancels the
+    generation; the partial reply stays available from
+    /chat/sessions/{session_id}/reply.
+    """
+    session_id = request.session_id or str(uuid.uuid4())
+    agent_label = _agent_label(orchestrator, request.agent_name)
+    received = time.perf_counter()
+
+    try:
+        with llm_priority(Priority.INTERACTIVE):
+            response_gen = await orchestrator.handle_query(
+                query=request.query,
+                session_id=session_id,
+                agent_name=request.agent_name,
+                stream=True
+            )
+    except LLMOverloaded as e:
+        logger.warning(f"Chat rejected under load: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        logger.error(f"Chat error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(
+        _sse_events(_as_stream(response_gen), session_id, agent_label, received),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@router.post("/batch")
+async def chat_batch(
+    request: Request,
+    concurrency: int = BATCH_CONCURRENCY,
+    batch_id: Optional[str] = None,
+    orchestrator: Orchestrator = Depends(get_orchestrator)
+):
+    """
+    Run many chat queries from a JSONL body, streaming JSONL results.
+
+    Each body line is {"query": "...", "session_id": "...", "agent_name": "...", "id": "..."}
+    (all but query optional). Results are streamed as items finish:
+    {"id", "session_id", "agent_used", "status", "response" or "error", "seconds"},
+    followed by a {"summary": {...}} line with throughput.
+
+    Args:
+        concurrency: Items run at once (at most 64)
+        batch_id: Checkpoints progress under this name; repeating the request
+            resends finished results and runs only the remaining items
+    """
+    if batch_id is not None:
+        if not re.fullmatch(r"[\w-]{1,128}", batch_id):
+            raise HTTPException(status_code=400, detail="batch_id may only contain letters, digits, '_' and '-'")
+        if batch_id in _running_batches:
+            raise HTTPException(status_code=409, detail=f"Batch '{batch_id}' is already running")
+        # Claimed before the first await, so a concurrent request with the same id gets the 409
+        _running_batches.add(batch_id)
+
+    try:
+        body = (await request.body()).decode("utf-8")
+        items, invalid = parse_items(body.splitlines())
+        checkpoint = BatchCheckpoint(BATCH_DIR / f"{batch_id}.jsonl") if batch_id else None
+        runner = BatchRunner(orchestrator, concurrency)
+    except BaseException:
+        _running_batches.discard(batch_id)
+        raise
+
+    async def results():
+        try:
+            for result in invalid:
+                yield json.dumps(result) + "\n"
+            if checkpoint:
+                for item in items:
+                    if item["id"] in checkpoint.completed:
+                        yield json.dumps(checkpoint.completed[item["id"]]) + "\n"
+            async for result in runner.run(items, checkpoint):
+                yield json.dumps(result) + "\n"
+            summary = runner.report()
+            logger.info(f"Batch {batch_id or ''} finished: {summary}")
+            yield json.dumps({"summary": summary}) + "\n"
+        finally:
+            if checkpoint:
+                checkpoint.close()
+            _running_batches.discard(batch_id)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.get("/sessions/{session_id}/reply")
+async def resume_reply(
+    session_id: str,
+    agent_name: Optional[str] = None,
+    offset: int = 0,
+    orchestrator: Orchestrator = Depends(get_orchestrator)
+):
+    """
+    Fetch the latest assistant reply of a session, e.g. after a dropped stream.
+
+    Replies are saved while they stream, so this returns the text generated
+    so far with status "streaming", or the final text with status
+    "complete" or "aborted" (cut short by a disconnect or error).
+
+    Args:
+        session_id: Session identifier
+        agent_name: Agent that answered; all agents are checked if omitted
+        offset: Characters the client already has; only the text after them is returned
+
+    Returns:
+        Reply status and content from `offset`, with the total length
+    """
+    reply = await orchestrator.latest_reply(session_id, agent_name)
+    if reply is None:
+        raise HTTPException(status_code=404, detail=f"No reply found for session '{session_id}'")
+
+    content = reply["content"]
+    offset = min(max(offset, 0), len(content))
+    return {
+        "session_id": session_id,
+        "agent": reply["agent"],
+        "message_id": reply["message_id"],
+        "status": reply["status"],
+        "offset": offset,
+        "length": len(content),
+        "content": content[offset:]
+    }
+
+async def _generate(
+    orchestrator: Orchestrator,
+    stream: ReplayStream,
+    request_id: str,
+    session_id: str,
+    data: dict,
+    policy: FlushPolicy
+):
+    """Run one WebSocket query, publishing its frames to a replay stream."""
+    query = data["query"]
+    agent_name = data.get("agent_name")
+    agent_label = _agent_label(orchestrator, agent_name)
+    received = time.perf_counter()
+    logger.info(f"Received WebSocket query {request_id}: {query[:50]}...")
+
+    try:
+        # Send start message
+        stream.publish({
+            "type": "start",
+            "request_id": request_id,
+            "session_id": session_id,
+            "agent": agent_label
+        })
+
+        # Stream response; interactive sessions are served first under load
+        with llm_priority(Priority.INTERACTIVE):
+            response_gen = await orchestrator.handle_query(
+                query=query,
+                session_id=session_id,
+                agent_name=agent_name,
+                stream=True
+            )
+
+        first_frame = True
+        async for chunk in coalesce(_as_stream(response_gen), policy):
+            stream.publish({
+                "type": "token",
+                "request_id": request_id,
+                "content": chunk
+            })
+            if first_frame:
+                first_frame = False
+                WS_FIRST_FRAME_SECONDS.labels(agent_label).observe(time.perf_counter() - received)
+
+        # Send completion message
+        stream.publish({
+            "type": "end",
+            "request_id": request_id,
+            "session_id": session_id
+        })
+        WS_TURN_SECONDS.labels(agent_label).observe(time.perf_counter() - received)
+
+    except asyncio.CancelledError:
+        logger.info(f"Cancelled WebSocket request {request_id}")
+        stream.publish({
+            "type": "cancelled",
+            "request_id": request_id,
+            "session_id": session_id
+        })
+        raise
+    except Exception as e:
+        logger.error(f"Error processing query: {e}")
+        stream.publish({
+            "type": "error",
+            "request_id": request_id,
+            "content": str(e)
+        })
+
+class ChatConnection:
+    """
+    State of one WebSocket connection following several generations at once.
+
+    Each query runs in its own task in the shared replay buffer, so token
+    frames of different requests interleave, a slow answer never blocks the
+    next query, and a generation outlives a dropped connection for the
+    resume grace period. The connection runs one task per followed
+    generation that forwards its frames; sends are serialized with a lock
+    because those tasks share the socket.
+    """
+
+    def __init__(self, websocket: WebSocket, orchestrator: Orchestrator):
+        self.websocket = websocket
+        self.orchestrator = orchestrator
+        self.policy = FlushPolicy()
+        self.tasks: dict[str, asyncio.Task] = {}  # request_id -> forwarding task
+        self.streams: dict[str, ReplayStream] = {}  # request_id -> followed generation
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, frame: dict):
+        async with self._send_lock:
+            await self.websocket.send_json(frame)
+
+    async def _error(self, request_id: Optional[str], content: str):
+        await self.send({
+            "type": "error",
+            "request_id": request_id,
+            "content": content
+        })
+
+    async def start_query(self, data: dict):
+        """Validate a query message and start its generation."""
+        request_id = str(data.get("request_id") or uuid.uuid4())
+        session_id = data.get("session_id") or str(uuid.uuid4())
+        query = data.get("query")
+
+        if not query:
+            await self._error(request_id, "No query provided")
+            return
+
+        existing = get_replay_buffer().get((session_id, request_id))
+        if request_id in self.tasks or (existing and not existing.done):
+            await self._error(request_id, f"Request '{request_id}' is already running")
+            return
+
+        if len(self.tasks) >= WS_MAX_IN_FLIGHT:
+            await self._error(request_id, f"Too many concurrent requests (limit {WS_MAX_IN_FLIGHT})")
+            return
+
+        policy = self.policy
+        stream = get_replay_buffer().start(
+            (session_id, request_id),
+            lambda stream: _generate(self.orchestrator, stream, request_id, session_id, data, policy)
+        )
+        self._follow(request_id, stream, 0)
+
+    async def resume(self, data: dict):
+        """Re-attach to a generation, sending the frames after `last_seq` and then live ones."""
+        request_id = str(data.get("request_id"))
+        session_id = str(data.get("session_id"))
+        try:
+            last_seq = int(data.get("last_seq") or 0)
+        except (TypeError, ValueError):
+            await self._error(request_id, "last_seq must be an integer")
+            return
+
+        stream = get_replay_buffer().get((session_id, request_id))
+        if stream is None:
+            await self._error(request_id, f"No resumable request '{request_id}' in session '{session_id}'")
+            return
+        if request_id in self.tasks:
+            await self._error(request_id, f"Request '{request_id}' is already followed on this connection")
+            return
+        if len(self.tasks) >= WS_MAX_IN_FLIGHT:
+            await self._error(request_id, f"Too many concurrent requests (limit {WS_MAX_IN_FLIGHT})")
+            return
+
+        logger.info(f"Resuming WebSocket request {request_id} after frame {last_seq}")
+        self._follow(request_id, stream, last_seq)
+
+    def _follow(self, request_id: str, stream: ReplayStream, after_seq: int):
+        task = asyncio.create_task(self._forward(request_id, stream, after_seq))
+        self.tasks[request_id] = task
+        self.streams[request_id] = stream
+
+        def forget(_):
+            if self.tasks.get(request_id) is task:
+                del self.tasks[request_id], self.streams[request_id]
+        task.add_done_callback(forget)
+
+    async def _forward(self, request_id: str, stream: ReplayStream, after_seq: int):
+        """Send a generation's frames to this connection."""
+        try:
+            async for frame in stream.follow(after_seq):
+                await self.send(frame)
+        except ReplayGap as e:
+            await self._error(request_id, f"{e}; fetch the reply from /chat/sessions/{stream.key[0]}/reply")
+
+    async def cancel(self, request_id: Optional[str]):
+        """Abort a followed generation, closing its upstream stream."""
+        stream = self.streams.get(str(request_id))
+        if stream is None or stream.done:
+            await self._error(request_id, f"No running request '{request_id}'")
+            return
+        stream.task.cancel()
+
+    async def close(self):
+        """Stop forwarding; generations keep running for the resume grace period."""
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
 @router.websocket("/ws")
-async def websocket_chat(websocket: WebSocket):
+async def websocket_chat(websocket: WebSocket, orchestrator: Orchestrator = Depends(get_orchestrator)):
     """
     WebSocket endpoint for streaming chat responses.
 
     Protocol:
-        Client sends: {"query": "...", "session_id": "...", "agent_name": "..."}
-        Server streams: {"type": "token", "content": "..."} for each token
-        Server ends with: {"type": "end", "session_id": "..."}
+        Client sends: {"query": "...", "session_id": "...", "agent_name": "...", "request_id": "..."}
+        Server streams: {"type": "token", "request_id": "...", "content": "...", "seq": n} for each batch of tokens
+        Server ends with: {"type": "end", "request_id": "...", "session_id": "...", "seq": n}
+        Client may send: {"type": "cancel", "request_id": "..."}
+        Server confirms with: {"type": "cancelled", "request_id": "...", "session_id": "...", "seq": n}
+        After reconnecting: {"type": "resume", "session_id": "...", "request_id": "...", "last_seq": n}
+
+    Every frame of a generation carries a sequence number starting at 1. A
+    generation keeps running for WS_RESUME_GRACE_SECONDS after its
+    connection drops, and its frames stay buffered for that long after it
+    ends; "resume" sends the frames after `last_seq` and continues live.
+
+    Several queries can run concurrently on one connection (up to
+    WS_MAX_IN_FLIGHT); every frame carries the request_id of its query,
+    generated by the server when the client does not send one.
+
+    Token chunks are coalesced into frames per a flush policy. The first
+    message may carry "stream_options" ({"flush_ms", "flush_bytes",
+    "flush_on_sentence"}; all zero/false sends one frame per chunk) to set
+    the policy for the connection. The accepted policy is echoed in an
+    {"type": "options"} frame, and a first message holding only options is
+    answered with that frame alone.
     """
     await websocket.accept()
     logger.info("WebSocket connection established")
 
+    connection = ChatConnection(websocket, orchestrator)
+    first_message = True
+
     try:
         while True:
             # Receive message from client
             data = await websocket.receive_json()
 
-            query = data.get("query")
-            session_id = data.get("session_id") or str(uuid.uuid4())
-            agent_name = data.get("agent_name")
-
-            if not query:
-                await websocket.send_json({
-                    "type": "error",
-                    "content": "No query provided"
-                })
-                continue
-
-            logger.info(f"Received WebSocket query: {query[:50]}...")
-
-            try:
-                # Send start message
-                await websocket.send_json({
-                    "type": "start",
-                    "session_id": session_id,
-                    "agent": agent_name or "auto"
-                })
-
-                # Stream response
-                response_gen = await orchestrator.handle_query(
-                    query=query,
-                    session_id=session_id,
-                    agent_name=agent_name,
-                    stream=True
-                )
-
-                async for chunk in response_gen:
-                    await websocket.send_json({
-                        "type": "token",
-                        "content": chunk
+            if first_message:
+                first_message = False
+                if "stream_options" in data:
+                    connection.policy = FlushPolicy.from_client(data["stream_options"])
+                    await connection.send({
+                        "type": "options",
+                        "stream_options": connection.policy.as_dict()
                     })
+                    if not data.get("query"):
+                        continue
 
-                # Send completion message
-                await websocket.send_json({
-                    "type": "end",
-                    "session_id": session_id
-                })
-
-            except Exception as e:
-                logger.error(f"Error processing query: {e}")
-                await websocket.send_json({
-                    "type": "error",
-                    "content": str(e)
-                })
+            if data.get("type") == "cancel":
+                await connection.cancel(data.get("request_id"))
+            elif data.get("type") == "resume":
+                await connection.resume(data)
+            else:
+                await connection.start_query(data)
 
     except WebSocketDisconnect:
         logger.info("WebSocket connection closed")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
+    finally:
+        await connection.close()
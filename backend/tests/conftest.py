@@ -0,0 +1,78 @@
+"""Shared setup: tests import backend modules the way the server does, from backend/."""
+
+import os
+import sys
+import threading
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from core.memory import MemoryManager
+from core.memory_store import InMemoryStore
+from core.orchestrator import Orchestrator
+from utils.embeddings import HashingEmbedder
+
+class StubAgent:
+    """
+    Answers from a script: a string, a list of chunks or an async iterator
+    to stream, or an exception to raise.
+    """
+
+    model = "stub"
+    max_context = None
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.contexts = []
+
+    async def run(self, query, context, stream=False):
+        self.contexts.append(context)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if not stream:
+            return outcome
+        if hasattr(outcome, "__aiter__"):
+            return outcome
+
+        async def chunks():
+            for chunk in outcome:
+                yield chunk
+        return chunks()
+
+class ModelEmbedder(HashingEmbedder):
+    """Stands in for a sentence-transformers model: semantic, and records the threads it runs in."""
+
+    semantic = True
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def embed(self, texts):
+        self.threads.append(threading.current_thread())
+        return super().embed(texts)
+
+@pytest.fixture
+def model_embedder():
+    return ModelEmbedder()
+
+@pytest.fixture
+def orchestrator():
+    """An orchestrator whose paper_writer memory is in-memory, with compaction off."""
+    orchestrator = Orchestrator()
+    orchestrator.compactor = None
+    memory = MemoryManager("paper_writer", write_behind=False, store=InMemoryStore("paper_writer"))
+    orchestrator.memory_managers["paper_writer"] = memory
+    return orchestrator
+
+@pytest.fixture
+def use_agent(orchestrator, monkeypatch):
+    """Make every agent of the orchestrator a StubAgent answering with the given outcomes."""
+    def install(*outcomes) -> StubAgent:
+        agent = StubAgent(*outcomes)
+        monkeypatch.setattr(orchestrator, "_load_agent", lambda name: agent)
+        return agent
+    return install
@@ -0,0 +1,82 @@
+"""Batch execution: retries under load and exclusive named batches."""
+
+import asyncio
+import json
+import pytest
+from fastapi import HTTPException
+import core.batch
+import routes.chat
+from core.batch import BatchCheckpoint, BatchRunner
+from utils.llm_scheduler import LLMOverloaded
+
+class GatedRequest:
+    """A request whose body arrives only once `gate` is set."""
+
+    def __init__(self, body: str, gate: asyncio.Event):
+        self._body = body.encode("utf-8")
+        self.gate = gate
+
+    async def body(self) -> bytes:
+        await self.gate.wait()
+        return self._body
+
+def test_retried_item_saves_its_query_once(orchestrator, use_agent, monkeypatch):
+    monkeypatch.setattr(core.batch, "BATCH_RETRY_SECONDS", 0)
+    use_agent(LLMOverloaded("queue full"), LLMOverloaded("queue full"), "answer")
+
+    async def run():
+        runner = BatchRunner(orchestrator, concurrency=1)
+        item = {"id": "1", "query": "write other", "session_id": "bt", "agent_name": "paper_writer"}
+        results = [result async for result in runner.run([item])]
+        assert results[0]["status"] == "ok"
+
+        memory = orchestrator.memory_managers["paper_writer"]
+        context = await memory.load_context("bt", limit=50)
+        assert [(m["role"], m["content"]) for m in context] == [("user", "write other"), ("assistant", "answer")]
+
+    asyncio.run(run())
+
+def test_same_batch_id_cannot_run_twice(orchestrator, use_agent, monkeypatch, tmp_path):
+    monkeypatch.setattr(routes.chat, "BATCH_DIR", tmp_path)
+    use_agent("answer")
+
+    async def run():
+        gate = asyncio.Event()
+        body = json.dumps({"query": "hi", "agent_name": "paper_writer"})
+        first = asyncio.create_task(
+            routes.chat.chat_batch(GatedRequest(body, gate), batch_id="nightly", orchestrator=orchestrator)
+        )
+        await asyncio.sleep(0)  # The first request is now waiting for its body
+
+        with pytest.raises(HTTPException) as rejected:
+            second = routes.chat.chat_batch(GatedRequest(body, gate), batch_id="nightly", orchestrator=orchestrator)
+            await asyncio.wait_for(second, timeout=5)
+        assert rejected.value.status_code == 409
+
+        gate.set()
+        response = await first
+        lines = [json.loads(line) async for line in response.body_iterator]
+        assert lines[0]["status"] == "ok"
+        assert "summary" in lines[-1]
+        assert "nightly" not in routes.chat._running_batches
+
+    asyncio.run(run())
+
+def test_failed_agent_is_an_error_result(orchestrator, use_agent, tmp_path):
+    use_agent(RuntimeError("boom"), "answer")
+
+    async def run():
+        item = {"id": "1", "query": "hi", "session_id": "bt", "agent_name": "paper_writer"}
+        checkpoint = BatchCheckpoint(tmp_path / "batch.jsonl")
+        failed = [result async for result in BatchRunner(orchestrator).run([item], checkpoint)]
+        assert failed[0]["status"] == "error"
+        assert failed[0]["error"] == "boom"
+        assert "response" not in failed[0]
+
+        # Resuming retries the failed item
+        retried = [result async for result in BatchRunner(orchestrator).run([item], checkpoint)]
+        assert retried[0]["status"] == "ok"
+        assert retried[0]["response"] == "answer"
+        checkpoint.close()
+
+    asyncio.run(run())
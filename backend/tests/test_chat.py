@@ -0,0 +1,70 @@
+"""Chat routes over stub agents: SSE and WebSocket framing of agent output."""
+
+import asyncio
+import routes.chat
+from utils.coalesce import FlushPolicy
+from utils.replay import ReplayBuffer
+
+async def generate(orchestrator, data: dict) -> list[dict]:
+    """Run one WebSocket generation and return its frames."""
+    buffer = ReplayBuffer(grace_seconds=0)
+    stream = buffer.start(
+        ("s", "r1"),
+        lambda stream: routes.chat._generate(orchestrator, stream, "r1", "s", data, FlushPolicy())
+    )
+    return [frame async for frame in stream.follow()]
+
+def test_websocket_generation_sends_the_agent_error(orchestrator, use_agent):
+    use_agent(RuntimeError("boom"))
+
+    frames = asyncio.run(generate(orchestrator, {"query": "hi", "agent_name": "paper_writer"}))
+    assert [frame["type"] for frame in frames] == ["start", "token", "end"]
+    assert frames[1]["content"] == "I encountered an error: boom"
+
+async def sse_events(orchestrator, events: list[str], **request):
+    """Drain an SSE response into events, one string per event."""
+    response = await routes.chat.chat_stream(
+        routes.chat.ChatRequest(query="hi", agent_name="paper_writer", **request), orchestrator
+    )
+    async for event in response.body_iterator:
+        events.append(event)
+
+def test_sse_sends_heartbeats_while_the_agent_is_idle(orchestrator, use_agent, monkeypatch):
+    monkeypatch.setattr(routes.chat, "SSE_HEARTBEAT_SECONDS", 0.05)
+
+    async def chunks():
+        yield "a"
+        await asyncio.sleep(0.3)
+        yield "b"
+
+    use_agent(chunks())
+    events = []
+    asyncio.run(sse_events(orchestrator, events))
+
+    kinds = ["heartbeat" if event == ": heartbeat\n\n" else event.split("\n")[0] for event in events]
+    assert kinds[0] == "event: start" and kinds[-1] == "event: end"
+    assert kinds.count("event: token") == 2
+    first, second = [i for i, kind in enumerate(kinds) if kind == "event: token"]
+    # About one heartbeat per 0.05s of the 0.3s pause
+    assert 3 <= kinds[first:second].count("heartbeat") <= 7
+
+def test_sse_disconnect_saves_the_partial_reply_as_aborted(orchestrator, use_agent):
+    async def chunks():
+        yield "partial"
+        await asyncio.Event().wait()
+
+    use_agent(chunks())
+
+    async def run():
+        events = []
+        client = asyncio.create_task(sse_events(orchestrator, events, session_id="s"))
+        while not any("event: token" in event for event in events):
+            await asyncio.sleep(0.01)
+        client.cancel()
+        await asyncio.gather(client, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        return await orchestrator.latest_reply("s", "paper_writer")
+
+    reply = asyncio.run(run())
+    assert reply["status"] == "aborted"
+    assert reply["content"] == "partial"
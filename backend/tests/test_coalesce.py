@@ -0,0 +1,53 @@
+"""Re-chunking of token streams into frames by a flush policy."""
+
+import asyncio
+import pytest
+from utils.coalesce import MAX_FLUSH_MS, FlushPolicy, coalesce
+
+async def upstream(*items):
+    """Yield string chunks; a number pauses for that many seconds, an exception is raised."""
+    for item in items:
+        if isinstance(item, Exception):
+            raise item
+        if isinstance(item, float):
+            await asyncio.sleep(item)
+        else:
+            yield item
+
+def frames(policy, *items) -> list[str]:
+    async def run():
+        return [frame async for frame in coalesce(upstream(*items), policy)]
+    return asyncio.run(run())
+
+def test_size_flush_and_the_rest_at_the_end():
+    policy = FlushPolicy(flush_ms=0, flush_bytes=4, flush_on_sentence=False)
+    assert frames(policy, "ab", "cd", "ef", "g") == ["abcd", "efg"]
+
+def test_time_flush_sends_a_partial_frame_while_upstream_stalls():
+    policy = FlushPolicy(flush_ms=50, flush_bytes=0, flush_on_sentence=False)
+    assert frames(policy, "a", "b", 0.3, "c") == ["ab", "c"]
+
+def test_sentence_flush():
+    policy = FlushPolicy(flush_ms=0, flush_bytes=0, flush_on_sentence=True)
+    assert frames(policy, "Hi", " there.", " How", " are", " you?\n", "Bye") == ["Hi there.", " How are you?\n", "Bye"]
+
+def test_disabled_policy_sends_every_chunk():
+    policy = FlushPolicy(flush_ms=0, flush_bytes=0, flush_on_sentence=False)
+    assert frames(policy, "a", "b", "c") == ["a", "b", "c"]
+
+def test_buffered_text_is_sent_before_an_upstream_error():
+    policy = FlushPolicy(flush_ms=1000, flush_bytes=0, flush_on_sentence=False)
+    received = []
+
+    async def run():
+        async for frame in coalesce(upstream("a", "b", RuntimeError("upstream failed")), policy):
+            received.append(frame)
+
+    with pytest.raises(RuntimeError, match="upstream failed"):
+        asyncio.run(run())
+    assert received == ["ab"]
+
+def test_client_options_are_clamped():
+    policy = FlushPolicy.from_client({"flush_ms": 10_000, "flush_bytes": -5, "flush_on_sentence": True})
+    assert policy.as_dict() == {"flush_ms": MAX_FLUSH_MS, "flush_bytes": 0, "flush_on_sentence": True}
+    assert FlushPolicy.from_client({"flush_ms": "soon"}).as_dict() == FlushPolicy().as_dict()
@@ -0,0 +1,96 @@
+"""Compaction of old turns into running summaries, against a stubbed LLM."""
+
+import asyncio
+import pytest
+import core.sqlite_store
+from core.compaction import CompactionScheduler
+from core.memory import MemoryManager, SUMMARY_PREFIX
+from core.memory_store import InMemoryStore
+
+class StubSummarizer:
+    """Stands in for the LLM: records each call and returns a numbered summary."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, previous, messages):
+        self.calls.append((previous, [m["content"] for m in messages]))
+        return f"summary {len(self.calls)}"
+
+@pytest.fixture(params=["sqlite", "memory"])
+def memory(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(core.sqlite_store, "MEMORY_DIR", str(tmp_path))
+    store = InMemoryStore("test") if request.param == "memory" else None
+    manager = MemoryManager("test", write_behind=False, backend=request.param, store=store)
+    yield manager
+    asyncio.run(manager.close())
+
+async def save_turns(memory, session_id, start, count):
+    for i in range(start, start + count):
+        await memory.save_message(session_id, "user" if i % 2 == 0 else "assistant", f"m{i}")
+
+async def compact(memory, scheduler, session_id):
+    assert scheduler.schedule(memory, session_id)
+    await scheduler.drain()
+
+def test_summary_covers_only_new_turns_and_keeps_recent(memory):
+    async def run():
+        stub = StubSummarizer()
+        scheduler = CompactionScheduler(stub, keep_recent=4, min_messages=1, min_interval=0)
+
+        await save_turns(memory, "s", 0, 10)
+        await compact(memory, scheduler, "s")
+        assert stub.calls == [(None, [f"m{i}" for i in range(6)])]
+        context = await memory.load_context("s", limit=20)
+        assert context[0] == {"role": "system", "content": SUMMARY_PREFIX + "summary 1"}
+        assert [m["content"] for m in context[1:]] == ["m6", "m7", "m8", "m9"]
+
+        # The second run folds only the turns added since the first, on top of its summary
+        await save_turns(memory, "s", 10, 4)
+        await compact(memory, scheduler, "s")
+        assert stub.calls[1] == ("summary 1", ["m6", "m7", "m8", "m9"])
+        context = await memory.load_context("s", limit=20)
+        assert context[0]["content"] == SUMMARY_PREFIX + "summary 2"
+        assert [m["content"] for m in context[1:]] == ["m10", "m11", "m12", "m13"]
+        await scheduler.close()
+
+    asyncio.run(run())
+
+def test_too_few_turns_are_not_summarized(memory):
+    async def run():
+        stub = StubSummarizer()
+        scheduler = CompactionScheduler(stub, keep_recent=4, min_messages=3, min_interval=0)
+
+        await save_turns(memory, "s", 0, 6)
+        await compact(memory, scheduler, "s")
+        assert stub.calls == []
+        context = await memory.load_context("s", limit=20)
+        assert [m["content"] for m in context] == [f"m{i}" for i in range(6)]
+        await scheduler.close()
+
+    asyncio.run(run())
+
+def test_failed_summarizer_leaves_history_intact(memory):
+    async def failing(previous, messages):
+        raise RuntimeError("LLM down")
+
+    async def run():
+        scheduler = CompactionScheduler(failing, keep_recent=2, min_messages=1, min_interval=0)
+        await save_turns(memory, "s", 0, 6)
+        await compact(memory, scheduler, "s")
+        context = await memory.load_context("s", limit=20)
+        assert [m["content"] for m in context] == [f"m{i}" for i in range(6)]
+        await scheduler.close()
+
+    asyncio.run(run())
+
+def test_schedule_is_rate_limited_per_session(memory):
+    async def run():
+        scheduler = CompactionScheduler(StubSummarizer(), min_interval=60)
+        await save_turns(memory, "s", 0, 2)
+        assert scheduler.schedule(memory, "s")
+        assert not scheduler.schedule(memory, "s")
+        assert scheduler.schedule(memory, "other")
+        await scheduler.close()
+
+    asyncio.run(run())
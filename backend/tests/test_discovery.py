@@ -0,0 +1,50 @@
+"""Agent discovery when configs are edited, broken and removed."""
+
+import os
+import pytest
+from core.discovery import AgentManifest
+
+def write_config(agent_dir, text, mtime):
+    path = agent_dir / "config.yaml"
+    path.write_text(text)
+    # Explicit mtimes, since quick successive writes can share one
+    os.utime(path, (mtime, mtime))
+
+@pytest.fixture
+def agents_dir(tmp_path):
+    agent_dir = tmp_path / "writer"
+    agent_dir.mkdir()
+    (agent_dir / "agent.py").write_text("")
+    write_config(agent_dir, "description: Writes\n", 1000)
+    return tmp_path
+
+def test_broken_config_keeps_previous_spec(agents_dir):
+    manifest = AgentManifest(agents_dir)
+    version = manifest.version
+
+    write_config(agents_dir / "writer", "description: [unclosed\n", 2000)
+    assert manifest.scan() == []
+    assert manifest.get("writer").description == "Writes"
+    assert manifest.version == version
+    # Not re-parsed until the file changes again
+    assert manifest.scan() == []
+
+    write_config(agents_dir / "writer", "description: Writes better\n", 3000)
+    assert manifest.scan() == ["writer"]
+    assert manifest.get("writer").description == "Writes better"
+
+def test_new_agent_with_broken_config_is_skipped(agents_dir):
+    manifest = AgentManifest(agents_dir)
+    broken = agents_dir / "broken"
+    broken.mkdir()
+    (broken / "agent.py").write_text("")
+    write_config(broken, "routing: {keywords: [\n", 1000)
+
+    assert manifest.scan() == []
+    assert "broken" not in manifest
+
+def test_removed_config_removes_agent(agents_dir):
+    manifest = AgentManifest(agents_dir)
+    (agents_dir / "writer" / "config.yaml").unlink()
+    assert manifest.scan() == ["writer"]
+    assert "writer" not in manifest
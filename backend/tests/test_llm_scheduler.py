@@ -0,0 +1,118 @@
+"""Admission, adaptive concurrency and retries of upstream LLM calls."""
+
+import asyncio
+import time
+import httpx
+import openai
+import pytest
+import utils.llm_scheduler
+from utils.llm_scheduler import LLMOverloaded, LLMScheduler, ModelLimiter, Priority, TokenBucket, retry_after_seconds
+
+def rate_limit_error(headers: dict) -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+    return openai.RateLimitError("slow down", response=httpx.Response(429, headers=headers, request=request), body=None)
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(per_minute=600)
+    now = bucket.updated
+    assert bucket.wait_time(600, now) == 0
+    bucket.take(600)
+    assert bucket.wait_time(10, now) == pytest.approx(1.0)
+    assert bucket.wait_time(10, now + 1) == pytest.approx(0.0)
+
+def test_calls_wait_for_the_token_budget():
+    async def run():
+        limiter = ModelLimiter("m", tpm=6000)  # 100 tokens per second
+        (await limiter.acquire(Priority.STANDARD, 6000)).release()
+        start = time.monotonic()
+        lease = await limiter.acquire(Priority.STANDARD, 10)
+        assert time.monotonic() - start == pytest.approx(0.1, abs=0.05)
+        lease.release()
+
+    asyncio.run(run())
+
+def test_waiting_calls_are_granted_by_priority():
+    async def run():
+        limiter = ModelLimiter("m")
+        limiter.limit = 1
+        held = await limiter.acquire(Priority.STANDARD, 0)
+        granted = []
+
+        async def call(priority):
+            lease = await limiter.acquire(priority, 0)
+            granted.append(priority)
+            lease.release()
+
+        waiters = [asyncio.create_task(call(p)) for p in (Priority.BACKGROUND, Priority.INTERACTIVE, Priority.STANDARD)]
+        await asyncio.sleep(0)
+        held.release()
+        await asyncio.gather(*waiters)
+        assert granted == [Priority.INTERACTIVE, Priority.STANDARD, Priority.BACKGROUND]
+
+    asyncio.run(run())
+
+def test_concurrency_grows_additively_and_halves_on_slow_responses(monkeypatch):
+    monkeypatch.setattr(utils.llm_scheduler, "LLM_LATENCY_TARGET_SECONDS", 5)
+
+    async def run():
+        limiter = ModelLimiter("m")
+        limiter.limit = 8
+        limiter.on_success(0.1)
+        assert limiter.limit == pytest.approx(8 + 1 / 8)
+        limiter.on_success(6)
+        assert limiter.limit == pytest.approx((8 + 1 / 8) / 2)
+        # At most one decrease per latency-target interval
+        limiter.on_throttled(None)
+        assert limiter.limit == pytest.approx((8 + 1 / 8) / 2)
+
+    asyncio.run(run())
+
+def test_retry_after_is_read_from_the_response():
+    assert retry_after_seconds(rate_limit_error({"retry-after": "2"})) == 2.0
+    assert retry_after_seconds(rate_limit_error({"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(rate_limit_error({})) is None
+    assert retry_after_seconds(ValueError("no response")) is None
+
+def test_throttled_call_pauses_the_model_and_retries(monkeypatch):
+    monkeypatch.setattr(utils.llm_scheduler, "LLM_RETRY_BASE_SECONDS", 0)
+    attempts = []
+
+    async def request():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise rate_limit_error({"retry-after": "0.2"})
+        return "ok"
+
+    async def run():
+        scheduler = LLMScheduler(max_retries=2)
+        result, lease = await scheduler.open("m", 10, request)
+        lease.release()
+        assert result == "ok"
+        limiter = scheduler.limiter("m")
+        assert (limiter.throttled, limiter.retries, limiter.in_flight) == (1, 1, 0)
+        # Halved by the 429, then one step up by the successful retry
+        halved = utils.llm_scheduler.LLM_CONCURRENCY_INITIAL * 0.5
+        assert limiter.limit == pytest.approx(halved + 1 / halved)
+        assert attempts[1] - attempts[0] >= 0.2
+
+    asyncio.run(run())
+
+def test_calls_beyond_the_queue_or_its_timeout_are_rejected(monkeypatch):
+    monkeypatch.setattr(utils.llm_scheduler, "LLM_MAX_QUEUE", 1)
+    monkeypatch.setattr(utils.llm_scheduler, "LLM_QUEUE_TIMEOUT_SECONDS", 0.05)
+
+    async def run():
+        limiter = ModelLimiter("m")
+        limiter.limit = 1
+        held = await limiter.acquire(Priority.STANDARD, 0)
+        waiting = asyncio.create_task(limiter.acquire(Priority.STANDARD, 0))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMOverloaded, match="Too many queued"):
+            await limiter.acquire(Priority.STANDARD, 0)
+        with pytest.raises(LLMOverloaded, match="Timed out"):
+            await waiting
+        assert limiter.rejected == 2
+        held.release()
+        assert limiter.stats()["in_flight"] == 0
+
+    asyncio.run(run())
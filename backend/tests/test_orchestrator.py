@@ -0,0 +1,79 @@
+"""What handle_query saves to memory, with stub agents in place of LLM calls."""
+
+import asyncio
+import threading
+import pytest
+import core.orchestrator
+from core.memory import MemoryManager
+from core.memory_store import InMemoryStore
+from utils.llm_scheduler import LLMOverloaded
+
+async def history(orchestrator, session_id):
+    memory = orchestrator.memory_managers["paper_writer"]
+    return [(m["role"], m["content"]) for m in await memory.load_context(session_id, limit=50)]
+
+def test_rejected_query_is_not_saved(orchestrator, use_agent):
+    agent = use_agent("first answer", LLMOverloaded("queue full"), "third answer")
+
+    async def run():
+        ask = lambda query: orchestrator.handle_query(query, "s", agent_name="paper_writer")
+        assert await ask("write paper 0") == "first answer"
+        with pytest.raises(LLMOverloaded):
+            await ask("write paper 1")
+        assert await ask("write paper 2") == "third answer"
+        assert await history(orchestrator, "s") == [
+            ("user", "write paper 0"), ("assistant", "first answer"),
+            ("user", "write paper 2"), ("assistant", "third answer")
+        ]
+        # The retried turn saw no unanswered query in its context
+        assert agent.contexts[2] == [
+            {"role": "user", "content": "write paper 0"}, {"role": "assistant", "content": "first answer"}
+        ]
+
+    asyncio.run(run())
+
+def test_rejected_stream_is_not_saved(orchestrator, use_agent):
+    use_agent(LLMOverloaded("queue full"), ["hel", "lo"])
+
+    async def run():
+        with pytest.raises(LLMOverloaded):
+            await orchestrator.handle_query("hi", "s", agent_name="paper_writer", stream=True)
+        stream = await orchestrator.handle_query("hi", "s", agent_name="paper_writer", stream=True)
+        assert [chunk async for chunk in stream] == ["hel", "lo"]
+        assert await history(orchestrator, "s") == [("user", "hi"), ("assistant", "hello")]
+
+    asyncio.run(run())
+
+def test_failed_query_is_saved_with_the_error(orchestrator, use_agent):
+    use_agent(RuntimeError("boom"))
+
+    async def run():
+        response = await orchestrator.handle_query("hi", "s", agent_name="paper_writer")
+        assert response == "I encountered an error: boom"
+        assert await history(orchestrator, "s") == [("user", "hi"), ("assistant", response)]
+
+    asyncio.run(run())
+
+def test_memory_opens_once_off_the_event_loop(orchestrator, monkeypatch):
+    threads = []
+
+    class RecordingManager(MemoryManager):
+        def __init__(self, agent_name):
+            threads.append(threading.current_thread())
+            super().__init__(agent_name, write_behind=False, store=InMemoryStore(agent_name))
+
+        @staticmethod
+        def has_stored_memory(agent_name):
+            return agent_name == "shopper"
+
+    monkeypatch.setattr(core.orchestrator, "MemoryManager", RecordingManager)
+
+    async def run():
+        await orchestrator.open_memory()
+        assert "shopper" in orchestrator.memory_managers
+        opened = await asyncio.gather(*(orchestrator._get_memory_manager("shopper") for _ in range(3)))
+        assert all(memory is orchestrator.memory_managers["shopper"] for memory in opened)
+
+    asyncio.run(run())
+    assert len(threads) == 1
+    assert threads[0] is not threading.main_thread()
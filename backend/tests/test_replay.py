@@ -0,0 +1,100 @@
+"""Resuming WebSocket generations from their replay buffer."""
+
+import asyncio
+import pytest
+import routes.chat
+from utils.coalesce import FlushPolicy
+from utils.replay import FRAME_OVERHEAD, ReplayBuffer, ReplayGap, close_replay_buffer, get_replay_buffer
+
+# One frame per chunk, so sequence numbers are predictable
+UNBUFFERED = FlushPolicy(flush_ms=0, flush_bytes=0, flush_on_sentence=False)
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, frame):
+        self.sent.append(frame)
+
+def start(buffer, orchestrator, key=("s", "r1")):
+    data = {"query": "hi", "agent_name": "paper_writer"}
+    return buffer.start(
+        key, lambda stream: routes.chat._generate(orchestrator, stream, key[1], key[0], data, UNBUFFERED)
+    )
+
+def test_resume_replays_frames_after_last_seq_then_live_ones(orchestrator, use_agent):
+    release = asyncio.Event()
+
+    async def chunks():
+        yield "a"
+        yield "b"
+        await release.wait()
+        yield "c"
+
+    use_agent(chunks())
+
+    async def run():
+        buffer = ReplayBuffer(grace_seconds=1)
+        stream = start(buffer, orchestrator)
+        while stream.seq < 3:  # start, a, b
+            await asyncio.sleep(0.01)
+
+        # A client that received frame 2 reconnects while the generation is still running
+        resumed = []
+
+        async def follow():
+            async for frame in stream.follow(after_seq=2):
+                resumed.append(frame)
+                if frame["seq"] == 3:
+                    release.set()
+
+        await follow()
+        assert [(f["seq"], f["type"], f.get("content")) for f in resumed] == [
+            (3, "token", "b"), (4, "token", "c"), (5, "end", None)
+        ]
+        # Every frame stays replayable after the end
+        assert [f["seq"] async for f in stream.follow()] == [1, 2, 3, 4, 5]
+
+    asyncio.run(run())
+
+def test_overflowed_buffer_reports_a_gap():
+    async def run():
+        buffer = ReplayBuffer(grace_seconds=1, stream_bytes=3 * (FRAME_OVERHEAD + 10))
+
+        async def produce(stream):
+            for _ in range(10):
+                stream.publish({"type": "token", "request_id": "r1", "content": "x" * 10})
+
+        stream = buffer.start(("s", "r1"), produce)
+        await stream.task
+
+        with pytest.raises(ReplayGap):
+            [frame async for frame in stream.follow(after_seq=2)]
+        assert [frame["seq"] async for frame in stream.follow(after_seq=7)] == [8, 9, 10]
+        assert buffer.total_bytes == stream.size <= buffer.stream_bytes
+
+    asyncio.run(run())
+
+def test_resuming_past_the_buffer_tells_the_client_where_to_fetch_the_reply(orchestrator):
+    async def run():
+        buffer = get_replay_buffer()
+        buffer.stream_bytes = FRAME_OVERHEAD + 10
+
+        async def produce(stream):
+            for _ in range(3):
+                stream.publish({"type": "token", "request_id": "r1", "content": "x" * 10})
+
+        await buffer.start(("s", "r1"), produce).task
+        connection = routes.chat.ChatConnection(FakeWebSocket(), orchestrator)
+        try:
+            await connection.resume({"session_id": "s", "request_id": "r1", "last_seq": 1})
+            await asyncio.gather(*connection.tasks.values())
+        finally:
+            await close_replay_buffer()
+
+        [error] = connection.websocket.sent
+        assert error["type"] == "error"
+        assert "no longer buffered" in error["content"]
+        assert "/chat/sessions/s/reply" in error["content"]
+
+    asyncio.run(run())
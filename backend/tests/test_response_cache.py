@@ -0,0 +1,35 @@
+"""Near-duplicate matching of the response cache."""
+
+import asyncio
+import threading
+import utils.response_cache
+from utils.embeddings import HashingEmbedder
+from utils.response_cache import ResponseCache
+
+def messages(text):
+    return [{"role": "system", "content": "Be brief."}, {"role": "user", "content": text}]
+
+def test_near_duplicates_are_embedded_in_worker_threads(model_embedder, monkeypatch):
+    monkeypatch.setattr(utils.response_cache, "get_embedder", lambda: model_embedder)
+    cache = ResponseCache(db_path="")
+
+    async def run():
+        await cache.put("m", 0.0, None, messages("recommend a laptop for students"), ["a laptop"], 60, 0.8)
+        hit = await cache.get("m", 0.0, None, messages("recommend a laptop for a student"), 0.8)
+        assert hit == ["a laptop"]
+        assert cache.hits["semantic"] == 1
+
+    asyncio.run(run())
+    assert len(model_embedder.threads) == 2
+    assert threading.main_thread() not in model_embedder.threads
+
+def test_similarity_is_ignored_with_the_hashing_embedder(monkeypatch):
+    monkeypatch.setattr(utils.response_cache, "get_embedder", lambda: HashingEmbedder())
+    cache = ResponseCache(db_path="")
+
+    async def run():
+        await cache.put("m", 0.0, None, messages("write 500 words"), ["short"], 60, 0.8)
+        assert await cache.get("m", 0.0, None, messages("write 1500 words"), 0.8) is None
+        assert await cache.get("m", 0.0, None, messages("write 500 words"), 0.8) == ["short"]
+
+    asyncio.run(run())
@@ -0,0 +1,24 @@
+"""Semantic routing keeps model work off the event loop."""
+
+import asyncio
+import threading
+import core.router
+from core.router import AgentRouter
+
+def test_semantic_index_builds_and_encodes_in_worker_threads(model_embedder, monkeypatch):
+    monkeypatch.setattr(core.router, "get_embedder", lambda: model_embedder)
+    router = AgentRouter(mode="semantic")
+    assert router.semantic is None
+
+    async def run():
+        # Keywords route until the index is loaded
+        assert await router.route("find me a laptop") in router.list_agents()
+        assert not model_embedder.threads
+        await router.load_semantic()
+        assert router.semantic is not None
+        assert await router.route("write a research paper about climate") in router.list_agents()
+
+    asyncio.run(run())
+    # One embedding per agent for the index, and one for the query
+    assert len(model_embedder.threads) == len(router.semantic.agents) + 1
+    assert threading.main_thread() not in model_embedder.threads
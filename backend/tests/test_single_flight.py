@@ -0,0 +1,79 @@
+"""Identical concurrent generations share one upstream call."""
+
+import asyncio
+from utils.single_flight import FlightCancelled, SingleFlight
+
+class Upstream:
+    """A stub upstream call: responds, sends "a", and sends "b" once released."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, flight):
+        self.calls += 1
+        flight.open()
+        flight.publish("a")
+        await self.release.wait()
+        flight.publish("b")
+
+async def read(flight) -> list[str]:
+    return [chunk async for chunk in flight.subscribe()]
+
+def test_identical_calls_share_one_upstream_request():
+    async def run():
+        registry = SingleFlight(enabled=True)
+        upstream = Upstream()
+        first = registry.join("key", upstream)
+        second = registry.join("key", upstream)
+        assert second is first
+
+        readers = [asyncio.create_task(read(first)), asyncio.create_task(read(second))]
+        await first.wait_started()
+        upstream.release.set()
+        assert await asyncio.gather(*readers) == [["a", "b"], ["a", "b"]]
+        assert upstream.calls == 1
+        assert registry.stats() == {"in_flight": 0, "started": 1, "shared": 1}
+
+        # A finished generation is not joined again
+        upstream.release.clear()
+        assert registry.join("key", upstream) is not first
+
+    asyncio.run(run())
+
+def test_cancelled_leader_does_not_fail_followers():
+    async def run():
+        registry = SingleFlight(enabled=True)
+        upstream = Upstream()
+        leader = registry.join("key", upstream)
+        follower = registry.join("key", upstream)
+        leader_reader = asyncio.create_task(read(leader))
+        follower_reader = asyncio.create_task(read(follower))
+        await leader.wait_started()
+        await asyncio.sleep(0)
+
+        leader_reader.cancel()
+        await asyncio.gather(leader_reader, return_exceptions=True)
+        assert not leader.task.done()
+
+        upstream.release.set()
+        assert await follower_reader == ["a", "b"]
+        assert upstream.calls == 1
+
+    asyncio.run(run())
+
+def test_generation_stops_when_every_subscriber_leaves():
+    async def run():
+        registry = SingleFlight(enabled=True)
+        upstream = Upstream()
+        flight = registry.join("key", upstream)
+        reader = asyncio.create_task(read(flight))
+        await flight.wait_started()
+        await asyncio.sleep(0)
+
+        reader.cancel()
+        await asyncio.gather(reader, flight.task, return_exceptions=True)
+        assert isinstance(flight.error, FlightCancelled)
+        assert registry.stats()["in_flight"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,56 @@
+"""Location of the SQLite databases and the move out of the agent directories."""
+
+import asyncio
+import core.sqlite_store
+from core.memory import MemoryManager
+from core.sqlite_store import SQLiteStore
+
+def test_legacy_database_moves_to_memory_dir(tmp_path, monkeypatch):
+    agents_dir = tmp_path / "agents"
+    monkeypatch.setattr(core.sqlite_store, "AGENTS_DIR", agents_dir)
+
+    async def save_legacy():
+        monkeypatch.setattr(core.sqlite_store, "MEMORY_DIR", str(tmp_path / "old"))
+        memory = MemoryManager("writer", write_behind=False, backend="sqlite")
+        await memory.save_message("s1", "user", "kept")
+        await memory.close()
+        (agents_dir / "writer").mkdir(parents=True)
+        (tmp_path / "old" / "writer.db").rename(agents_dir / "writer" / "memory.db")
+
+    async def load():
+        memory = MemoryManager("writer", write_behind=False, backend="sqlite")
+        try:
+            return [m["content"] for m in await memory.load_context("s1")]
+        finally:
+            await memory.close()
+
+    asyncio.run(save_legacy())
+    monkeypatch.setattr(core.sqlite_store, "MEMORY_DIR", str(tmp_path / "data"))
+    assert SQLiteStore.has_data("writer")
+
+    assert asyncio.run(load()) == ["kept"]
+    assert (tmp_path / "data" / "writer.db").exists()
+    assert not (agents_dir / "writer" / "memory.db").exists()
+    assert asyncio.run(load()) == ["kept"]
+
+def test_database_defaults_outside_the_agents_directory():
+    path = SQLiteStore.database_path("writer").resolve()
+    assert not path.is_relative_to(core.sqlite_store.AGENTS_DIR)
+
+def test_context_cache_is_off_when_workers_share_the_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.sqlite_store, "MEMORY_DIR", str(tmp_path))
+    monkeypatch.setattr(SQLiteStore, "shared", True)
+
+    async def run():
+        first = MemoryManager("writer", write_behind=False, backend="sqlite")
+        other_worker = MemoryManager("writer", write_behind=False, backend="sqlite")
+        try:
+            await first.save_message("s1", "user", "one")
+            assert [m["content"] for m in await first.load_context("s1")] == ["one"]
+            await other_worker.save_message("s1", "assistant", "two")
+            assert [m["content"] for m in await first.load_context("s1")] == ["one", "two"]
+        finally:
+            await first.close()
+            await other_worker.close()
+
+    asyncio.run(run())
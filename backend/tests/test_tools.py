@@ -0,0 +1,76 @@
+"""Tool execution: executors, timeouts and cached results."""
+
+import asyncio
+import os
+import threading
+import time
+import pytest
+from utils.tools import Tool, ToolRuntime, ToolTimeout, tool
+
+@tool
+async def loop_thread() -> str:
+    return threading.current_thread().name
+
+@tool
+def worker_thread() -> str:
+    return threading.current_thread().name
+
+@tool(executor="process")
+def worker_pid() -> int:
+    return os.getpid()
+
+@pytest.fixture
+def runtime():
+    runtime = ToolRuntime(threads=2, processes=1)
+    yield runtime
+    runtime.close()
+
+def test_executors_split_async_thread_and_process_tools(runtime):
+    async def run():
+        return await asyncio.gather(
+            runtime.run(loop_thread), runtime.run(worker_thread), runtime.run(worker_pid)
+        )
+
+    async_thread, pool_thread, pid = asyncio.run(run())
+    assert async_thread == threading.main_thread().name
+    assert pool_thread.startswith("tool")
+    assert pid != os.getpid()
+
+@pytest.mark.parametrize("executor", ["async", "thread"])
+def test_slow_call_times_out(runtime, executor):
+    def blocking():
+        time.sleep(0.5)
+
+    async def sleeping():
+        await asyncio.sleep(0.5)
+
+    slow = Tool(sleeping if executor == "async" else blocking, timeout=0.05)
+
+    async def run():
+        with pytest.raises(ToolTimeout):
+            await runtime.run(slow)
+
+    asyncio.run(run())
+    assert slow.stats()["timeouts"] == 1
+
+def test_cached_results_expire_after_their_ttl(runtime):
+    calls = []
+
+    def lookup(item: str) -> str:
+        calls.append(item)
+        time.sleep(0.05)
+        return item.upper()
+
+    cached = Tool(lookup, cache_ttl=0.2)
+
+    async def run():
+        # Identical calls while one runs share it; the result is then served from the cache
+        assert await asyncio.gather(runtime.run(cached, "a"), runtime.run(cached, "a")) == ["A", "A"]
+        assert await runtime.run(cached, "a") == "A"
+        assert calls == ["a"]
+        await asyncio.sleep(0.25)
+        assert await runtime.run(cached, "a") == "A"
+        assert calls == ["a", "a"]
+
+    asyncio.run(run())
+    assert (cached.calls, cached.hits) == (2, 2)
@@ -1,6 +1,6 @@
 """Utility modules for Agora backend."""
 
 from .logger import logger
-from .openai_client import llm_call, llm_call_with_context
+from .openai_client import llm_call, llm_call_with_context, get_client
 
-__all__ = ["logger", "llm_call", "llm_call_with_context"]
+__all__ = ["logger", "llm_call", "llm_call_with_context", "get_client"]
@@ -0,0 +1,148 @@
+"""Coalescing of streamed token chunks into fewer, larger frames."""
+
+import asyncio
+import os
+import re
+from typing import AsyncGenerator, AsyncIterator, Optional
+
+DEFAULT_FLUSH_MS = float(os.getenv("WS_FLUSH_MS", "30"))
+DEFAULT_FLUSH_BYTES = int(os.getenv("WS_FLUSH_BYTES", "1024"))
+DEFAULT_FLUSH_ON_SENTENCE = os.getenv("WS_FLUSH_ON_SENTENCE", "false").lower() in ("1", "true", "yes")
+
+# Upper bounds for values requested by clients
+MAX_FLUSH_MS = 250
+MAX_FLUSH_BYTES = 64 * 1024
+
+# Buffer ends a sentence: terminal punctuation, optional closing quotes/brackets, whitespace
+_SENTENCE_END = re.compile(r"[.!?\n][\"')\]]*\s*$")
+
+class FlushPolicy:
+    """
+    When buffered chunks are sent as one frame.
+
+    A frame is flushed when `flush_ms` has passed since its first chunk,
+    when it reaches `flush_bytes`, or (with `flush_on_sentence`) when it
+    ends a sentence. A policy with all three disabled sends every chunk as
+    its own frame.
+    """
+
+    def __init__(
+        self,
+        flush_ms: float = DEFAULT_FLUSH_MS,
+        flush_bytes: int = DEFAULT_FLUSH_BYTES,
+        flush_on_sentence: bool = DEFAULT_FLUSH_ON_SENTENCE
+    ):
+        self.flush_ms = flush_ms
+        self.flush_bytes = flush_bytes
+        self.flush_on_sentence = flush_on_sentence
+
+    @property
+    def enabled(self) -> bool:
+        return self.flush_ms > 0 or self.flush_bytes > 0 or self.flush_on_sentence
+
+    @classmethod
+    def from_client(cls, options: Optional[dict]) -> "FlushPolicy":
+        """
+        Build a policy from client-supplied options, clamped to safe bounds.
+
+        Missing or invalid fields fall back to the server defaults.
+        """
+        policy = cls()
+        if not isinstance(options, dict):
+            return policy
+
+        try:
+            if "flush_ms" in options:
+                policy.flush_ms = min(max(float(options["flush_ms"]), 0), MAX_FLUSH_MS)
+            if "flush_bytes" in options:
+                policy.flush_bytes = min(max(int(options["flush_bytes"]), 0), MAX_FLUSH_BYTES)
+        except (TypeError, ValueError):
+            return cls()
+        if "flush_on_sentence" in options:
+            policy.flush_on_sentence = bool(options["flush_on_sentence"])
+        return policy
+
+    def as_dict(self) -> dict:
+        return {
+            "flush_ms": self.flush_ms,
+            "flush_bytes": self.flush_bytes,
+            "flush_on_sentence": self.flush_on_sentence
+        }
+
+async def coalesce(
+    chunks: AsyncIterator[str],
+    policy: FlushPolicy
+) -> AsyncGenerator[str, None]:
+    """
+    Re-chunk a token stream according to a flush policy.
+
+    Upstream chunks are read by a background task so the time window can
+    flush a partial frame even while the upstream is stalled.
+
+    Args:
+        chunks: Upstream async iterator of text chunks
+        policy: When to emit buffered text
+
+    Yields:
+        Concatenated chunks, in order, with nothing dropped
+    """
+    if not policy.enabled:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for chunk in chunks:
+                queue.put_nowait(chunk)
+            queue.put_nowait(done)
+        except Exception as e:
+            queue.put_nowait(e)
+
+    reader = asyncio.create_task(pump())
+    loop = asyncio.get_running_loop()
+    window = policy.flush_ms / 1000 if policy.flush_ms > 0 else None
+    buffer: list[str] = []
+    size = 0
+    deadline = None
+
+    try:
+        while True:
+            timeout = None
+            if buffer and deadline is not None:
+                timeout = max(0.0, deadline - loop.time())
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None  # Window elapsed: flush what we have
+
+            if item is done or isinstance(item, Exception):
+                if buffer:
+                    yield "".join(buffer)
+                if isinstance(item, Exception):
+                    raise item
+                return
+
+            if item is not None:
+                if not buffer and window is not None:
+                    deadline = loop.time() + window
+                buffer.append(item)
+                size += len(item.encode("utf-8"))
+                if not (
+                    (policy.flush_bytes and size >= policy.flush_bytes)
+                    or (policy.flush_on_sentence and _SENTENCE_END.search(item))
+                ):
+                    continue
+
+            if buffer:
+                yield "".join(buffer)
+                buffer, size, deadline = [], 0, None
+    finally:
+        reader.cancel()
+        try:
+            await reader
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,91 @@
+"""Local CPU text embeddings for similarity lookups."""
+
+import asyncio
+import os
+import re
+import zlib
+from functools import lru_cache
+import numpy as np
+from .logger import logger
+
+# Name of a sentence-transformers model to use instead of the hashing embedder
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "")
+
+_WORD = re.compile(r"\w+")
+
+class HashingEmbedder:
+    """
+    Embeds text by hashing words and character trigrams into a fixed vector.
+
+    Needs no model download and embeds thousands of short texts per second.
+    It captures lexical overlap (shared words, spelling variants) rather
+    than meaning, which suits keyword-like routing. Requests that differ in
+    one word ("500 words" vs "1500 words") score as near-identical, so it
+    must not decide that two requests deserve the same answer.
+    """
+
+    # Scores reflect shared words, not meaning
+    semantic = False
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def _features(self, text: str) -> list[str]:
+        words = _WORD.findall(text.lower())
+        features = list(words)
+        for word in words:
+            padded = f" {word} "
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """
+        Embed texts into L2-normalized rows.
+
+        Returns:
+            float32 array of shape (len(texts), dim)
+        """
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = zlib.crc32(feature.encode("utf-8"))
+                # Low bits pick the bucket, one high bit the sign, to limit collision bias
+                matrix[row, digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+class SentenceTransformerEmbedder:
+    """Embeds text with a local sentence-transformers model."""
+
+    semantic = True
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+@lru_cache(maxsize=1)
+def get_embedder():
+    """
+    Return the process-wide embedder.
+
+    Uses EMBEDDING_MODEL through sentence-transformers when configured and
+    installed, and the hashing embedder otherwise.
+    """
+    if EMBEDDING_MODEL:
+        try:
+            embedder = SentenceTransformerEmbedder(EMBEDDING_MODEL)
+            logger.info(f"Using embedding model {EMBEDDING_MODEL}")
+            return embedder
+        except Exception as e:
+            logger.warning(f"Could not load embedding model {EMBEDDING_MODEL}, using hashing embedder: {e}")
+    return HashingEmbedder()
+
+async def load_embedder():
+    """Load the embedder in a worker thread, so no request waits for a model to load."""
+    await asyncio.to_thread(get_embedder)
@@ -0,0 +1,126 @@
+"""Tuned HTTP client for upstream API calls, with connection pool statistics."""
+
+import importlib.util
+import os
+from typing import Optional
+import httpx
+from .logger import logger
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = os.getenv("OPENAI_HTTP2", "false").lower() in ("1", "true", "yes")
+HTTP_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+# Longest gap between streamed chunks before a read fails
+HTTP_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "60"))
+HTTP_WRITE_TIMEOUT = float(os.getenv("OPENAI_WRITE_TIMEOUT", "10"))
+# Longest wait for a free pooled connection
+HTTP_POOL_TIMEOUT = float(os.getenv("OPENAI_POOL_TIMEOUT", "10"))
+
+class PoolStatsTransport(httpx.AsyncHTTPTransport):
+    """
+    Connection-pooling transport that reports pool utilization.
+
+    Counts requests from send until their response body is closed, which
+    for streamed completions spans the whole generation.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests_total = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests_total += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self.in_flight -= 1
+            raise
+
+        stream = response.stream
+        transport = self
+
+        class _CountedStream(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                async for chunk in stream:
+                    yield chunk
+
+            async def aclose(self):
+                try:
+                    await stream.aclose()
+                finally:
+                    # aclose may run more than once; only the first counts
+                    if not getattr(self, "_closed", False):
+                        self._closed = True
+                        transport.in_flight -= 1
+
+        response.stream = _CountedStream()
+        return response
+
+    def stats(self) -> dict:
+        """Snapshot of the pool: open/idle connections and queued requests."""
+        connections = list(getattr(self._pool, "connections", []))
+        pending = list(getattr(self._pool, "_requests", []))
+        queued = sum(1 for request in pending if request.is_queued())
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "max_connections": HTTP_MAX_CONNECTIONS,
+            "connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "queued_requests": queued,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests_total": self.requests_total
+        }
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+def create_http_client(
+    max_connections: int = HTTP_MAX_CONNECTIONS,
+    max_keepalive: int = HTTP_MAX_KEEPALIVE,
+    keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+    http2: bool = HTTP2_ENABLED,
+    connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+    read_timeout: float = HTTP_READ_TIMEOUT,
+    write_timeout: float = HTTP_WRITE_TIMEOUT,
+    pool_timeout: float = HTTP_POOL_TIMEOUT
+) -> httpx.AsyncClient:
+    """
+    Create a pooled HTTP client with explicit limits and timeouts.
+
+    Falls back to HTTP/1.1 when HTTP/2 is requested but the `h2` package
+    is not installed.
+
+    Returns:
+        Client whose transport is a PoolStatsTransport
+    """
+    if http2 and not http2_available():
+        logger.warning("OPENAI_HTTP2 is set but h2 is not installed, using HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=keepalive_expiry
+    )
+    transport = PoolStatsTransport(limits=limits, http2=http2)
+    timeout = httpx.Timeout(
+        connect=connect_timeout,
+        read=read_timeout,
+        write=write_timeout,
+        pool=pool_timeout
+    )
+    return httpx.AsyncClient(transport=transport, timeout=timeout, limits=limits, http2=http2)
+
+def pool_stats(client: httpx.AsyncClient) -> Optional[dict]:
+    """Return pool statistics of a client made by create_http_client, else None."""
+    transport = getattr(client, "_transport", None)
+    if isinstance(transport, PoolStatsTransport):
+        return transport.stats()
+    return None
@@ -0,0 +1,327 @@
+"""Admission control, adaptive concurrency and retries for upstream LLM calls."""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from typing import Awaitable, Callable, Optional, TypeVar
+import openai
+from .logger import logger
+from .metrics import Histogram
+
+# Per-model request and token budgets per minute; 0 means unlimited.
+# LLM_MODEL_LIMITS overrides them per model, e.g. {"gpt-4o": {"rpm": 500, "tpm": 30000}}
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+LLM_MODEL_LIMITS = json.loads(os.getenv("LLM_MODEL_LIMITS", "{}") or "{}")
+
+# Concurrent upstream calls per model, adapted between the bounds (AIMD)
+LLM_CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", "8"))
+LLM_CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", "1"))
+LLM_CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", "64"))
+# Time to response headers above which concurrency is reduced
+LLM_LATENCY_TARGET_SECONDS = float(os.getenv("LLM_LATENCY_TARGET_SECONDS", "5"))
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "30"))
+
+# Waiting requests per model, and how long one may wait for a slot
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "1000"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "60"))
+
+# Completion tokens charged to the token budget when max_tokens is not set
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "500"))
+
+# Multiplicative decrease applied on throttling or slow responses
+DECREASE_FACTOR = 0.5
+
+T = TypeVar("T")
+
+QUEUE_SECONDS = Histogram(
+    "agora_llm_queue_seconds", "Time an LLM call waited for admission", ("model", "priority")
+)
+
+class Priority(IntEnum):
+    """Queue order of waiting LLM calls; lower runs first."""
+    INTERACTIVE = 0
+    STANDARD = 1
+    BACKGROUND = 2
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("llm_priority", default=Priority.STANDARD)
+
+@contextmanager
+def llm_priority(priority: Priority):
+    """Run LLM calls made inside the block (and tasks it starts) at a priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class LLMOverloaded(Exception):
+    """An LLM call could not be admitted: the queue is full or the wait timed out."""
+
+class TokenBucket:
+    """Budget refilled continuously at `per_minute`, holding at most one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 if available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+class Lease:
+    """A granted concurrency slot, held until the upstream call finishes."""
+
+    def __init__(self, limiter: "ModelLimiter"):
+        self._limiter = limiter
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._limiter._release()
+
+class ModelLimiter:
+    """
+    Admission control for one model.
+
+    Waiting calls are granted in priority order (FIFO within a priority)
+    while the in-flight count is below the adaptive limit and the request
+    and token buckets allow. The limit grows by about one per limit-many
+    fast successes and halves on throttling or slow responses, at most once
+    per latency-target interval.
+    """
+
+    def __init__(self, model: str, rpm: float = 0, tpm: float = 0):
+        self.model = model
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.limit = float(LLM_CONCURRENCY_INITIAL)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._queue: list = []  # (priority, seq, tokens, future)
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._last_decrease = float("-inf")
+        self.throttled = 0
+        self.retries = 0
+        self.rejected = 0
+
+    async def acquire(self, priority: Priority, tokens: int) -> Lease:
+        """Wait for a slot and budget, in priority order."""
+        if len(self._queue) >= LLM_MAX_QUEUE:
+            self.rejected += 1
+            raise LLMOverloaded(f"Too many queued requests for {self.model}")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), tokens, future))
+        self._dispatch()
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), LLM_QUEUE_TIMEOUT_SECONDS)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                future.result().release()  # Granted just as the waiter gave up
+            else:
+                future.cancel()  # Skipped by _dispatch
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise LLMOverloaded(f"Timed out waiting for capacity on {self.model}") from None
+            raise
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        while self._queue:
+            _, _, tokens, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            if self.in_flight >= max(1, int(self.limit)):
+                return
+
+            wait = self.blocked_until - now
+            if self.requests:
+                wait = max(wait, self.requests.wait_time(1, now))
+            if self.tokens:
+                wait = max(wait, self.tokens.wait_time(tokens, now))
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = loop.call_later(wait, self._wake)
+                return
+
+            heapq.heappop(self._queue)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+            self.in_flight += 1
+            future.set_result(Lease(self))
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _decrease(self, now: float):
+        if now - self._last_decrease >= LLM_LATENCY_TARGET_SECONDS:
+            self._last_decrease = now
+            self.limit = max(LLM_CONCURRENCY_MIN, self.limit * DECREASE_FACTOR)
+            logger.info(f"Reduced {self.model} concurrency limit to {int(self.limit)}")
+
+    def on_success(self, latency: float):
+        """Adapt the limit to the time an upstream call took to respond."""
+        if latency > LLM_LATENCY_TARGET_SECONDS:
+            self._decrease(time.monotonic())
+        else:
+            self.limit = min(LLM_CONCURRENCY_MAX, self.limit + 1 / self.limit)
+        self._dispatch()
+
+    def on_throttled(self, retry_after: Optional[float]):
+        """Back off after a 429: shrink the limit and pause dispatch for Retry-After."""
+        now = time.monotonic()
+        self.throttled += 1
+        self._decrease(now)
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def stats(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": sum(1 for entry in self._queue if not entry[3].done()),
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "rejected": self.rejected
+        }
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read Retry-After (or retry-after-ms) from an API error's response."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409) or error.status_code >= 500
+    return False
+
+class LLMScheduler:
+    """Routes upstream calls through a ModelLimiter per model, retrying transient errors."""
+
+    def __init__(self, max_retries: int = LLM_MAX_RETRIES):
+        self.max_retries = max_retries
+        self._limiters: dict[str, ModelLimiter] = {}
+
+    def limiter(self, model: str) -> ModelLimiter:
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            limits = LLM_MODEL_LIMITS.get(model, {})
+            limiter = self._limiters[model] = ModelLimiter(
+                model,
+                rpm=float(limits.get("rpm", LLM_RPM)),
+                tpm=float(limits.get("tpm", LLM_TPM))
+            )
+        return limiter
+
+    async def open(
+        self,
+        model: str,
+        tokens: int,
+        request: Callable[[], Awaitable[T]]
+    ) -> tuple[T, Lease]:
+        """
+        Run `request` once admitted, retrying throttling and server errors.
+
+        The slot is released between attempts, so backoff does not hold
+        capacity. Retry-After from a 429 pauses the whole model.
+
+        Args:
+            model: Model the request is for
+            tokens: Estimated prompt plus completion tokens
+            request: Opens the upstream call (e.g. a streaming create)
+
+        Returns:
+            The request's result and the lease to release when it is done
+        """
+        limiter = self.limiter(model)
+        priority = _priority.get()
+        attempt = 0
+        while True:
+            queued = time.perf_counter()
+            lease = await limiter.acquire(priority, tokens)
+            QUEUE_SECONDS.labels(model, priority.name.lower()).observe(time.perf_counter() - queued)
+            start = time.monotonic()
+            try:
+                result = await request()
+            except Exception as e:
+                lease.release()
+                retry_after = retry_after_seconds(e)
+                if isinstance(e, openai.RateLimitError):
+                    limiter.on_throttled(retry_after)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                backoff = random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+                delay = min(LLM_RETRY_MAX_SECONDS, retry_after + backoff) if retry_after else backoff
+                attempt += 1
+                limiter.retries += 1
+                logger.warning(f"LLM call to {model} failed ({e}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                lease.release()
+                raise
+
+            limiter.on_success(time.monotonic() - start)
+            return result, lease
+
+    def stats(self) -> dict:
+        return {model: limiter.stats() for model, limiter in self._limiters.items()}
+
+_scheduler: Optional[LLMScheduler] = None
+
+def get_scheduler() -> LLMScheduler:
+    """Return the shared scheduler, creating it on first use."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
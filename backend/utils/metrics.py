@@ -0,0 +1,110 @@
+"""Lightweight latency histograms exported in the Prometheus text format."""
+
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds, from sub-millisecond cache hits to long generations
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+RATE_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 400)
+
+# How often the event loop lag probe wakes up; 0 disables it
+EVENT_LOOP_PROBE_MS = float(os.getenv("EVENT_LOOP_PROBE_MS", "100"))
+
+_registry: list["Histogram"] = []
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class _Series:
+    """Bucket counts of one label combination."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+class Histogram:
+    """
+    Histogram with fixed buckets and a series per label combination.
+
+    Observing costs one bisect and a few additions, so it can stay on in
+    production, including once per streamed token.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, _Series] = {}
+        _registry.append(self)
+
+    def labels(self, *values) -> _Series:
+        """Return the series for label values given in `labelnames` order."""
+        key = tuple(str(value) for value in values)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _Series(self.buckets)
+        return series
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram"
+        ]
+        for key, series in list(self._series.items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(series.bounds, series.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series.count}')
+            suffix = "{" + labels + "}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {series.sum}")
+            lines.append(f"{self.name}_count{suffix} {series.count}")
+        return lines
+
+def render_metrics() -> str:
+    """Render every registered histogram in the Prometheus exposition format."""
+    lines = []
+    for histogram in _registry:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "agora_event_loop_lag_seconds", "Delay of event loop callbacks beyond their scheduled time"
+)
+
+async def monitor_event_loop(interval: float = EVENT_LOOP_PROBE_MS / 1000):
+    """Record how late a periodic sleep wakes up, until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.labels().observe(max(0.0, loop.time() - start - interval))
@@ -1,21 +1,146 @@
 """OpenAI API client with streaming support."""
 
 import os
-from typing import AsyncGenerator
+import time
+from typing import AsyncGenerator, Optional
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from .http_pool import create_http_client, pool_stats
+from .llm_scheduler import LLM_COMPLETION_TOKENS_ESTIMATE, get_scheduler
 from .logger import logger
+from .metrics import Histogram
+from .response_cache import cache_key, get_response_cache, replay
+from .single_flight import Flight, get_single_flight
+from .tokenizer import estimate_tokens
 
 load_dotenv()
 
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Empty uses the SDK default (api.openai.com)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+# Retries are left to the LLM scheduler by default, which also respects its queue
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "0"))
+
+UPSTREAM_TTFT_SECONDS = Histogram(
+    "agora_upstream_ttft_seconds", "Time from scheduling an upstream call to its first chunk", ("model",)
+)
+
+_client: Optional[AsyncOpenAI] = None
+
+def create_client() -> AsyncOpenAI:
+    """
+    Create an OpenAI client configured from the environment.
+
+    The client owns a tuned connection pool (see utils.http_pool), so it
+    should be created once per process and closed on shutdown.
+    """
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=OPENAI_BASE_URL,
+        max_retries=OPENAI_MAX_RETRIES,
+        http_client=create_http_client()
+    )
+
+def client_pool_stats() -> Optional[dict]:
+    """Connection pool statistics of the shared client, if it has been created."""
+    if _client is None:
+        return None
+    return pool_stats(getattr(_client, "_client", None))
+
+def get_client() -> AsyncOpenAI:
+    """Return the shared client, creating it on first use outside the app lifespan."""
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client
+
+def set_client(client: Optional[AsyncOpenAI]):
+    """Install the client shared by all LLM calls (None resets it)."""
+    global _client
+    _client = client
+
+async def _chat_completion(
+    messages: list[dict],
+    model: str,
+    temperature: float,
+    max_tokens: Optional[int],
+    stream: bool,
+    cache_ttl: Optional[float],
+    cache_similarity: Optional[float]
+) -> str | AsyncGenerator[str, None]:
+    """
+    Run a chat completion, answering from the response cache when enabled.
+
+    Identical requests already in flight share one upstream stream: a
+    joining caller replays the chunks received so far, then follows the
+    live ones. New upstream calls go through the LLM scheduler, which
+    queues them by priority and retries throttling and server errors.
+    """
+    cache = get_response_cache() if cache_ttl else None
+    if cache:
+        cached = await cache.get(model, temperature, max_tokens, messages, cache_similarity)
+        if cached is not None:
+            return replay(cached) if stream else "".join(cached)
+
+    async def produce(flight: Flight):
+        # Always stream upstream so streaming and non-streaming callers can share it
+        options = {"max_tokens": max_tokens} if max_tokens is not None else {}
+        # Charged to the token budget only, so the length is close enough
+        estimate = sum(estimate_tokens(message["content"]) for message in messages)
+        estimate += max_tokens or LLM_COMPLETION_TOKENS_ESTIMATE
+        start = time.perf_counter()
+        response, lease = await get_scheduler().open(
+            model,
+            estimate,
+            lambda: get_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+                **options
+            )
+        )
+        flight.open()
+        try:
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if not flight.chunks:
+                        UPSTREAM_TTFT_SECONDS.labels(model).observe(time.perf_counter() - start)
+                    flight.publish(chunk.choices[0].delta.content)
+        finally:
+            # Closing the HTTP response aborts the upstream generation
+            # when every subscriber stops early (e.g. cancelled requests)
+            await response.close()
+            lease.release()
+
+    async def store(chunks: list[str]):
+        # Only complete generations reach this point and get cached
+        await cache.put(
+            model, temperature, max_tokens, messages, chunks, cache_ttl, cache_similarity
+        )
+
+    flight = get_single_flight().join(
+        cache_key(model, temperature, max_tokens, messages),
+        produce,
+        store if cache else None
+    )
+    try:
+        await flight.wait_started()
+    except BaseException:
+        flight.leave()
+        raise
+
+    if stream:
+        return flight.subscribe()
+    return "".join([chunk async for chunk in flight.subscribe()])
 
 async def llm_call(
     prompt: str,
     model: str = "gpt-4o-mini",
     temperature: float = 0.7,
     max_tokens: int = 1000,
-    stream: bool = False
+    stream: bool = False,
+    cache_ttl: Optional[float] = None,
+    cache_similarity: Optional[float] = None
 ) -> str | AsyncGenerator[str, None]:
     """
     Call OpenAI API with the given prompt.
@@ -26,28 +151,18 @@ async def llm_call(
         temperature: Sampling temperature
         max_tokens: Maximum tokens to generate
         stream: Whether to stream the response
+        cache_ttl: Seconds to cache the response for; None disables caching
+        cache_similarity: Cosine threshold for reusing a near-duplicate
+            prompt's cached response; None requires an exact match
 
     Returns:
         Complete response string or async generator of chunks
     """
     try:
-        response = await client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=temperature,
-            max_tokens=max_tokens,
-            stream=stream
+        return await _chat_completion(
+            [{"role": "user", "content": prompt}],
+            model, temperature, max_tokens, stream, cache_ttl, cache_similarity
         )
-
-        if stream:
-            async def stream_response():
-                async for chunk in response:
-                    if chunk.choices[0].delta.content:
-                        yield chunk.choices[0].delta.content
-            return stream_response()
-        else:
-            return response.choices[0].message.content
-
     except Exception as e:
         logger.error(f"OpenAI API error: {e}")
         raise
@@ -57,7 +172,9 @@ async def llm_call_with_context(
     context: list[dict],
     model: str = "gpt-4o-mini",
     temperature: float = 0.7,
-    stream: bool = False
+    stream: bool = False,
+    cache_ttl: Optional[float] = None,
+    cache_similarity: Optional[float] = None
 ) -> str | AsyncGenerator[str, None]:
     """
     Call OpenAI API with conversation context.
@@ -68,29 +185,19 @@ async def llm_call_with_context(
         model: OpenAI model name
         temperature: Sampling temperature
         stream: Whether to stream the response
+        cache_ttl: Seconds to cache the response for; None disables caching
+        cache_similarity: Cosine threshold for reusing the cached response of
+            a near-duplicate query with the same context; None requires an
+            exact match
 
     Returns:
         Complete response string or async generator of chunks
     """
     try:
         messages = context + [{"role": "user", "content": query}]
-
-        response = await client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            stream=stream
+        return await _chat_completion(
+            messages, model, temperature, None, stream, cache_ttl, cache_similarity
         )
-
-        if stream:
-            async def stream_response():
-                async for chunk in response:
-                    if chunk.choices[0].delta.content:
-                        yield chunk.choices[0].delta.content
-            return stream_response()
-        else:
-            return response.choices[0].message.content
-
     except Exception as e:
         logger.error(f"OpenAI API error: {e}")
         raise
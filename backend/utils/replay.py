@@ -0,0 +1,212 @@
+"""Replay buffers that let a reconnecting WebSocket client resume a generation."""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import AsyncGenerator, Awaitable, Callable, Optional
+from .logger import logger
+
+# How long a generation keeps running with no client attached, and how long
+# its frames stay available after it ends
+RESUME_GRACE_SECONDS = float(os.getenv("WS_RESUME_GRACE_SECONDS", "30"))
+# Frames kept per generation (oldest dropped first) and across all of them
+REPLAY_STREAM_BYTES = int(os.getenv("WS_REPLAY_STREAM_BYTES", str(256 * 1024)))
+REPLAY_TOTAL_BYTES = int(os.getenv("WS_REPLAY_TOTAL_BYTES", str(64 * 1024 * 1024)))
+
+# Approximate size of a frame besides its content
+FRAME_OVERHEAD = 64
+
+StreamKey = tuple[str, str]  # (session_id, request_id)
+
+class ReplayGap(Exception):
+    """Frames a client asked for were already dropped from the buffer."""
+
+class ReplayStream:
+    """
+    The sequence-numbered frames of one generation.
+
+    Frames are numbered from 1 as they are published. Followers replay the
+    frames after the last one they received and then follow live ones, so a
+    client that reconnects misses nothing still buffered.
+    """
+
+    def __init__(self, key: StreamKey, replay: "ReplayBuffer"):
+        self.key = key
+        self.replay = replay
+        self.frames: deque = deque()  # (seq, frame, size)
+        self.seq = 0
+        self.size = 0
+        self.done = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.finished_at: Optional[float] = None
+        self._changed = asyncio.Event()
+        self._expiry: Optional[asyncio.TimerHandle] = None
+
+    def publish(self, frame: dict):
+        """Number a frame and make it available to followers."""
+        self.seq += 1
+        frame["seq"] = self.seq
+        size = len(frame.get("content") or "") + FRAME_OVERHEAD
+        self.frames.append((self.seq, frame, size))
+        self._resize(size)
+        while self.size > self.replay.stream_bytes and len(self.frames) > 1:
+            self._resize(-self.frames.popleft()[2])
+        self._notify()
+
+    def finish(self):
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._cancel_expiry()
+        self._notify()
+
+    def _resize(self, delta: int):
+        self.size += delta
+        self.replay.total_bytes += delta
+
+    def _notify(self):
+        # A fresh event per change, so every waiting follower wakes exactly once
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self, after_seq: int = 0) -> AsyncGenerator[dict, None]:
+        """
+        Yield the frames after `after_seq`, then live frames until the generation ends.
+
+        Raises:
+            ReplayGap: If frames after `after_seq` were dropped from the buffer
+        """
+        self.subscribers += 1
+        self._cancel_expiry()
+        try:
+            sent = min(max(after_seq, 0), self.seq)
+            while True:
+                changed = self._changed
+                if self.frames:
+                    first_seq = self.frames[0][0]
+                    if sent + 1 < first_seq:
+                        raise ReplayGap(f"Frames {sent + 1} to {first_seq - 1} are no longer buffered")
+                    for _, frame, _ in list(self.frames)[sent + 1 - first_seq:]:
+                        sent = frame["seq"]
+                        yield frame
+                if self.done and sent >= self.seq:
+                    return
+                if sent >= self.seq:
+                    await changed.wait()
+        finally:
+            self.subscribers -= 1
+            if not self.subscribers and not self.done:
+                self._expiry = asyncio.get_running_loop().call_later(
+                    self.replay.grace_seconds, self._expire
+                )
+
+    def _expire(self):
+        """Stop a generation nobody came back for."""
+        self._expiry = None
+        if not self.subscribers and not self.done and self.task:
+            logger.info(f"Cancelling detached generation {self.key[1]} after {self.replay.grace_seconds}s")
+            self.task.cancel()
+
+    def _cancel_expiry(self):
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+
+class ReplayBuffer:
+    """
+    Generations keyed by (session_id, request_id), kept for resuming.
+
+    A generation runs in its own task, independent of any connection, and
+    is cancelled when no client has followed it for `grace_seconds`. Ended
+    generations stay replayable for `grace_seconds`. Memory is bounded per
+    generation, by dropping its oldest frames, and in total, by evicting the
+    generations that ended first.
+    """
+
+    def __init__(
+        self,
+        grace_seconds: float = RESUME_GRACE_SECONDS,
+        stream_bytes: int = REPLAY_STREAM_BYTES,
+        total_bytes: int = REPLAY_TOTAL_BYTES
+    ):
+        self.grace_seconds = grace_seconds
+        self.stream_bytes = stream_bytes
+        self.max_total_bytes = total_bytes
+        self.total_bytes = 0
+        self.streams: OrderedDict = OrderedDict()  # key -> ReplayStream, in start order
+        self.evictions = 0
+
+    def start(self, key: StreamKey, produce: Callable[[ReplayStream], Awaitable[None]]) -> ReplayStream:
+        """Run `produce` in a new task, publishing to a new stream under `key`."""
+        self._remove(key)
+        stream = ReplayStream(key, self)
+        self.streams[key] = stream
+        stream.task = asyncio.create_task(produce(stream))
+        # A callback rather than a finally, so a task cancelled before it starts still ends its stream
+        stream.task.add_done_callback(lambda _: self._ended(stream))
+        self._evict()
+        return stream
+
+    def _ended(self, stream: ReplayStream):
+        stream.finish()
+        asyncio.get_running_loop().call_later(self.grace_seconds, self._expire, stream)
+        self._evict()
+
+    def get(self, key: StreamKey) -> Optional[ReplayStream]:
+        return self.streams.get(key)
+
+    def _expire(self, stream: ReplayStream):
+        if self.streams.get(stream.key) is stream:
+            self._remove(stream.key)
+
+    def _remove(self, key: StreamKey):
+        stream = self.streams.pop(key, None)
+        if stream is not None:
+            self.total_bytes -= stream.size
+
+    def _evict(self):
+        """Drop ended generations, oldest first, until the total fits."""
+        if self.total_bytes <= self.max_total_bytes:
+            return
+        ended = sorted((s for s in self.streams.values() if s.done), key=lambda s: s.finished_at)
+        for stream in ended:
+            if self.total_bytes <= self.max_total_bytes:
+                break
+            self._remove(stream.key)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        running = sum(1 for stream in self.streams.values() if not stream.done)
+        return {
+            "running": running,
+            "detached": sum(1 for s in self.streams.values() if not s.done and not s.subscribers),
+            "ended": len(self.streams) - running,
+            "bytes": self.total_bytes,
+            "evictions": self.evictions
+        }
+
+    async def close(self):
+        """Cancel running generations and wait for them to record where they stopped."""
+        tasks = [stream.task for stream in self.streams.values() if stream.task and not stream.done]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.streams.clear()
+        self.total_bytes = 0
+
+_replay: Optional[ReplayBuffer] = None
+
+def get_replay_buffer() -> ReplayBuffer:
+    """Return the shared replay buffer, creating it on first use."""
+    global _replay
+    if _replay is None:
+        _replay = ReplayBuffer()
+    return _replay
+
+async def close_replay_buffer():
+    """Cancel the generations of the shared replay buffer if it was created."""
+    global _replay
+    if _replay is not None:
+        await _replay.close()
+        _replay = None
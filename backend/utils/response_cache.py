@@ -0,0 +1,291 @@
+"""Cache of LLM responses keyed on the full request, with memory and disk tiers."""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncGenerator, Optional
+import numpy as np
+from .embeddings import get_embedder
+from .logger import logger
+
+RESPONSE_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ENTRIES", "2048"))
+RESPONSE_CACHE_DISK_ENTRIES = int(os.getenv("RESPONSE_CACHE_DISK_ENTRIES", "50000"))
+# Empty disables the disk tier; the default does not depend on the working directory
+RESPONSE_CACHE_PATH = os.getenv(
+    "RESPONSE_CACHE_PATH", str(Path(__file__).resolve().parent.parent / "cache" / "responses.db")
+)
+
+# Near-duplicate candidates kept per conversation prefix, and prefixes tracked
+SEMANTIC_ENTRIES_PER_PREFIX = 256
+SEMANTIC_PREFIXES = 1024
+
+def _digest(value) -> str:
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+def cache_key(model: str, temperature: float, max_tokens: Optional[int], messages: list[dict]) -> str:
+    """Hash of everything that determines a response."""
+    return _digest([model, temperature, max_tokens, messages])
+
+def prefix_key(model: str, temperature: float, max_tokens: Optional[int], messages: list[dict]) -> str:
+    """Hash of a request without its final message, grouping near-duplicate candidates."""
+    return _digest([model, temperature, max_tokens, messages[:-1]])
+
+async def replay(chunks: list[str]) -> AsyncGenerator[str, None]:
+    """Stream cached chunks through the same interface as a live response."""
+    for chunk in chunks:
+        yield chunk
+
+class ResponseCache:
+    """
+    Two-tier TTL cache of response chunks.
+
+    The memory tier is an LRU of recent entries; the optional disk tier is a
+    SQLite table used through a single worker thread, evicting least recently
+    used rows beyond its size limit. Callers may also ask for near-duplicate
+    matches: among cached requests that share everything but the final user
+    message, the one whose message embedding is most similar is reused when
+    its cosine similarity reaches the caller's threshold. Near-duplicate
+    matching needs a semantic embedding model (EMBEDDING_MODEL); with the
+    hashing embedder a similarity threshold is ignored and only exact
+    matches are served. Messages are embedded in worker threads, since a
+    model takes milliseconds per message.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_ENTRIES,
+        db_path: str = RESPONSE_CACHE_PATH,
+        disk_max_entries: int = RESPONSE_CACHE_DISK_ENTRIES
+    ):
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self._memory: OrderedDict[str, tuple[float, list[str]]] = OrderedDict()
+        self._similar: OrderedDict[str, deque] = OrderedDict()  # prefix -> (vector, key, expires_at)
+        self._puts = 0
+        self.hits = {"memory": 0, "disk": 0, "semantic": 0}
+        self.misses = 0
+        self._warned_lexical = False
+
+        self._conn = None
+        self._executor = None
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    chunks TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses(last_used)")
+            self._conn.commit()
+
+    async def _disk(self, fn, *args):
+        """Run a disk-tier function on the cache's worker thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple[float, list[str]]]:
+        row = self._conn.execute(
+            "SELECT expires_at, chunks FROM responses WHERE key = ? AND expires_at > ?",
+            (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        with self._conn:
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        return row[0], json.loads(row[1])
+
+    def _disk_put(self, key: str, chunks: list[str], expires_at: float, now: float, prune: bool):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, chunks, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(chunks), expires_at, now)
+            )
+            if prune:
+                self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                self._conn.execute(
+                    """
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (self.disk_max_entries,)
+                )
+
+    async def _lookup(self, key: str, now: float) -> tuple[Optional[tuple[float, list[str]]], str]:
+        """Find a live entry by exact key, returning (expires_at, chunks) and its tier."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                return entry, "memory"
+            del self._memory[key]
+
+        if self._conn is not None:
+            entry = await self._disk(self._disk_get, key, now)
+            if entry is not None:
+                return entry, "disk"
+        return None, ""
+
+    async def get(
+        self,
+        model: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        messages: list[dict],
+        similarity: Optional[float] = None
+    ) -> Optional[list[str]]:
+        """
+        Return cached chunks for a request, or None.
+
+        Args:
+            similarity: Cosine threshold for near-duplicate matches of the
+                final message; None accepts exact matches only
+        """
+        now = time.time()
+        similarity = await self._semantic_threshold(similarity)
+        try:
+            key = cache_key(model, temperature, max_tokens, messages)
+            entry, tier = await self._lookup(key, now)
+            if entry is None and similarity is not None:
+                similar_key = await self._nearest(
+                    prefix_key(model, temperature, max_tokens, messages),
+                    messages[-1]["content"],
+                    similarity,
+                    now
+                )
+                if similar_key:
+                    entry, _ = await self._lookup(similar_key, now)
+                    tier = "semantic"
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed: {e}")
+            return None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits[tier] += 1
+        if tier != "memory":
+            # Promote to the memory tier, keeping the entry's original expiry
+            self._remember(key, entry[1], entry[0])
+        logger.info(f"Response cache hit ({tier}) for model {model}")
+        return entry[1]
+
+    async def put(
+        self,
+        model: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        messages: list[dict],
+        chunks: list[str],
+        ttl: float,
+        similarity: Optional[float] = None
+    ):
+        """Store a complete response for `ttl` seconds."""
+        now = time.time()
+        similarity = await self._semantic_threshold(similarity)
+        expires_at = now + ttl
+        key = cache_key(model, temperature, max_tokens, messages)
+        self._remember(key, chunks, expires_at)
+
+        try:
+            if similarity is not None:
+                await self._index(
+                    prefix_key(model, temperature, max_tokens, messages),
+                    messages[-1]["content"],
+                    key,
+                    expires_at
+                )
+            if self._conn is not None:
+                self._puts += 1
+                await self._disk(self._disk_put, key, chunks, expires_at, now, self._puts % 100 == 0)
+        except Exception as e:
+            logger.warning(f"Response cache store failed: {e}")
+
+    async def _semantic_threshold(self, similarity: Optional[float]) -> Optional[float]:
+        """Drop a similarity threshold unless a semantic embedding model is loaded."""
+        if similarity is None:
+            return None
+        # Loaded at startup; a thread still covers a process that skipped it, as a model loads for seconds
+        if (await asyncio.to_thread(get_embedder)).semantic:
+            return similarity
+        if not self._warned_lexical:
+            self._warned_lexical = True
+            logger.warning(
+                "Ignoring response_cache similarity: near-duplicate matching needs EMBEDDING_MODEL, "
+                "the hashing embedder would match requests that differ in one word"
+            )
+        return None
+
+    def _remember(self, key: str, chunks: list[str], expires_at: float):
+        self._memory[key] = (expires_at, chunks)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    async def _embed(text: str) -> np.ndarray:
+        """Embed a message with the model in a worker thread."""
+        return (await asyncio.to_thread(get_embedder().embed, [text]))[0]
+
+    async def _index(self, prefix: str, text: str, key: str, expires_at: float):
+        vector = await self._embed(text)
+        entries = self._similar.get(prefix)
+        if entries is None:
+            entries = self._similar[prefix] = deque(maxlen=SEMANTIC_ENTRIES_PER_PREFIX)
+        entries.append((vector, key, expires_at))
+        self._similar.move_to_end(prefix)
+        while len(self._similar) > SEMANTIC_PREFIXES:
+            self._similar.popitem(last=False)
+
+    async def _nearest(self, prefix: str, text: str, threshold: float, now: float) -> Optional[str]:
+        entries = self._similar.get(prefix)
+        if not entries:
+            return None
+        live = [entry for entry in entries if entry[2] > now]
+        if not live:
+            return None
+        matrix = np.stack([entry[0] for entry in live])
+        scores = matrix @ await self._embed(text)
+        best = int(np.argmax(scores))
+        return live[best][1] if scores[best] >= threshold else None
+
+    def stats(self) -> dict:
+        return {"hits": dict(self.hits), "misses": self.misses, "memory_entries": len(self._memory)}
+
+    async def close(self):
+        """Close the disk tier."""
+        if self._conn is not None:
+            await self._disk(self._conn.close)
+            self._executor.shutdown(wait=True)
+            self._conn = None
+
+_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> ResponseCache:
+    """Return the shared response cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
+
+async def close_response_cache():
+    """Close the shared response cache if it was created."""
+    global _cache
+    if _cache is not None:
+        await _cache.close()
+        _cache = None
@@ -0,0 +1,166 @@
+"""Sharing of one upstream generation between identical concurrent requests."""
+
+import asyncio
+import os
+from typing import AsyncGenerator, Awaitable, Callable, Optional
+from .logger import logger
+
+SINGLE_FLIGHT_ENABLED = os.getenv("LLM_SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+
+class FlightCancelled(Exception):
+    """The shared generation was abandoned before it completed."""
+
+class Flight:
+    """
+    One upstream generation and the chunks it has produced so far.
+
+    Subscribers replay the chunks already received and then follow live
+    ones. The generation is cancelled when its last subscriber goes away.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks: list[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._started = asyncio.Event()
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def open(self):
+        """Mark the upstream response as started (headers received)."""
+        self._started.set()
+
+    def publish(self, chunk: str):
+        """Append a chunk and wake subscribers."""
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._started.set()
+        self._notify()
+
+    async def wait_started(self):
+        """Wait until the upstream responded, raising its error if it failed."""
+        await self._started.wait()
+        if self.error is not None and not self.chunks:
+            raise self.error
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        """Yield every chunk of the generation, from the first one."""
+        index = 0
+        try:
+            while True:
+                while index < len(self.chunks):
+                    yield self.chunks[index]
+                    index += 1
+                if self.error is not None:
+                    raise self.error
+                if self.done:
+                    return
+                changed = self._changed
+                await changed.wait()
+        finally:
+            self.leave()
+
+    def leave(self):
+        """Drop one subscriber, cancelling the generation if none are left."""
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.done and self.task is not None:
+            self.task.cancel()
+
+class SingleFlight:
+    """
+    Registry of in-flight generations keyed by request.
+
+    A request whose key matches a running generation joins it instead of
+    starting another upstream call. Finished generations leave the
+    registry, so later requests start fresh (or hit the response cache).
+    """
+
+    def __init__(self, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.enabled = enabled
+        self._flights: dict[str, Flight] = {}
+        self.started = 0
+        self.shared = 0
+
+    def join(
+        self,
+        key: str,
+        produce: Callable[[Flight], Awaitable[None]],
+        on_complete: Optional[Callable[[list[str]], Awaitable[None]]] = None
+    ) -> Flight:
+        """
+        Return the running flight for `key`, or start one.
+
+        Each join counts as one subscriber until the matching subscribe()
+        generator finishes, so a caller that has not started reading yet
+        keeps the generation alive.
+
+        Args:
+            key: Identity of the request
+            produce: Coroutine function that runs the upstream call, calling
+                flight.open() once it responds and flight.publish() per chunk
+            on_complete: Called with all chunks after a successful generation
+
+        Returns:
+            The flight to subscribe to
+        """
+        flight = self._flights.get(key) if self.enabled else None
+        if flight is not None:
+            flight.subscribers += 1
+            self.shared += 1
+            logger.info(f"Joined in-flight generation ({len(flight.chunks)} chunks so far)")
+            return flight
+
+        flight = Flight(key)
+        flight.subscribers = 1
+        flight.task = asyncio.create_task(self._run(flight, produce, on_complete))
+        self.started += 1
+        if self.enabled:
+            self._flights[key] = flight
+        return flight
+
+    async def _run(self, flight: Flight, produce, on_complete):
+        try:
+            await produce(flight)
+        except asyncio.CancelledError:
+            self._forget(flight)
+            flight.finish(FlightCancelled("Generation cancelled by all subscribers"))
+            return
+        except Exception as e:
+            self._forget(flight)
+            flight.finish(e)
+            return
+
+        flight.finish()
+        try:
+            if on_complete is not None:
+                await on_complete(flight.chunks)
+        except Exception as e:
+            logger.warning(f"Completion hook failed: {e}")
+        finally:
+            self._forget(flight)
+
+    def _forget(self, flight: Flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._flights), "started": self.started, "shared": self.shared}
+
+_single_flight: Optional[SingleFlight] = None
+
+def get_single_flight() -> SingleFlight:
+    """Return the shared single-flight registry, creating it on first use."""
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
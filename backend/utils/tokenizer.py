@@ -0,0 +1,86 @@
+"""Local token counting for context budgeting."""
+
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+from .logger import logger
+
+ENCODING_NAME = "o200k_base"
+# Where tiktoken fetches the encoding from; its cache file is named after this URL
+ENCODING_URL = "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken"
+# Let tiktoken download the encoding at startup when it is not cached yet
+TOKENIZER_DOWNLOAD = os.getenv("TOKENIZER_DOWNLOAD", "false").lower() in ("1", "true", "yes")
+
+# Used when tiktoken or its encoding files are unavailable (e.g. offline).
+# Words, numbers and individual punctuation marks approximate BPE tokens well
+# enough for budgeting; long words are charged one token per 4 characters.
+_APPROX_PATTERN = re.compile(r"\w+|[^\w\s]")
+# Characters per token of English text, for estimates that must not tokenize
+CHARS_PER_TOKEN = 4
+
+def _cached_encoding_file() -> Optional[Path]:
+    """Return tiktoken's cache file of the encoding if it exists, resolved as tiktoken.load does."""
+    cache_dir = os.environ.get("TIKTOKEN_CACHE_DIR", os.environ.get("DATA_GYM_CACHE_DIR"))
+    if cache_dir is None:
+        cache_dir = os.path.join(tempfile.gettempdir(), "data-gym-cache")
+    if not cache_dir:
+        return None  # Caching disabled, so tiktoken would always download
+    path = Path(cache_dir) / hashlib.sha1(ENCODING_URL.encode()).hexdigest()
+    return path if path.exists() else None
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """Load the tiktoken encoding once, or return None to use the approximation."""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken not installed, approximating token counts")
+        return None
+    if not TOKENIZER_DOWNLOAD and _cached_encoding_file() is None:
+        # Never reach for the network: a firewalled host would stall until the connection times out
+        logger.warning(
+            f"tiktoken encoding {ENCODING_NAME} is not cached, approximating token counts "
+            "(set TIKTOKEN_CACHE_DIR to a cache holding it, or TOKENIZER_DOWNLOAD=true)"
+        )
+        return None
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, approximating token counts: {e}")
+        return None
+
+async def load_tokenizer():
+    """Load the encoding in a worker thread, so no request pays for it on the event loop."""
+    await asyncio.to_thread(_encoding)
+
+def _approximate(text: str) -> int:
+    return sum(max(1, len(piece) // 4) for piece in _APPROX_PATTERN.findall(text))
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens a message contributes to a prompt.
+
+    Args:
+        text: Message content
+
+    Returns:
+        Token count (exact with tiktoken, approximate otherwise)
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return _approximate(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate tokens from the length alone, in constant time.
+
+    For rate budgets charged on every LLM call, where the whole prompt would
+    otherwise be tokenized again on the event loop.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
@@ -0,0 +1,273 @@
+"""Runtime for agent tools that keeps blocking work off the event loop."""
+
+import asyncio
+import importlib
+import inspect
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Optional
+from .logger import logger
+from .metrics import Histogram
+
+TOOL_THREADS = int(os.getenv("TOOL_THREADS", "16"))
+TOOL_PROCESSES = int(os.getenv("TOOL_PROCESSES", str(min(4, os.cpu_count() or 1))))
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "10"))
+# Cached results kept per tool
+TOOL_CACHE_ENTRIES = int(os.getenv("TOOL_CACHE_ENTRIES", "1024"))
+
+TOOL_SECONDS = Histogram(
+    "agora_tool_seconds", "Tool call duration, including queueing for a worker", ("tool", "outcome")
+)
+
+EXECUTORS = ("async", "thread", "process")
+
+class ToolError(Exception):
+    """A tool call failed."""
+
+class ToolTimeout(ToolError):
+    """A tool call did not finish within its timeout."""
+
+def _invoke(module_name: str, qualname: str, args: tuple, kwargs: dict):
+    """Run a tool's function in a worker process, looked up by name since Tools do not pickle."""
+    target = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+    return getattr(target, "fn", target)(*args, **kwargs)
+
+class Tool:
+    """
+    A function agents call with `await`, executed by the tool runtime.
+
+    Coroutine functions run on the event loop, plain functions in the shared
+    thread pool, and CPU-bound functions (executor="process") in the process
+    pool. Results can be cached for `cache_ttl` seconds, keyed by the
+    arguments, and concurrent identical calls share one execution.
+    """
+
+    def __init__(
+        self,
+        fn: Callable,
+        executor: Optional[str] = None,
+        timeout: Optional[float] = None,
+        cache_ttl: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        cache_entries: int = TOOL_CACHE_ENTRIES
+    ):
+        self.fn = fn
+        self.name = fn.__name__
+        self.executor = executor or ("async" if inspect.iscoroutinefunction(fn) else "thread")
+        if self.executor not in EXECUTORS:
+            raise ValueError(f"Tool executor must be one of {EXECUTORS}, got '{self.executor}'")
+        self.timeout = timeout if timeout is not None else TOOL_TIMEOUT_SECONDS
+        self.cache_ttl = cache_ttl
+        self.cache_entries = cache_entries
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self._cache: OrderedDict = OrderedDict()  # key -> (expires_at, result)
+        self._pending: dict = {}  # key -> future of the running call
+        self.__doc__ = fn.__doc__
+        self.__module__ = fn.__module__
+        self.__qualname__ = fn.__qualname__
+        self.__wrapped__ = fn
+        self.calls = self.hits = self.timeouts = self.errors = 0
+
+    def __call__(self, *args, **kwargs):
+        return get_tool_runtime().run(self, *args, **kwargs)
+
+    def _cache_key(self, args: tuple, kwargs: dict):
+        """Return a hashable key for the arguments, or None if they are not hashable."""
+        key = (args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _cached(self, key) -> tuple[bool, Any]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return False, None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._cache[key]
+            return False, None
+        self._cache.move_to_end(key)
+        return True, result
+
+    def _remember(self, key, result):
+        self._cache[key] = (time.monotonic() + self.cache_ttl, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.executor,
+            "cached": len(self._cache),
+            "running": len(self._pending),
+            "calls": self.calls,
+            "hits": self.hits,
+            "timeouts": self.timeouts,
+            "errors": self.errors
+        }
+
+def tool(
+    fn: Optional[Callable] = None,
+    *,
+    executor: Optional[str] = None,
+    timeout: Optional[float] = None,
+    cache_ttl: Optional[float] = None,
+    max_concurrency: Optional[int] = None
+):
+    """
+    Declare a function as a tool.
+
+    Usable bare (`@tool`) or with options (`@tool(timeout=5, cache_ttl=300)`).
+
+    Args:
+        executor: "async", "thread" or "process"; inferred from the function if omitted
+        timeout: Seconds before the call fails with ToolTimeout (default: TOOL_TIMEOUT_SECONDS)
+        cache_ttl: Seconds to reuse a result for the same arguments; None disables caching
+        max_concurrency: Calls of this tool allowed to run at once; None for no limit
+
+    Returns:
+        The Tool, called with `await tool_fn(...)`
+    """
+    def declare(fn: Callable) -> Tool:
+        return Tool(fn, executor=executor, timeout=timeout, cache_ttl=cache_ttl, max_concurrency=max_concurrency)
+    return declare(fn) if fn is not None else declare
+
+class ToolRuntime:
+    """
+    Executes tool calls with bounded worker pools and per-tool timeouts.
+
+    A timeout stops waiting for a thread or process call but cannot
+    interrupt it, so the pools bound how much abandoned work can pile up.
+    Independent calls run concurrently when awaited together, e.g. with
+    asyncio.gather.
+    """
+
+    def __init__(self, threads: int = TOOL_THREADS, processes: int = TOOL_PROCESSES):
+        self.threads = threads
+        self.processes = processes
+        self._thread_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="tool")
+        # Created on the first process-bound call; spawned so workers do not
+        # inherit the event loop and open connections of this process
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self.tools: dict[str, Tool] = {}
+
+    def _process_executor(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._process_pool
+
+    def _start(self, tool_fn: Tool, args: tuple, kwargs: dict):
+        """Return an awaitable running the tool's function on its executor."""
+        if tool_fn.executor == "async":
+            return tool_fn.fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        if tool_fn.executor == "process":
+            call = partial(_invoke, tool_fn.__module__, tool_fn.__qualname__, args, kwargs)
+            return loop.run_in_executor(self._process_executor(), call)
+        return loop.run_in_executor(self._thread_pool, partial(tool_fn.fn, *args, **kwargs))
+
+    async def _execute(self, tool_fn: Tool, args: tuple, kwargs: dict):
+        """Run one call under the tool's concurrency limit and timeout, recording its outcome."""
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            if tool_fn._semaphore:
+                async with tool_fn._semaphore:
+                    return await asyncio.wait_for(self._start(tool_fn, args, kwargs), tool_fn.timeout)
+            return await asyncio.wait_for(self._start(tool_fn, args, kwargs), tool_fn.timeout)
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            tool_fn.timeouts += 1
+            logger.warning(f"Tool {tool_fn.name} timed out after {tool_fn.timeout}s")
+            raise ToolTimeout(f"Tool '{tool_fn.name}' timed out after {tool_fn.timeout}s")
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for later calls
+            outcome = "error"
+            tool_fn.errors += 1
+            logger.error(f"Tool {tool_fn.name} lost its worker process")
+            self._process_pool = None
+            raise ToolError(f"Tool '{tool_fn.name}' worker process died")
+        except Exception as e:
+            outcome = "error"
+            tool_fn.errors += 1
+            logger.error(f"Tool {tool_fn.name} failed: {e}")
+            raise
+        finally:
+            TOOL_SECONDS.labels(tool_fn.name, outcome).observe(time.perf_counter() - start)
+
+    async def run(self, tool_fn: Tool, *args, **kwargs):
+        """
+        Call a tool, serving cached results and sharing identical running calls.
+
+        Raises:
+            ToolTimeout: If the call exceeds the tool's timeout
+        """
+        self.tools.setdefault(tool_fn.name, tool_fn)
+        key = tool_fn._cache_key(args, kwargs) if tool_fn.cache_ttl else None
+        if key is None:
+            tool_fn.calls += 1
+            return await self._execute(tool_fn, args, kwargs)
+
+        hit, result = tool_fn._cached(key)
+        if hit:
+            tool_fn.hits += 1
+            return result
+
+        pending = tool_fn._pending.get(key)
+        if pending is None:
+            tool_fn.calls += 1
+            pending = asyncio.ensure_future(self._execute(tool_fn, args, kwargs))
+            tool_fn._pending[key] = pending
+
+            def settle(future: asyncio.Future):
+                tool_fn._pending.pop(key, None)
+                if not future.cancelled() and future.exception() is None:
+                    tool_fn._remember(key, future.result())
+            pending.add_done_callback(settle)
+        else:
+            tool_fn.hits += 1
+        # Shielded so one caller giving up does not cancel the call for the others
+        return await asyncio.shield(pending)
+
+    def stats(self) -> dict:
+        return {
+            "threads": self.threads,
+            "processes": self.processes if self._process_pool else 0,
+            "tools": {name: tool_fn.stats() for name, tool_fn in self.tools.items()}
+        }
+
+    def close(self):
+        """Shut down the worker pools without waiting for abandoned calls."""
+        self._thread_pool.shutdown(wait=False, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+
+_runtime: Optional[ToolRuntime] = None
+
+def get_tool_runtime() -> ToolRuntime:
+    """Return the shared tool runtime, creating it on first use."""
+    global _runtime
+    if _runtime is None:
+        _runtime = ToolRuntime()
+    return _runtime
+
+def close_tool_runtime():
+    """Shut down the shared tool runtime if it was created."""
+    global _runtime
+    if _runtime is not None:
+        _runtime.close()
+        _runtime = None